@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+import argparse
+import threading
+import time
+
+import numpy as np
+
+# Измерения куба: (имя, выражение SQL по строке applicants, отслеживаемая колонка applicants)
+# Значения - небольшие неотрицательные целые; course кодируется словарем строк (0 - пусто),
+# day - номер дня добавления записи от 1970-01-01 (-1 - дата неизвестна)
+CUBE_DIMENSIONS = (
+    ('department', 'COALESCE(department_id, 0)', 'department_id'),
+    ('course', 'agitator_course', 'agitator_course'),
+    ('region', 'COALESCE(region_id, 0)', 'region_id'),
+    ('category', 'COALESCE(category_code, 0)', 'category_code'),
+    ('status', 'COALESCE(status_code, 0)', 'status_code'),
+    ('document_status', 'COALESCE(document_status_id, 0)', 'document_status_id'),
+    ('day', 'COALESCE(CAST(julianday(date(created_at)) - 2440587.5 AS INTEGER), -1)', 'created_at'),
+    ('created_by', 'COALESCE(created_by, 0)', 'created_by'),
+)
+
+CUBE_DIMENSION_NAMES = tuple(dimension[0] for dimension in CUBE_DIMENSIONS)
+
+# Измерения, которые в сводной таблице начинаются с наименьшего значения, а не с нуля
+RANGE_DIMENSIONS = frozenset({'day'})
+
+# Строк за одну выборку при загрузке куба
+LOAD_CHUNK_ROWS = 50000
+# Идентификаторов в одном условии IN (ограничение числа параметров SQLite)
+ID_CHUNK_SIZE = 500
+
+
+class AnalyticsCube:
+    """Абитуриенты в массивах NumPy для сводных подсчетов
+
+    Каждое измерение CUBE_DIMENSIONS хранится столбцом кодов int32, подсчеты по любому
+    набору измерений и условий выполняются через np.bincount без обращения к БД.
+    Перед каждым подсчетом куб дочитывает изменившиеся строки по журналу
+    applicant_changes (заполняется триггерами); если журнал уже очищен дальше
+    прочитанного места, куб загружается заново. Читаются только зафиксированные данные.
+    """
+
+    # Границы журнала изменений; MIN и MAX в отдельных подзапросах читают по одной странице индекса
+    LOG_BOUNDS_SQL = '''
+        SELECT (SELECT MIN(seq) FROM applicant_changes), (SELECT MAX(seq) FROM applicant_changes)
+    '''
+
+    def __init__(self, db):
+        self.db = db
+        self.lock = threading.RLock()
+        self.size = 0  # занятых строк в массивах (включая удаленные)
+        self.dead = 0  # удаленных строк, ожидающих уплотнения
+        self.last_seq = None  # последняя учтенная запись журнала (None - куб не загружен)
+        self.loads = 0
+        self.refreshes = 0
+        self._allocate(0)
+
+    # ==================== ХРАНЕНИЕ ====================
+
+    def _allocate(self, capacity):
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.columns = {name: np.zeros(capacity, dtype=np.int32) for name in CUBE_DIMENSION_NAMES}
+        self.row_of = np.full(1, -1, dtype=np.int64)  # id абитуриента -> строка куба
+        self.courses = [None]  # код -> название курса
+        self.course_codes = {None: 0}
+        self.lengths = dict.fromkeys(CUBE_DIMENSION_NAMES, 1)  # наибольший код измерения + 1
+        self.results = {}  # кэш подсчетов без отбора по ids до следующего изменения куба
+        self.size = 0
+        self.dead = 0
+
+    def _reserve(self, rows):
+        """Запас места под rows новых строк (емкость растет вдвое)"""
+        capacity = len(self.ids)
+        needed = self.size + rows
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        self.ids = np.resize(self.ids, capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        self.alive = alive
+        for name, column in self.columns.items():
+            self.columns[name] = np.resize(column, capacity)
+
+    def _encode_courses(self, values):
+        """Коды курсов по названиям (новые названия добавляются в словарь)"""
+        codes = self.course_codes
+        courses = self.courses
+
+        def code(value):
+            result = codes.get(value)
+            if result is None:
+                result = codes[value] = len(courses)
+                courses.append(value)
+            return result
+
+        return np.fromiter(map(code, values), dtype=np.int32, count=len(values))
+
+    def _store(self, ids, values):
+        """Запись строк: values - столбцы в порядке CUBE_DIMENSIONS для ids"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        if ids.max() >= len(self.row_of):
+            row_of = np.full(max(int(ids.max()) + 1, len(self.row_of) * 2), -1, dtype=np.int64)
+            row_of[:len(self.row_of)] = self.row_of
+            self.row_of = row_of
+
+        rows = self.row_of[ids]
+        new = rows < 0
+        new_count = int(np.count_nonzero(new))
+        if new_count:
+            self._reserve(new_count)
+            rows[new] = np.arange(self.size, self.size + new_count)
+            self.size += new_count
+            self.row_of[ids[new]] = rows[new]
+
+        self.ids[rows] = ids
+        self.alive[rows] = True
+        for name, column in zip(CUBE_DIMENSION_NAMES, values):
+            if name == 'course':
+                column = self._encode_courses(column)
+            self.columns[name][rows] = column
+            self.lengths[name] = max(self.lengths[name], int(np.max(column)) + 1)
+        self.results.clear()
+
+    def _remove(self, ids):
+        """Удаление строк по id абитуриентов"""
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = ids[ids < len(self.row_of)]
+        rows = self.row_of[ids]
+        rows = rows[rows >= 0]
+        if not len(rows):
+            return
+        self.alive[rows] = False
+        self.row_of[self.ids[rows]] = -1
+        self.dead += len(rows)
+        self.results.clear()
+        # Удаленных строк больше половины - массивы уплотняются
+        if self.dead > self.size // 2:
+            self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self.alive[:self.size])
+        self.ids = self.ids[keep]
+        self.alive = np.ones(len(keep), dtype=bool)
+        for name, column in self.columns.items():
+            self.columns[name] = column[keep]
+        self.size = len(keep)
+        self.dead = 0
+        self.row_of[:] = -1
+        self.row_of[self.ids] = np.arange(self.size)
+
+    # ==================== ЗАГРУЗКА ИЗ БД ====================
+
+    def _cursor(self):
+        # Соединение для чтения потока без row_factory: кортежи быстрее разбирать
+        cursor = self.db.connections.reader().cursor()
+        cursor.row_factory = None
+        return cursor
+
+    @staticmethod
+    def _select_sql(condition=''):
+        expressions = ', '.join(dimension[1] for dimension in CUBE_DIMENSIONS)
+        return f'SELECT id, {expressions} FROM applicants {condition}'
+
+    def _load_rows(self, cursor):
+        """Запись в куб всех строк результата запроса; возвращает массив прочитанных id"""
+        loaded = []
+        while True:
+            rows = cursor.fetchmany(LOAD_CHUNK_ROWS)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            ids = np.array(columns[0], dtype=np.int64)
+            values = [
+                column if name == 'course' else np.array(column, dtype=np.int32)
+                for name, column in zip(CUBE_DIMENSION_NAMES, columns[1:])
+            ]
+            self._store(ids, values)
+            loaded.append(ids)
+        return np.concatenate(loaded) if loaded else np.zeros(0, dtype=np.int64)
+
+    def load(self):
+        """Полная загрузка куба из таблицы абитуриентов"""
+        with self.lock:
+            cursor = self._cursor()
+            last_seq = cursor.execute(self.LOG_BOUNDS_SQL).fetchone()[1] or 0
+            self._allocate(0)
+            try:
+                cursor.execute(self._select_sql('ORDER BY id'))
+                self._load_rows(cursor)
+            except BaseException:
+                # Прерванная загрузка (например, interrupt() соединения) оставляет куб
+                # неполным: следующее обращение загрузит его заново
+                self.last_seq = None
+                raise
+            self.last_seq = last_seq
+            self.loads += 1
+
+    def refresh(self):
+        """Учет изменений по журналу applicant_changes; возвращает число обновленных строк"""
+        with self.lock:
+            if self.last_seq is None:
+                self.load()
+                return self.size
+            cursor = self._cursor()
+            first_seq, last_seq = cursor.execute(self.LOG_BOUNDS_SQL).fetchone()
+            if last_seq is None or last_seq <= self.last_seq:
+                return 0
+            if first_seq > self.last_seq + 1:
+                # Журнал очищен дальше прочитанного места
+                self.load()
+                return self.size
+
+            cursor.execute(
+                'SELECT DISTINCT applicant_id FROM applicant_changes WHERE seq > ? AND seq <= ?',
+                (self.last_seq, last_seq)
+            )
+            changed = np.array([row[0] for row in cursor.fetchall()], dtype=np.int64)
+            if len(changed) > max(self.size // 4, LOAD_CHUNK_ROWS):
+                # Изменилась заметная часть таблицы - быстрее загрузить заново
+                self.load()
+                return len(changed)
+
+            present = []
+            for start in range(0, len(changed), ID_CHUNK_SIZE):
+                chunk = changed[start:start + ID_CHUNK_SIZE].tolist()
+                placeholders = ', '.join('?' * len(chunk))
+                cursor.execute(self._select_sql(f'WHERE id IN ({placeholders})'), chunk)
+                present.append(self._load_rows(cursor))
+            present = np.concatenate(present) if present else changed[:0]
+            # Строки, которых больше нет в таблице, удалены
+            self._remove(np.setdiff1d(changed, present))
+            self.last_seq = last_seq
+            self.refreshes += 1
+            return len(changed)
+
+    # ==================== ПОДСЧЕТЫ ====================
+
+    def _codes(self, name, values):
+        """Коды измерения по значениям (неизвестные названия курсов - код -1)"""
+        if name == 'course':
+            return [self.course_codes.get(value, -1) for value in values]
+        return [int(value) for value in values]
+
+    def _select(self, where, ids):
+        """Отбор строк: булева маска по всему кубу или массив номеров строк (для ids)"""
+        size = self.size
+        if ids is None:
+            select = self.alive[:size].copy()
+        else:
+            ids = np.asarray(ids, dtype=np.int64).ravel()
+            ids = ids[(ids >= 0) & (ids < len(self.row_of))]
+            select = self.row_of[np.unique(ids)]
+            select = select[select >= 0]
+
+        for name, value in (where or {}).items():
+            if isinstance(value, (list, tuple, set, frozenset, np.ndarray)):
+                codes = self._codes(name, value)
+            else:
+                codes = self._codes(name, [value])
+            if select.dtype == bool:
+                column = self.columns[name][:size]
+                select &= column == codes[0] if len(codes) == 1 else np.isin(column, codes)
+            else:
+                column = self.columns[name][select]
+                select = select[column == codes[0] if len(codes) == 1 else np.isin(column, codes)]
+        return select
+
+    def crosstab(self, dimensions=(), where=None, ids=None, sizes=None):
+        """Количества абитуриентов по сочетаниям кодов измерений
+
+        dimensions - имена из CUBE_DIMENSIONS (оси результата по порядку), where - условия
+        {измерение: значение или список значений}, ids - отбор по id абитуриентов,
+        sizes - наименьшая длина осей {измерение: длина}. Ось измерения из RANGE_DIMENSIONS
+        начинается с наименьшего отобранного значения; возвращает (массив, начала осей).
+        Массив только для чтения: повторный подсчет без ids берется из кэша.
+        """
+        with self.lock:
+            self.refresh()
+            key = None
+            if ids is None:
+                key = (
+                    tuple(dimensions),
+                    tuple(sorted(
+                        (name, tuple(value) if isinstance(value, (list, tuple, set, frozenset)) else value)
+                        for name, value in (where or {}).items()
+                    )),
+                    tuple(sorted((sizes or {}).items())),
+                )
+                if key in self.results:
+                    return self.results[key]
+            select = self._select(where, ids)
+            shape = []
+            origins = []
+            index = None
+            for name in dimensions:
+                codes = self.columns[name][:self.size][select].astype(np.int64)
+                origin = 0
+                if name in RANGE_DIMENSIONS:
+                    origin = int(codes.min()) if len(codes) else 0
+                    codes -= origin
+                    length = int(codes.max()) + 1 if len(codes) else 0
+                else:
+                    length = self.lengths[name]
+                length = max(length, (sizes or {}).get(name, 0))
+                index = codes if index is None else index * length + codes
+                shape.append(length)
+                origins.append(origin)
+
+            if index is None:
+                counts = np.array(np.count_nonzero(select) if select.dtype == bool else len(select))
+            else:
+                counts = np.bincount(index, minlength=int(np.prod(shape))).reshape(shape)
+            counts.flags.writeable = False
+            if key is not None:
+                self.results[key] = (counts, origins)
+            return counts, origins
+
+    def course_name(self, code):
+        return self.courses[code]
+
+    def stats(self):
+        """Размер куба и счетчики загрузок"""
+        with self.lock:
+            return {
+                'rows': self.size - self.dead,
+                'dead_rows': self.dead,
+                'courses': len(self.courses) - 1,
+                'bytes': int(
+                    self.ids.nbytes + self.alive.nbytes + self.row_of.nbytes
+                    + sum(column.nbytes for column in self.columns.values())
+                ),
+                'loads': self.loads,
+                'refreshes': self.refreshes,
+                'last_seq': self.last_seq,
+            }
+
+
+def benchmark(db, repeat=100):
+    """Время загрузки куба и типовых подсчетов на БД db, мс
+
+    Для каждого подсчета - (время без кэша результатов, как после изменения данных; время из кэша).
+    """
+    cube = db.analytics
+    results = {}
+
+    started = time.perf_counter()
+    cube.load()
+    load_time = (time.perf_counter() - started) * 1000
+
+    ids = cube.ids[:cube.size][cube.alive[:cube.size]]
+    queries = {
+        'department x status x category x document_status': lambda: cube.crosstab(
+            ('department', 'status', 'category', 'document_status')),
+        'region x status x category (department)': lambda: cube.crosstab(
+            ('region', 'status', 'category'), where={'department': int(cube.columns['department'][0])}),
+        'day x department (status)': lambda: cube.crosstab(('day', 'department'), where={'status': 1}),
+        'selection 1000 ids': lambda: cube.crosstab(
+            ('status', 'category', 'document_status'), ids=ids[:1000]),
+        'get_statistics_for_all_departments': lambda: db.get_statistics_for_all_departments(
+            time.localtime().tm_year, rollup=True),
+    }
+    for name, query in queries.items():
+        timings = []
+        for clear in (True, False):
+            elapsed = 0
+            for _ in range(repeat):
+                if clear:
+                    cube.results.clear()
+                started = time.perf_counter()
+                query()
+                elapsed += time.perf_counter() - started
+            timings.append(elapsed * 1000 / repeat)
+        results[name] = tuple(timings)
+    return cube.stats(), load_time, results
+
+
+def main():
+    from database import Database, load_db_config
+
+    parser = argparse.ArgumentParser(description="Замер скорости аналитического куба абитуриентов")
+    parser.add_argument('--db', help="файл БД (по умолчанию из настроек)")
+    parser.add_argument('--repeat', type=int, default=100, help="повторов каждого подсчета")
+    args = parser.parse_args()
+
+    config = load_db_config()
+    if args.db:
+        config['path'] = args.db
+    db = Database(config)
+    try:
+        stats, load_time, results = benchmark(db, args.repeat)
+    finally:
+        db.close()
+    print(f"Строк: {stats['rows']}, память: {stats['bytes'] / 1024 / 1024:.1f} МБ, загрузка: {load_time:.0f} мс")
+    for name, (cold, cached) in results.items():
+        print(f"{name}: {cold:.3f} мс, из кэша {cached:.3f} мс")
+
+
+if __name__ == '__main__':
+    main()
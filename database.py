@@ -1,17 +1,860 @@
 # -*- coding: utf-8 -*-
+import argparse
+import contextlib
+import datetime
+import functools
+import gc
+import json
+import math
+import os
+import re
 import sqlite3
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from analytics import CUBE_DIMENSION_NAMES, CUBE_DIMENSIONS, AnalyticsCube
+
+# Текущая версия схемы БД (хранится в PRAGMA user_version)
+SCHEMA_VERSION = 8
+
+# Файл с переопределением настроек БД (JSON, ключи как в DB_CONFIG)
+DB_CONFIG_FILE = 'db_config.json'
+
+# Настройки подключения к БД по умолчанию
+DB_CONFIG = {
+    'path': 'agitation.db',
+    # AUTO - WAL (чтение во время записи) для локального файла и DELETE для файла на сетевом
+    # диске: разделяемая память WAL в сетевых файловых системах не работает
+    'journal_mode': 'AUTO',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # мс
+    'cache_size': -16000,  # отрицательное значение - размер в КиБ
+    'mmap_size': 268435456,  # байт
+    'temp_store': 'MEMORY',
+    'import_batch_size': 1000,  # строк в одной транзакции при массовом импорте
+    'import_processes': 0,  # процессов разбора листов при импорте (0 - по числу ядер, 1 - без пула)
+    # Новый файл БД создается с возможностью инкрементального VACUUM
+    'auto_vacuum': 'INCREMENTAL',
+    # Обслуживание БД (см. maintenance.py)
+    'backup_dir': 'backups',  # относительно каталога файла БД
+    'backup_keep': 7,  # сколько последних резервных копий хранить
+    'backup_pages': 256,  # страниц за один шаг резервного копирования
+    'vacuum_pages': 2000,  # страниц за один запуск инкрементального VACUUM (0 - все)
+    'maintenance_interval_hours': 24,
+    # Режим сервера БД (см. db_server.py): при заданном server_url клиент работает через сервер
+    'server_url': '',  # например http://192.168.1.10:8765
+    'server_host': '127.0.0.1',
+    'server_port': 8765,
+    'server_token': '',  # общий токен клиентов и сервера (пусто - без проверки, только для 127.0.0.1)
+    'server_timeout': 120,  # секунд ожидания ответа сервера
+    'server_idle_timeout': 300,  # секунд до закрытия простаивающего соединения
+    'server_transaction_timeout': 30,  # секунд, которые может длиться транзакция клиента
+    # Аналитический куб (см. analytics.py): записей журнала изменений, остающихся после очистки
+    'change_log_keep': 100000,
+}
+
+# Сетевые файловые системы Linux и тип сетевого диска Windows (GetDriveTypeW) для is_network_path
+NETWORK_FILESYSTEMS = frozenset({'cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'afs', 'fuse.sshfs'})
+DRIVE_REMOTE = 4
+
+# Коды перечислимых полей абитуриента (applicants.category_code, applicants.status_code)
+CATEGORY_CODES = {'м': 1, 'ж': 2, 'всл': 3}
+STATUS_CODES = {'поступает': 1, 'отказывается': 2}
+
+# Ссылки на справочники по текстовым значениям (параметры - имя подразделения, региона, статуса документов)
+APPLICANT_REFERENCE_IDS_SQL = '''
+    (SELECT MIN(id) FROM departments WHERE name = ?),
+    (SELECT id FROM regions WHERE name = ?),
+    (SELECT id FROM document_statuses WHERE name = ?)
+'''
+
+# Вставка абитуриента (параметры - Database._applicant_insert_params)
+APPLICANT_INSERT_SQL = f'''
+    INSERT INTO applicants (
+        applicant_name, region, city, category, phone, education,
+        status, document_status, agitator_department, agitator_name,
+        agitator_course, agitator_group, agitator_rank, agitator_is_cadet,
+        created_by, applicant_key, category_code, status_code,
+        department_id, region_id, document_status_id
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {APPLICANT_REFERENCE_IDS_SQL})
+'''
+
+# Обновление абитуриента (параметры - Database._applicant_update_params)
+APPLICANT_UPDATE_SQL = f'''
+    UPDATE applicants SET
+        applicant_name = ?, region = ?, city = ?, category = ?,
+        phone = ?, education = ?, status = ?, document_status = ?,
+        agitator_department = ?, agitator_name = ?, agitator_course = ?,
+        agitator_group = ?, agitator_rank = ?, agitator_is_cadet = ?,
+        applicant_key = ?, category_code = ?, status_code = ?,
+        (department_id, region_id, document_status_id) = ({APPLICANT_REFERENCE_IDS_SQL}),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+'''
+
+# Групповое изменение поля у выделенных абитуриентов: поле -> выражение SET (:value - новое значение)
+APPLICANT_BULK_UPDATES = {
+    'status': 'status = :value, status_code = :status_code',
+    'document_status': (
+        'document_status = :value, '
+        'document_status_id = (SELECT id FROM document_statuses WHERE name = :value)'
+    ),
+    'agitator_department': (
+        'agitator_department = :value, '
+        'department_id = (SELECT MIN(id) FROM departments WHERE name = :value)'
+    ),
+}
+
+# Статусы документов в счетчиках статистики: ключ счетчика -> название статуса
+STATS_DOCUMENT_STATUSES = {'vk': 'ВК', 'ok': 'ОК', 'vavko': 'ВА ВКО'}
+
+# Измерения аналитического куба, по которым считаются счетчики статистики (последние оси
+# массива количеств для stats_counters)
+STATS_DIMENSIONS = ('status', 'category', 'document_status')
+
+DEPARTMENT_STATS_KEYS = [
+    'applying_vk', 'applying_ok', 'applying_vavko',
+    'applying_m', 'applying_f', 'applying_mil',
+    'refused_m', 'refused_f', 'refused_mil',
+    'vk_m', 'vk_f', 'vk_mil',
+    'ok_m', 'ok_f', 'ok_mil',
+    'vavko_m', 'vavko_f', 'vavko_mil',
+    'total'
+]
+
+# Счетчики статистики по курсам (doc1..doc3 - ВК, ОК, ВА ВКО)
+COURSE_STATS_KEYS = [
+    'total', 'applying', 'refused', 'male', 'female', 'military', 'doc1', 'doc2', 'doc3'
+]
+
+# Суммы планов по таблице plans
+PLAN_TOTAL_COLUMNS = '''
+        COALESCE(SUM(plan_m), 0) as plan_m,
+        COALESCE(SUM(plan_f), 0) as plan_f,
+        COALESCE(SUM(plan_military), 0) as plan_military
+'''
+
+# Колонки пользователя, которые возвращают методы Database (пароль не возвращается)
+USER_COLUMNS = 'id, username, full_name, role, department_id, position, rank, is_head, created_at'
+
+# Текстовые поля абитуриента в полнотекстовом индексе applicants_fts
+APPLICANT_FTS_COLUMNS = (
+    'applicant_name', 'region', 'city', 'phone',
+    'agitator_name', 'agitator_department', 'agitator_group',
+)
+
+# Поля, по которым работает быстрый поиск на вкладке данных
+QUICK_SEARCH_COLUMNS = (
+    'applicant_name', 'region', 'city', 'phone',
+    'agitator_name', 'agitator_department',
+)
+
+# Строка быстрого поиска, похожая на номер телефона: цифры и знаки оформления номера
+PHONE_QUERY_RE = re.compile(r'[\d\s+()\-.]*\d[\d\s+()\-.]*')
+
+# Поля списка абитуриентов (вкладка данных, экспорт, отчеты) в порядке полей ApplicantRecord
+APPLICANT_LIST_FIELDS = (
+    'id', 'applicant_name', 'region', 'city', 'category', 'phone', 'education',
+    'status', 'document_status', 'agitator_department', 'agitator_name',
+    'agitator_course', 'agitator_group', 'agitator_rank', 'agitator_is_cadet',
+    'created_at', 'updated_at',
+)
+
+# Колонки списка абитуриентов в запросах к applicants a
+APPLICANT_LIST_COLUMNS = ', '.join(f'a.{field}' for field in APPLICANT_LIST_FIELDS)
+
+def department_tree_cte(seed, rollup=True):
+    """CTE department_tree(ancestor_id, department_id) для WITH RECURSIVE
+
+    Пары (подразделение из условия seed, подразделение его поддерева), включая само
+    подразделение. Без rollup поддерево состоит только из самого подразделения.
+    UNION отбрасывает повторы, поэтому цикл в parent_id не зацикливает запрос.
+    """
+    cte = f'''
+        department_tree(ancestor_id, department_id) AS (
+            SELECT id, id FROM departments WHERE {seed}'''
+    if rollup:
+        cte += '''
+            UNION
+            SELECT t.ancestor_id, d.id
+            FROM departments d
+            JOIN department_tree t ON d.parent_id = t.department_id'''
+    return cte + '''
+        )'''
+
+
+def stats_counters(counts, document_status_ids):
+    """Счетчики статистики по массиву количеств [..., статус, категория, статус документов]
+
+    counts - результат AnalyticsCube.crosstab по STATS_DIMENSIONS (с любыми осями впереди),
+    document_status_ids - id статусов документов по ключам STATS_DOCUMENT_STATUSES.
+    Возвращает словарь массивов по ведущим осям с ключами DEPARTMENT_STATS_KEYS и COURSE_STATS_KEYS.
+    """
+    applying, refused = STATUS_CODES['поступает'], STATUS_CODES['отказывается']
+    categories = {'m': CATEGORY_CODES['м'], 'f': CATEGORY_CODES['ж'], 'mil': CATEGORY_CODES['всл']}
+    by_category = counts.sum(axis=-1)  # [..., статус, категория]
+    by_status = by_category.sum(axis=-1)
+    by_code = by_category.sum(axis=-2)
+    result = {'total': by_status.sum(axis=-1)}
+
+    for suffix, category in categories.items():
+        result[f'applying_{suffix}'] = by_category[..., applying, category]
+        result[f'refused_{suffix}'] = by_category[..., refused, category]
+
+    documents = []
+    for name in STATS_DOCUMENT_STATUSES:
+        document_status_id = document_status_ids.get(name)
+        if document_status_id is None or document_status_id >= counts.shape[-1]:
+            by_document = np.zeros(counts.shape[:-1], dtype=counts.dtype)
+        else:
+            by_document = counts[..., document_status_id]  # [..., статус, категория]
+        result[f'applying_{name}'] = by_document[..., applying, :].sum(axis=-1)
+        for suffix, category in categories.items():
+            result[f'{name}_{suffix}'] = by_document[..., :, category].sum(axis=-1)
+        documents.append(by_document.sum(axis=(-2, -1)))
+
+    result.update({
+        'applying': by_status[..., applying],
+        'refused': by_status[..., refused],
+        'male': by_code[..., categories['m']],
+        'female': by_code[..., categories['f']],
+        'military': by_code[..., categories['mil']],
+        'doc1': documents[0],
+        'doc2': documents[1],
+        'doc3': documents[2],
+    })
+    return result
+
+
+# Начало отсчета дней измерения day аналитического куба
+EPOCH_DATE = datetime.date(1970, 1, 1)
+
+
+def count_work_days(start, end, work_days):
+    """Число рабочих дней (номера дней недели work_days, пн=1) в интервале [start, end]"""
+    if end < start:
+        return 0
+    work_days = set(work_days)
+    weeks, rest = divmod((end - start).days + 1, 7)
+    count = weeks * len(work_days & set(range(1, 8)))
+    for offset in range(rest):
+        if (start + datetime.timedelta(days=weeks * 7 + offset)).isoweekday() in work_days:
+            count += 1
+    return count
+
+
+def project_plan_completion(series, plan, work_days, today):
+    """Темп набора и прогноз даты выполнения плана по нарастающему итогу
+
+    series - [(дата, нарастающий итог)] по возрастанию дат. Темп - среднее число записей
+    за рабочий день с первого дня набора по today. Возвращает (темп, дата или None).
+    """
+    if not series:
+        return 0.0, None
+    actual = series[-1][1]
+    # Набор мог идти и в нерабочие дни - темп считается хотя бы по одному дню
+    elapsed = max(count_work_days(series[0][0], today, work_days), 1)
+    rate = actual / elapsed
+
+    if plan and actual >= plan:
+        # План уже выполнен - день, когда итог достиг плана
+        return rate, next(day for day, total in series if total >= plan)
+    work_days = set(work_days) & set(range(1, 8))
+    if not plan or not rate or not work_days:
+        return rate, None
+
+    # День, на котором будет набран остаток плана при текущем темпе
+    remaining = math.ceil((plan - actual) / rate)
+    weeks, rest = divmod(remaining - 1, len(work_days))
+    day = today + datetime.timedelta(days=weeks * 7)
+    rest += 1
+    while rest:
+        day += datetime.timedelta(days=1)
+        if day.isoweekday() in work_days:
+            rest -= 1
+    return rate, day
+
+
+def load_db_config(config_file=DB_CONFIG_FILE):
+    """Загрузка настроек БД с учетом файла конфигурации"""
+    config = dict(DB_CONFIG)
+    if config_file and os.path.exists(config_file):
+        try:
+            with open(config_file, encoding='utf-8') as f:
+                config.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Ошибка чтения конфигурации БД: {e}")
+    return config
+
+
+def is_network_path(path):
+    """Находится ли файл на сетевом диске (общая папка Windows, SMB или NFS)"""
+    if os.name == 'nt':
+        import ctypes
+        drive = os.path.splitdrive(os.path.abspath(path))[0]
+        if drive.startswith(('\\\\', '//')):
+            return True
+        return ctypes.windll.kernel32.GetDriveTypeW(drive + '\\') == DRIVE_REMOTE
+    path = os.path.realpath(path)
+    try:
+        with open('/proc/mounts', encoding='utf-8') as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False
+    # Файловая система самой длинной точки монтирования, содержащей путь
+    fs_type, length = None, -1
+    for mount_point, mount_fs_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        if path == mount_point or path.startswith(mount_point.rstrip('/') + '/'):
+            if len(mount_point) > length:
+                fs_type, length = mount_fs_type, len(mount_point)
+    return fs_type in NETWORK_FILESYSTEMS
+
+
+def fold_search_text(text):
+    """Приведение текста к виду полнотекстового индекса (ё -> е)"""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def fts_match_expression(text, columns=None):
+    """Построение выражения FTS5 MATCH: все слова запроса как префиксы
+
+    Возвращает None, если в запросе нет ни одного слова.
+    """
+    words = re.findall(r'\w+', fold_search_text(text))
+    if not words:
+        return None
+    expression = ' '.join(f'"{word}"*' for word in words)
+    if columns:
+        return f"{{{' '.join(columns)}}} : ({expression})"
+    return expression
+
+
+def phone_search_digits(text):
+    """Цифры номера телефона из строки быстрого поиска; None, если строка - не номер
+
+    Номер из 10 и более цифр приводится к виду хранения (normalize_phone), более
+    короткая последовательность цифр ищется как часть номера.
+    """
+    if not PHONE_QUERY_RE.fullmatch(text.strip()):
+        return None
+    digits = ''.join(filter(str.isdigit, text))
+    return normalize_phone(digits) if len(digits) >= 10 else digits
+
+
+def normalize_phone(phone):
+    """Нормализация номера телефона: российский номер приводится к 11 цифрам с 7"""
+    if not phone:
+        return ""
+    # Номер из числовой ячейки Excel уже состоит из одних цифр
+    digits = phone if phone.isdigit() else ''.join(filter(str.isdigit, phone))
+    if len(digits) < 10:
+        return phone
+    if digits.startswith('8') and len(digits) == 11:
+        return '7' + digits[1:]
+    elif len(digits) == 10:
+        return '7' + digits
+    elif digits.startswith('7') and len(digits) == 11:
+        return digits
+    return digits
+
+
+def normalize_applicant_name(name):
+    """ФИО для сравнения: без учета регистра, ё -> е, одиночные пробелы"""
+    return ' '.join(fold_search_text((name or '').casefold()).split())
+
+
+def applicant_dedup_key(name, phone):
+    """Канонический ключ дубликата абитуриента (applicants.applicant_key): ФИО и телефон"""
+    return f"{normalize_applicant_name(name)}|{normalize_phone(phone).strip()}"
+
+
+def name_trigrams(name):
+    """Множество триграмм нормализованного ФИО (каждое слово дополняется пробелами)"""
+    trigrams = set()
+    for word in name.split():
+        padded = f"  {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+# Классы звуков для фонетического кода слова: звонкие согласные заменяются глухими
+PHONETIC_CONSONANTS = str.maketrans({
+    'б': 'п', 'в': 'ф', 'г': 'к', 'д': 'т', 'ж': 'ш', 'з': 'с', 'щ': 'ш', 'ц': 'с',
+})
+PHONETIC_SKIPPED = frozenset('аеиоуыэюяйьъ')
+
+
+def phonetic_code(word):
+    """Фонетический код слова ФИО: первая буква и согласный остов без повторов"""
+    if not word:
+        return ''
+    code = [word[0]]
+    for letter in word[1:].translate(PHONETIC_CONSONANTS):
+        if letter not in PHONETIC_SKIPPED and letter != code[-1]:
+            code.append(letter)
+    return ''.join(code)
+
+
+def name_blocking_keys(name):
+    """Ключи блоков для нормализованного ФИО
+
+    Ключ - фонетические коды двух слов из первых трех с их позициями; к ключу без
+    фамилии добавляется первая буква фамилии, чтобы блоки частых имен и отчеств
+    оставались небольшими. ФИО, различающиеся не более чем одним словом (кроме
+    ошибки в первой букве фамилии), попадают хотя бы в один общий блок.
+    """
+    words = name.split()[:3]
+    codes = [phonetic_code(word) for word in words]
+    if len(codes) == 1:
+        return [(0, codes[0])]
+    keys = []
+    for i in range(len(codes)):
+        for j in range(i + 1, len(codes)):
+            key = (i, j, codes[i], codes[j])
+            if i > 0:
+                key += (words[0][:1],)
+            keys.append(key)
+    return keys
+
+
+def find_similar_names(records, threshold=0.7, max_block_size=500):
+    """Поиск вероятных дубликатов среди записей (id, ФИО, телефон)
+
+    Одинаковые после нормализации ФИО сравниваются один раз. Пары-кандидаты
+    отбираются по фонетическим блокам (name_blocking_keys), записи с одинаковым
+    телефоном образуют отдельные блоки; блоки больше max_block_size пропускаются.
+    Сходство ФИО - коэффициент Жаккара по триграммам, для пар с одинаковым
+    телефоном порог вдвое ниже. Время работы почти линейно от числа записей.
+    Возвращает [(id1, id2, сходство, одинаковый_телефон)] по убыванию сходства.
+    """
+    ids = []
+    names = []
+    name_indexes = {}  # нормализованное ФИО -> номер в names
+    members = defaultdict(list)  # номер ФИО -> позиции записей
+    phone_blocks = defaultdict(list)  # телефон -> позиции записей
+    for record_id, name, phone in records:
+        name = normalize_applicant_name(name)
+        if not name:
+            continue
+        if name not in name_indexes:
+            name_indexes[name] = len(names)
+            names.append(name)
+        position = len(ids)
+        ids.append(record_id)
+        members[name_indexes[name]].append(position)
+        phone = normalize_phone(phone)
+        if len(phone) == 11 and phone.isdigit():
+            phone_blocks[phone].append(position)
+
+    record_names = [0] * len(ids)
+    for name_index, positions in members.items():
+        for position in positions:
+            record_names[position] = name_index
+
+    trigram_sets = [name_trigrams(name) for name in names]
+    scores = {}
+
+    def similarity(a, b):
+        if a == b:
+            return 1.0
+        if a > b:
+            a, b = b, a
+        score = scores.get((a, b))
+        if score is None:
+            common = len(trigram_sets[a] & trigram_sets[b])
+            score = scores[a, b] = common / (len(trigram_sets[a]) + len(trigram_sets[b]) - common)
+        return score
+
+    name_blocks = defaultdict(list)
+    for name_index, name in enumerate(names):
+        for key in name_blocking_keys(name):
+            name_blocks[key].append(name_index)
+
+    pairs = {}
+    for positions in members.values():
+        for k, second in enumerate(positions):
+            for first in positions[:k]:
+                pairs[first, second] = (1.0, False)
+
+    similar_names = set()
+    for block in name_blocks.values():
+        if len(block) > max_block_size:
+            continue
+        for k, b in enumerate(block):
+            for a in block[:k]:
+                if (a, b) not in similar_names and similarity(a, b) >= threshold:
+                    similar_names.add((a, b))
+    for a, b in similar_names:
+        score = similarity(a, b)
+        for first in members[a]:
+            for second in members[b]:
+                pairs[min(first, second), max(first, second)] = (score, False)
+
+    for positions in phone_blocks.values():
+        if len(positions) > max_block_size:
+            continue
+        for k, second in enumerate(positions):
+            for first in positions[:k]:
+                score = similarity(record_names[first], record_names[second])
+                if score >= threshold / 2:
+                    pairs[first, second] = (score, True)
+
+    result = [(ids[first], ids[second], score, same_phone)
+              for (first, second), (score, same_phone) in pairs.items()]
+    result.sort(key=lambda pair: (-pair[2], pair[0], pair[1]))
+    return result
+
+class ApplicantRecord(namedtuple('ApplicantRecord', APPLICANT_LIST_FIELDS)):
+    """Строка списка абитуриентов: кортеж полей APPLICANT_LIST_FIELDS
+
+    Занимает один кортеж без словаря на строку. Поля доступны атрибутами (record.phone),
+    по индексу и по имени (record['phone']), как у sqlite3.Row.
+    """
+    __slots__ = ()
+
+    _field_index = {field: index for index, field in enumerate(APPLICANT_LIST_FIELDS)}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                key = self._field_index[key]
+            except KeyError:
+                raise IndexError(f"No item with that key: {key}") from None
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return list(self._fields)
+
+    def get(self, key, default=None):
+        index = self._field_index.get(key)
+        return default if index is None else tuple.__getitem__(self, index)
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """row_factory курсора для запросов с колонками APPLICANT_LIST_COLUMNS"""
+        return tuple.__new__(cls, row)
+
+
+class ConnectionManager:
+    """Соединения с БД: один писатель и отдельный читатель для каждого потока"""
+
+    def __init__(self, config):
+        self.config = config
+        self.path = config['path']
+        self.journal_mode = self._journal_mode()
+        # Блокировка соединения-писателя (запись из GUI и потока импорта)
+        self.write_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self.writer = self._open(readonly=False)
+
+    def _open(self, readonly):
+        """Открытие соединения с настройкой PRAGMA"""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=int(self.config['busy_timeout']) / 1000,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+
+        if not readonly:
+            # Действует только для нового файла, до создания таблиц
+            conn.execute(f"PRAGMA auto_vacuum = {self._keyword('auto_vacuum')}")
+            conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self._keyword('synchronous')}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.config['busy_timeout'])}")
+        conn.execute(f"PRAGMA cache_size = {int(self.config['cache_size'])}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.config['mmap_size'])}")
+        conn.execute(f"PRAGMA temp_store = {self._keyword('temp_store')}")
+        if readonly:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+
+    def _journal_mode(self):
+        """Режим журнала из настроек; AUTO - DELETE для файла на сетевом диске, иначе WAL"""
+        mode = self._keyword('journal_mode')
+        if mode.upper() != 'AUTO':
+            return mode
+        return 'DELETE' if is_network_path(self.path) else 'WAL'
+
+    def _keyword(self, key):
+        """Значение PRAGMA-ключевого слова из настроек (только буквы и цифры)"""
+        value = str(self.config[key]).strip()
+        if not value.isalnum():
+            raise ValueError(f"Недопустимое значение настройки {key}: {value}")
+        return value
+
+    def open_reader(self):
+        """Отдельное соединение для чтения (закрывает вызывающий код)"""
+        return self._open(readonly=True)
+
+    def reader(self):
+        """Соединение для чтения текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open(readonly=True)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def close_reader(self):
+        """Закрытие соединения для чтения текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            with self._readers_lock:
+                if conn in self._readers:
+                    self._readers.remove(conn)
+            conn.close()
+
+    def close(self):
+        """Закрытие всех соединений"""
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        with self.write_lock:
+            self.writer.close()
 
 
-class Database:
+class ReferenceCache:
+    """Кэш справочных данных в памяти процесса
+
+    Значения хранятся по группам (справочникам); мутатор справочника сбрасывает свою группу.
+    """
+
     def __init__(self):
-        self.conn = None
+        self.lock = threading.Lock()
+        self.groups = {}  # группа -> {ключ: значение}
+        self.generation = 0  # увеличивается при каждом сбросе
+        self.data_version = None  # PRAGMA data_version на момент последней проверки
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, group, key):
+        """Поиск значения: (найдено, значение, поколение кэша)"""
+        with self.lock:
+            entries = self.groups.get(group)
+            if entries is not None and key in entries:
+                self.hits += 1
+                return True, entries[key], self.generation
+            self.misses += 1
+            return False, None, self.generation
+
+    def put(self, group, key, value, generation):
+        """Сохранение значения, если кэш не сбрасывался после его чтения из БД"""
+        with self.lock:
+            if generation == self.generation:
+                self.groups.setdefault(group, {})[key] = value
+
+    def invalidate(self, *groups):
+        """Сброс указанных групп (без аргументов - всего кэша)"""
+        with self.lock:
+            self.generation += 1
+            if groups:
+                for group in groups:
+                    self.groups.pop(group, None)
+            else:
+                self.groups.clear()
+
+    def check_data_version(self, data_version):
+        """Сброс всего кэша, если БД изменена другим соединением"""
+        with self.lock:
+            changed = self.data_version is not None and self.data_version != data_version
+            self.data_version = data_version
+        if changed:
+            self.invalidate()
+
+    def stats(self):
+        """Счетчики попаданий и промахов"""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': sum(len(entries) for entries in self.groups.values()),
+            }
+
+
+class VisibilityScope:
+    """Область видимости абитуриентов пользователя: свои записи и записи подразделений"""
+
+    __slots__ = ('user_id', 'own_records', 'department_ids')
+
+    def __init__(self, user_id, own_records, department_ids):
+        self.user_id = user_id
+        self.own_records = own_records
+        self.department_ids = tuple(sorted(department_ids))
+
+    def condition(self, alias='a'):
+        """Условие WHERE для таблицы абитуриентов: (строка условия, параметры)"""
+        parts = []
+        params = []
+        if self.own_records:
+            parts.append(f'{alias}.created_by = ?')
+            params.append(self.user_id)
+        if self.department_ids:
+            placeholders = ','.join(['?'] * len(self.department_ids))
+            parts.append(f'{alias}.department_id IN ({placeholders})')
+            params.extend(self.department_ids)
+        if not parts:
+            return '0', params
+        return ' OR '.join(parts), params
+
+
+def writes(method):
+    """Выполнение метода-мутатора под блокировкой соединения-писателя"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.connections.write_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def cached(group):
+    """Кэширование результата метода чтения справочника в группе кэша group"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            self.check_data_version()
+            key = (method.__name__, args, tuple(sorted(kwargs.items())))
+            found, value, generation = self.cache.get(group, key)
+            if not found:
+                value = method(self, *args, **kwargs)
+                self.cache.put(group, key, value, generation)
+            # Списки копируются, чтобы вызывающий код не изменил закэшированное значение
+            return list(value) if isinstance(value, list) else value
+        return wrapper
+    return decorator
+
+
+def invalidates(*groups):
+    """Сброс групп кэша справочников после выполнения мутатора
+
+    Внутри transaction() группы сбрасываются еще раз при ее завершении (см. transaction).
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.cache.invalidate(*groups)
+                if self._transaction_depth:
+                    self._transaction_groups.update(groups)
+        return wrapper
+    return decorator
+
+
+class Database:
+    def __init__(self, config=None):
+        self.config = config or load_db_config()
+        self.connections = None
+        self.cache = ReferenceCache()
+        # Глубина вложенности transaction() и поток, владеющий открытой транзакцией
+        self._transaction_depth = 0
+        self._transaction_thread = None
+        # Группы кэша, сброшенные мутаторами внутри открытой транзакции
+        self._transaction_groups = set()
+        # Аналитический куб статистики (загружается при первом подсчете)
+        self.analytics = AnalyticsCube(self)
         self.connect()
-        self.create_tables()
+        # Таблицы и начальные данные создаются только для новой или устаревшей схемы
+        if self.get_schema_version() < SCHEMA_VERSION:
+            self.create_tables()
+            self.migrate()
 
     def connect(self):
         """Подключение к базе данных"""
-        self.conn = sqlite3.connect('agitation.db', check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+        self.connections = ConnectionManager(self.config)
+
+    @property
+    def conn(self):
+        """Соединение-писатель"""
+        return self.connections.writer
+
+    def reader(self):
+        """Соединение для чтения, отдельное для каждого потока"""
+        if self._transaction_thread is threading.current_thread():
+            # Внутри transaction() чтение идет через писателя, чтобы видеть незафиксированные изменения
+            return self.conn
+        return self.connections.reader()
+
+    def close_reader(self):
+        """Закрытие соединения для чтения текущего потока (при завершении потока)"""
+        self.connections.close_reader()
+
+    def check_data_version(self):
+        """Сброс кэша справочников, если БД изменил другой процесс"""
+        # data_version соединения-писателя меняется только при фиксации изменений другими соединениями.
+        # Пока писатель занят (например, длинной транзакцией), проверка пропускается
+        if not self.connections.write_lock.acquire(blocking=False):
+            return
+        try:
+            data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        finally:
+            self.connections.write_lock.release()
+        self.cache.check_data_version(data_version)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Группа изменений с одной фиксацией в конце
+
+        Внутри блока мутаторы не фиксируют изменения сами; при исключении откатывается весь
+        блок. Вложенные блоки оформляются точками сохранения и откатываются отдельно.
+        """
+        with self.connections.write_lock:
+            depth = self._transaction_depth
+            cursor = self.conn.cursor()
+            if depth:
+                savepoint = f'sp_{depth}'
+                cursor.execute(f'SAVEPOINT {savepoint}')
+            elif not self.conn.in_transaction:
+                cursor.execute('BEGIN IMMEDIATE')
+            self._transaction_depth = depth + 1
+            self._transaction_thread = threading.current_thread()
+            try:
+                yield cursor
+            except BaseException:
+                if depth:
+                    cursor.execute(f'ROLLBACK TO {savepoint}')
+                    cursor.execute(f'RELEASE {savepoint}')
+                else:
+                    self.conn.rollback()
+                raise
+            else:
+                if depth:
+                    cursor.execute(f'RELEASE {savepoint}')
+                else:
+                    try:
+                        self.conn.commit()
+                    except sqlite3.Error:
+                        self.conn.rollback()
+                        raise
+            finally:
+                self._transaction_depth = depth
+                if not depth:
+                    self._transaction_thread = None
+                    # Значения затронутых групп, прочитанные до фиксации или отката (в том числе
+                    # другими потоками), могли не совпасть с БД; остальные группы не менялись
+                    groups, self._transaction_groups = self._transaction_groups, set()
+                    if groups:
+                        self.cache.invalidate(*groups)
+
+    def _commit(self):
+        """Фиксация изменений мутатора, если он вызван вне transaction()"""
+        if not self._transaction_depth:
+            self.conn.commit()
+
+    def cache_stats(self):
+        """Счетчики кэша справочников: попадания, промахи, число записей"""
+        return self.cache.stats()
 
     def create_tables(self):
         """Создание таблиц в базе данных"""
@@ -160,6 +1003,223 @@ class Database:
 
         self.conn.commit()
 
+    # ==================== МИГРАЦИИ ====================
+
+    def get_schema_version(self):
+        """Получение версии схемы БД"""
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def get_migrations(self):
+        """Список миграций схемы: (версия, функция миграции)"""
+        return [
+            (1, self._migration_applicant_indexes),
+            # Версии 2 и 5 (сводные таблицы статистики на триггерах) не используются:
+            # статистику считает аналитический куб по журналу миграции 7, она же удаляет
+            # эти таблицы из БД, созданных прежними версиями
+            (3, self._migration_applicants_fts),
+            (4, self._migration_integer_keys),
+            (6, self._migration_applicant_key),
+            (7, self._migration_applicant_changes),
+            (8, self._migration_unlinked_departments),
+        ]
+
+    def migrate(self):
+        """Применение недостающих миграций схемы"""
+        version = self.get_schema_version()
+        for target_version, migration in self.get_migrations():
+            if target_version <= version:
+                continue
+
+            with self.transaction() as cursor:
+                migration(cursor)
+                cursor.execute(f'PRAGMA user_version = {int(target_version)}')
+            version = target_version
+        return version
+
+    @staticmethod
+    def _migration_applicant_indexes(cursor):
+        """Миграция 1: индексы для фильтров, поиска дубликатов и статистики"""
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_department
+            ON applicants (agitator_department)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_created_by
+            ON applicants (created_by)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_name_phone
+            ON applicants (applicant_name, phone)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_status_category_doc
+            ON applicants (status, category, document_status)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_course
+            ON applicants (agitator_course)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_region
+            ON applicants (region)
+        ''')
+
+    @staticmethod
+    def _migration_applicants_fts(cursor):
+        """Миграция 3: полнотекстовый индекс по текстовым полям абитуриентов"""
+        columns = ', '.join(APPLICANT_FTS_COLUMNS)
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS applicants_fts USING fts5(
+                {columns},
+                tokenize = 'unicode61'
+            )
+        ''')
+
+        # В индекс попадает текст с заменой ё на е, см. fold_search_text
+        def folded_values(row):
+            return ', '.join(
+                f"replace(replace({row}{column}, 'ё', 'е'), 'Ё', 'Е')" for column in APPLICANT_FTS_COLUMNS
+            )
+
+        new_values = folded_values('NEW.')
+        insert = f'''
+            INSERT INTO applicants_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+        '''
+        delete = '''
+            DELETE FROM applicants_fts WHERE rowid = OLD.id;
+        '''
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_applicants_fts_insert
+            AFTER INSERT ON applicants
+            BEGIN {insert} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_applicants_fts_delete
+            AFTER DELETE ON applicants
+            BEGIN {delete} END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_applicants_fts_update
+            AFTER UPDATE OF {columns} ON applicants
+            BEGIN {delete} {insert} END
+        ''')
+
+        cursor.execute('DELETE FROM applicants_fts')
+        cursor.execute(f'''
+            INSERT INTO applicants_fts (rowid, {columns})
+            SELECT id, {folded_values('')}
+            FROM applicants
+        ''')
+
+    @staticmethod
+    def _migration_integer_keys(cursor):
+        """Миграция 4: ссылки на справочники и коды перечислимых полей абитуриента"""
+        cursor.execute('ALTER TABLE applicants ADD COLUMN department_id INTEGER REFERENCES departments(id)')
+        cursor.execute('ALTER TABLE applicants ADD COLUMN region_id INTEGER REFERENCES regions(id)')
+        cursor.execute('ALTER TABLE applicants ADD COLUMN document_status_id INTEGER REFERENCES document_statuses(id)')
+        cursor.execute('ALTER TABLE applicants ADD COLUMN category_code INTEGER')
+        cursor.execute('ALTER TABLE applicants ADD COLUMN status_code INTEGER')
+
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_departments_name ON departments (name)')
+
+        category_case = ' '.join(f"WHEN '{name}' THEN {code}" for name, code in CATEGORY_CODES.items())
+        status_case = ' '.join(f"WHEN '{name}' THEN {code}" for name, code in STATUS_CODES.items())
+        cursor.execute(f'''
+            UPDATE applicants SET
+                department_id = (SELECT MIN(id) FROM departments WHERE name = applicants.agitator_department),
+                region_id = (SELECT id FROM regions WHERE name = applicants.region),
+                document_status_id = (SELECT id FROM document_statuses WHERE name = applicants.document_status),
+                category_code = CASE category {category_case} END,
+                status_code = CASE status {status_case} END
+        ''')
+
+        # Индексы по текстовым колонкам заменяются индексами по ключам
+        cursor.execute('DROP INDEX IF EXISTS idx_applicants_department')
+        cursor.execute('DROP INDEX IF EXISTS idx_applicants_region')
+        cursor.execute('DROP INDEX IF EXISTS idx_applicants_status_category_doc')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_department_id
+            ON applicants (department_id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_region_id
+            ON applicants (region_id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_codes
+            ON applicants (status_code, category_code, document_status_id)
+        ''')
+
+    @staticmethod
+    def _migration_applicant_key(cursor):
+        """Миграция 6: канонический ключ дубликата с уникальным индексом"""
+        cursor.execute('ALTER TABLE applicants ADD COLUMN applicant_key TEXT')
+
+        # Ключ получает самая ранняя из совпадающих записей; у уже имеющихся
+        # дубликатов ключ остается пустым, их находит find_probable_duplicates
+        keys = set()
+        rows = []
+        cursor.execute('SELECT id, applicant_name, phone FROM applicants ORDER BY id')
+        for row in cursor.fetchall():
+            key = applicant_dedup_key(row['applicant_name'], row['phone'])
+            if key not in keys:
+                keys.add(key)
+                rows.append((key, row['id']))
+        cursor.executemany('UPDATE applicants SET applicant_key = ? WHERE id = ?', rows)
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_applicants_key
+            ON applicants (applicant_key)
+        ''')
+
+    @staticmethod
+    def _migration_applicant_changes(cursor):
+        """Миграция 7: журнал изменений абитуриентов для аналитического куба
+
+        Куб (analytics.py) заменяет сводные таблицы applicant_stats и daily_applicant_counts,
+        которые создавали миграции 2 и 5 прежних версий: их триггеры и таблицы удаляются.
+        """
+        # AUTOINCREMENT: номера не повторяются и после очистки журнала
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS applicant_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                applicant_id INTEGER NOT NULL
+            )
+        ''')
+        watched = ', '.join(dimension[2] for dimension in CUBE_DIMENSIONS)
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_applicant_changes_insert
+            AFTER INSERT ON applicants
+            BEGIN INSERT INTO applicant_changes (applicant_id) VALUES (NEW.id); END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_applicant_changes_delete
+            AFTER DELETE ON applicants
+            BEGIN INSERT INTO applicant_changes (applicant_id) VALUES (OLD.id); END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_applicant_changes_update
+            AFTER UPDATE OF {watched} ON applicants
+            BEGIN INSERT INTO applicant_changes (applicant_id) VALUES (NEW.id); END
+        ''')
+
+        for table in ('applicant_stats', 'daily_applicant_counts'):
+            for event in ('insert', 'delete', 'update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS trg_{table}_{event}')
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+    @staticmethod
+    def _migration_unlinked_departments(cursor):
+        """Миграция 8: индекс названий подразделений у абитуриентов без department_id
+
+        Остальные абитуриенты ищутся по department_id; частичный индекс содержит только
+        названия, не найденные в справочнике, и нужен для их привязки и фильтра.
+        """
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_applicants_unlinked_department
+            ON applicants (agitator_department) WHERE department_id IS NULL
+        ''')
+
     def init_default_data(self):
         """Инициализация начальных данных (только если таблицы пустые)"""
         cursor = self.conn.cursor()
@@ -237,11 +1297,11 @@ class Database:
             keep_id = dup['keep_id']
             # Удаляем дубликаты, оставляя один
             cursor.execute('DELETE FROM departments WHERE name = ? AND id != ?', (name, keep_id))
-        self.conn.commit()
+        self._commit()
 
     def get_all_departments_with_heads(self):
         """Получение всех подразделений с информацией о начальниках"""
-        cursor = self.conn.cursor()
+        cursor = self.reader().cursor()
         cursor.execute('''
             SELECT d.*, u.full_name as head_name
             FROM departments d
@@ -258,13 +1318,17 @@ class Database:
         ''')
         return cursor.fetchall()
 
+    @writes
+    @invalidates('departments')
     def set_department_head(self, department_id, user_id):
         """Назначение начальника подразделения"""
         cursor = self.conn.cursor()
         cursor.execute('UPDATE departments SET head_user_id = ? WHERE id = ?', (user_id, department_id))
-        self.conn.commit()
+        self._commit()
         return cursor.rowcount > 0
 
+    @writes
+    @invalidates('departments', 'permissions')
     def update_department(self, department_id, data):
         """Обновление подразделения"""
         cursor = self.conn.cursor()
@@ -273,12 +1337,23 @@ class Database:
             SET name = ?, type = ?, parent_id = ?
             WHERE id = ?
         ''', (data['name'], data['type'], data.get('parent_id'), department_id))
-        self.conn.commit()
-        return cursor.rowcount > 0
+        updated = cursor.rowcount > 0
+        # Абитуриенты связаны с подразделением по id, название обновляется для отображения
+        cursor.execute(
+            'UPDATE applicants SET agitator_department = ? WHERE department_id = ?',
+            (data['name'], department_id)
+        )
+        # Привязка абитуриентов, у которых новое название было введено до переименования
+        cursor.execute(
+            'UPDATE applicants SET department_id = ? WHERE department_id IS NULL AND agitator_department = ?',
+            (department_id, data['name'])
+        )
+        self._commit()
+        return updated
 
     def get_all_users_for_head(self):
         """Получение всех пользователей для назначения начальником (без админов)"""
-        cursor = self.conn.cursor()
+        cursor = self.reader().cursor()
         cursor.execute('''
             SELECT id, full_name, department_id 
             FROM users 
@@ -289,17 +1364,18 @@ class Database:
 
     # ==================== РАБОТА С АБИТУРИЕНТАМИ ====================
 
+    @writes
     def add_applicant(self, user_id, data):
         """Добавление абитуриента"""
         cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO applicants (
-                applicant_name, region, city, category, phone, education,
-                status, document_status, agitator_department, agitator_name,
-                agitator_course, agitator_group, agitator_rank, agitator_is_cadet,
-                created_by
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        cursor.execute(APPLICANT_INSERT_SQL, self._applicant_insert_params(user_id, data))
+        self._commit()
+        return cursor.lastrowid
+
+    @staticmethod
+    def _applicant_insert_params(user_id, data):
+        """Параметры APPLICANT_INSERT_SQL из словаря данных"""
+        return (
             data.get('applicant_name', ''),
             data.get('region', ''),
             data.get('city', ''),
@@ -314,115 +1390,277 @@ class Database:
             data.get('agitator_group', ''),
             data.get('agitator_rank', ''),
             1 if data.get('agitator_is_cadet') else 0,
-            user_id
-        ))
-        self.conn.commit()
-        return cursor.lastrowid
+            user_id,
+            applicant_dedup_key(data.get('applicant_name'), data.get('phone')),
+        ) + Database._applicant_key_params(data)
+
+    @staticmethod
+    def _applicant_key_params(data):
+        """Коды полей и имена справочников для APPLICANT_REFERENCE_IDS_SQL"""
+        return (
+            CATEGORY_CODES.get(data.get('category', '')),
+            STATUS_CODES.get(data.get('status', 'поступает')),
+            data.get('agitator_department', ''),
+            data.get('region', ''),
+            data.get('document_status', ''),
+        )
 
-    def check_duplicate_applicant(self, name, phone):
-        """Проверка на дубликат абитуриента"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT id FROM applicants WHERE applicant_name = ? AND phone = ?', (name, phone))
+    def add_applicants_bulk(self, user_id, applicants, batch_size=None, on_batch=None):
+        """Массовое добавление абитуриентов пакетами (одна транзакция на пакет)
+
+        Дубликаты (ФИО + телефон) в БД и внутри загружаемых данных пропускаются.
+        on_batch(обработано_записей, счетчики_пакета) вызывается после каждого пакета.
+        Возвращает список счетчиков по пакетам: {'inserted', 'duplicates', 'errors'}.
+        """
+        batch_size = batch_size or int(self.config['import_batch_size'])
+        seen_keys = set()
+        batches = []
+        processed = 0
+
+        batch = []
+        for data in applicants:
+            batch.append(data)
+            if len(batch) >= batch_size:
+                batches.append(self._insert_applicants_batch(user_id, batch, seen_keys))
+                processed += len(batch)
+                batch = []
+                if on_batch:
+                    on_batch(processed, batches[-1])
+        if batch:
+            batches.append(self._insert_applicants_batch(user_id, batch, seen_keys))
+            processed += len(batch)
+            if on_batch:
+                on_batch(processed, batches[-1])
+
+        return batches
+
+    def _insert_applicants_batch(self, user_id, batch, seen_keys):
+        """Вставка одного пакета абитуриентов в отдельной транзакции"""
+        stats = {'inserted': 0, 'duplicates': 0, 'errors': 0}
+
+        with self.connections.write_lock:
+            cursor = self.conn.cursor()
+            batch_keys = [applicant_dedup_key(data.get('applicant_name'), data.get('phone')) for data in batch]
+            existing_keys = self._existing_applicant_keys(cursor, set(batch_keys))
+
+            rows = []
+            row_keys = []
+            for data, key in zip(batch, batch_keys):
+                if not data.get('applicant_name'):
+                    stats['errors'] += 1
+                    continue
+                if key in existing_keys or key in seen_keys:
+                    stats['duplicates'] += 1
+                    continue
+                seen_keys.add(key)
+                row_keys.append(key)
+                rows.append(self._applicant_insert_params(user_id, data))
+
+            if not rows:
+                return stats
+
+            with self.transaction() as cursor:
+                try:
+                    with self.transaction():
+                        cursor.executemany(APPLICANT_INSERT_SQL, rows)
+                    stats['inserted'] = len(rows)
+                except sqlite3.Error:
+                    # Пакет содержит некорректные строки - вставляем построчно
+                    for row, key in zip(rows, row_keys):
+                        try:
+                            with self.transaction():
+                                cursor.execute(APPLICANT_INSERT_SQL, row)
+                            stats['inserted'] += 1
+                        except sqlite3.Error as e:
+                            stats['errors'] += 1
+                            seen_keys.discard(key)
+                            print(f"Ошибка добавления: {e}")
+
+        return stats
+
+    @staticmethod
+    def _existing_applicant_keys(cursor, keys):
+        """Канонические ключи дубликатов из указанных, уже имеющиеся в БД"""
+        keys = list(keys)
+        existing = set()
+        # Ограничение SQLite на количество параметров запроса
+        chunk_size = 500
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            placeholders = ','.join(['?'] * len(chunk))
+            cursor.execute(
+                f'SELECT applicant_key FROM applicants WHERE applicant_key IN ({placeholders})',
+                chunk
+            )
+            existing.update(row['applicant_key'] for row in cursor.fetchall())
+        return existing
+
+    def check_duplicate_applicant(self, name, phone, exclude_id=None):
+        """Проверка на дубликат абитуриента по каноническому ключу (ФИО и телефон)"""
+        cursor = self.reader().cursor()
+        cursor.execute(
+            'SELECT id FROM applicants WHERE applicant_key = ? AND id IS NOT ?',
+            (applicant_dedup_key(name, phone), exclude_id)
+        )
         return cursor.fetchone() is not None
 
-    def get_applicants(self, user_id=None, role=None, department=None, filters=None):
-        """Получение списка абитуриентов с учетом прав доступа и фильтров"""
-        cursor = self.conn.cursor()
+    def find_probable_duplicates(self, user_id=None, role=None, threshold=0.7):
+        """Вероятные дубликаты среди видимых пользователю абитуриентов
 
-        query = '''
-                SELECT 
-                    a.id,
-                    a.applicant_name,
-                    a.region,
-                    a.city,
-                    a.category,
-                    a.phone,
-                    a.education,
-                    a.status,
-                    a.document_status,
-                    a.agitator_department,
-                    a.agitator_name,
-                    a.agitator_course,
-                    a.agitator_group,
-                    a.agitator_rank,
-                    a.agitator_is_cadet,
-                    a.created_at,
-                    a.updated_at
-                FROM applicants a
-                WHERE 1=1
-            '''
-        params = []
+        Пары записей с похожими ФИО (см. find_similar_names) по убыванию сходства:
+        словари с ключами id1, name1, phone1, id2, name2, phone2, similarity, same_phone.
+        """
+        cursor = self.reader().cursor()
+        conditions, params = self._applicants_conditions(user_id, role)
+        cursor.execute(f'''
+            SELECT a.id, a.applicant_name, a.phone
+            FROM applicants a
+            WHERE 1=1 {conditions}
+        ''', params)
+        rows = {row['id']: row for row in cursor.fetchall()}
+
+        records = ((row['id'], row['applicant_name'], row['phone']) for row in rows.values())
+        duplicates = []
+        for id1, id2, similarity, same_phone in find_similar_names(records, threshold):
+            duplicates.append({
+                'id1': id1, 'name1': rows[id1]['applicant_name'], 'phone1': rows[id1]['phone'],
+                'id2': id2, 'name2': rows[id2]['applicant_name'], 'phone2': rows[id2]['phone'],
+                'similarity': similarity, 'same_phone': same_phone,
+            })
+        return duplicates
+
+    def get_applicants(self, user_id=None, role=None, department=None, filters=None, search_text=None):
+        """Получение списка абитуриентов с учетом прав доступа, фильтров и строки поиска"""
+        cursor = self.reader().cursor()
+        cursor.row_factory = ApplicantRecord.row_factory
+        conditions, params = self._applicants_conditions(user_id, role, filters, search_text)
+        cursor.execute(f'''
+            SELECT {APPLICANT_LIST_COLUMNS}
+            FROM applicants a
+            WHERE 1=1 {conditions}
+            ORDER BY a.id DESC
+        ''', params)
+        return cursor.fetchall()
 
+    def get_applicants_page(self, user_id=None, role=None, filters=None, search_text=None,
+                            page_size=500, after=None):
+        """Страница списка абитуриентов (постраничная выборка по ключу)
+
+        Сортировка по убыванию id: продолжение страницы идет по первичному ключу без OFFSET.
+        after - id последней строки предыдущей страницы.
+        Возвращает (строки, курсор следующей страницы или None, если страница последняя).
+        """
+        cursor = self.reader().cursor()
+        cursor.row_factory = ApplicantRecord.row_factory
+        conditions, params = self._applicants_conditions(user_id, role, filters, search_text)
+
+        if after is not None:
+            conditions += ' AND a.id < ?'
+            params.append(after)
+
+        cursor.execute(f'''
+            SELECT {APPLICANT_LIST_COLUMNS}
+            FROM applicants a
+            WHERE 1=1 {conditions}
+            ORDER BY a.id DESC
+            LIMIT ?
+        ''', params + [page_size])
+        rows = cursor.fetchall()
+
+        next_after = rows[-1]['id'] if len(rows) == page_size else None
+        return rows, next_after
+
+    def iter_applicants(self, user_id=None, role=None, filters=None, search_text=None,
+                        page_size=500):
+        """Потоковый обход списка абитуриентов страницами постоянного размера"""
+        after = None
+        while True:
+            rows, after = self.get_applicants_page(
+                user_id, role, filters, search_text, page_size, after
+            )
+            yield from rows
+            if after is None:
+                break
+
+    def count_applicants(self, user_id=None, role=None, filters=None, search_text=None):
+        """Количество абитуриентов с учетом прав доступа, фильтров и строки поиска"""
+        cursor = self.reader().cursor()
+        conditions, params = self._applicants_conditions(user_id, role, filters, search_text)
+        cursor.execute(f'SELECT COUNT(*) FROM applicants a WHERE 1=1 {conditions}', params)
+        return cursor.fetchone()[0]
+
+    @cached('scopes')
+    def get_visibility_scope(self, user_id, role):
+        """Область видимости абитуриентов пользователя (None - видит всех)"""
         if role == 'admin':
             # Админ видит всех
-            pass
-        else:
-            # Получаем информацию о пользователе
-            user_info = self.get_user_by_id(user_id)
-            user_dict = dict(user_info) if user_info else {}
-
-            if user_dict.get('is_head') and user_dict.get('department_id'):
-                # Начальник видит всех абитуриентов своего подразделения
-                query += ' AND a.agitator_department = (SELECT name FROM departments WHERE id = ?)'
-                params.append(user_dict['department_id'])
-            else:
-                # Обычный пользователь видит только своих абитуриентов
-                query += ' AND a.created_by = ?'
-                params.append(user_id)
-
-                # Проверяем права доступа к другим подразделениям
-                permissions = self.get_user_department_permissions(user_id)
-                if permissions:
-                    dept_names = [p['department_name'] for p in permissions if p['can_view']]
-                    if dept_names:
-                        placeholders = ','.join(['?'] * len(dept_names))
-                        query += f' OR a.agitator_department IN ({placeholders})'
-                        params.extend(dept_names)
+            return None
+
+        user_info = self.get_user_by_id(user_id)
+        user_dict = dict(user_info) if user_info else {}
+
+        if user_dict.get('is_head') and user_dict.get('department_id'):
+            # Начальник видит всех абитуриентов своего подразделения
+            return VisibilityScope(user_id, False, [user_dict['department_id']])
+
+        # Обычный пользователь видит своих абитуриентов и подразделения, на которые есть право просмотра
+        permissions = self.get_user_department_permissions(user_id)
+        return VisibilityScope(user_id, True, [p['department_id'] for p in permissions if p['can_view']])
+
+    def _applicants_conditions(self, user_id=None, role=None, filters=None, search_text=None):
+        """Условия WHERE для выборки абитуриентов с учетом прав доступа, фильтров и строки поиска
+
+        Возвращает (строка условий, начинающихся с ' AND ...', список параметров).
+        """
+        query = ''
+        params = []
+
+        scope = self.get_visibility_scope(user_id, role)
+        if scope is not None:
+            visibility, scope_params = scope.condition('a')
+            query += f' AND ({visibility})'
+            params.extend(scope_params)
+
+        # Текстовые условия собираются в одно выражение полнотекстового поиска
+        match_terms = []
+        # Телефон хранится одним словом из цифр, поэтому номер или его часть
+        # ищется подстрокой, а не префиксом слова
+        phone_digits = phone_search_digits(search_text) if search_text else None
+        if search_text and phone_digits is None:
+            match_terms.append(fts_match_expression(search_text, QUICK_SEARCH_COLUMNS))
 
         if filters:
             # AND между разными полями (все условия должны выполняться)
             and_conditions = []
 
-            # ФИО абитуриента
-            if filters.get('applicant_name'):
-                and_conditions.append("a.applicant_name LIKE ?")
-                params.append(f"%{filters['applicant_name']}%")
-            # Регион
-            if filters.get('region'):
-                and_conditions.append("a.region LIKE ?")
-                params.append(f"%{filters['region']}%")
-            # Населенный пункт
-            if filters.get('city'):
-                and_conditions.append("a.city LIKE ?")
-                params.append(f"%{filters['city']}%")
+            # ФИО абитуриента, регион, населенный пункт, ФИО и группа агитатора
+            for field in ('applicant_name', 'region', 'city', 'agitator_name', 'agitator_group'):
+                if filters.get(field):
+                    match_terms.append(fts_match_expression(filters[field], [field]))
             # Категория
             if filters.get('category'):
-                and_conditions.append("a.category = ?")
-                params.append(filters['category'])
+                and_conditions.append("a.category_code = ?")
+                params.append(CATEGORY_CODES.get(filters['category']))
             # Статус
             if filters.get('status'):
-                and_conditions.append("a.status = ?")
-                params.append(filters['status'])
-            # ФИО агитатора
-            if filters.get('agitator_name'):
-                and_conditions.append("a.agitator_name LIKE ?")
-                params.append(f"%{filters['agitator_name']}%")
-            # Подразделение агитатора
+                and_conditions.append("a.status_code = ?")
+                params.append(STATUS_CODES.get(filters['status']))
+            # Подразделение агитатора: привязанные абитуриенты по department_id,
+            # остальные по названию (idx_applicants_unlinked_department)
             if filters.get('agitator_department'):
-                and_conditions.append("a.agitator_department = ?")
-                params.append(filters['agitator_department'])
+                and_conditions.append(
+                    "(a.department_id IN (SELECT id FROM departments WHERE name = ?)"
+                    " OR (a.department_id IS NULL AND a.agitator_department = ?))"
+                )
+                params.extend([filters['agitator_department']] * 2)
             # Статус документов
             if filters.get('document_status'):
-                and_conditions.append("a.document_status = ?")
+                and_conditions.append("a.document_status_id = (SELECT id FROM document_statuses WHERE name = ?)")
                 params.append(filters['document_status'])
             # Курс агитатора
             if filters.get('agitator_course') and filters['agitator_course'] not in ['все', 'Все курсы']:
                 and_conditions.append("a.agitator_course = ?")
                 params.append(filters['agitator_course'])
-            # Группа агитатора
-            if filters.get('agitator_group'):
-                and_conditions.append("a.agitator_group LIKE ?")
-                params.append(f"%{filters['agitator_group']}%")
             # Тип агитатора
             if 'agitator_is_cadet' in filters:
                 and_conditions.append("a.agitator_is_cadet = ?")
@@ -435,23 +1673,23 @@ class Database:
 
             if and_conditions:
                 query += " AND (" + " AND ".join(and_conditions) + ")"
-        query += ' ORDER BY a.id DESC'
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        return results
 
+        if phone_digits:
+            query += (' AND (instr(a.phone, ?) > 0 OR a.id IN '
+                      '(SELECT rowid FROM applicants_fts WHERE applicants_fts MATCH ?))')
+            params.extend([phone_digits, fts_match_expression(search_text, QUICK_SEARCH_COLUMNS)])
+
+        match_terms = [term for term in match_terms if term]
+        if match_terms:
+            query += ' AND a.id IN (SELECT rowid FROM applicants_fts WHERE applicants_fts MATCH ?)'
+            params.append(' AND '.join(match_terms))
+        return query, params
+
+    @writes
     def update_applicant(self, applicant_id, data):
         """Обновление данных абитуриента"""
         cursor = self.conn.cursor()
-        cursor.execute('''
-            UPDATE applicants SET
-                applicant_name = ?, region = ?, city = ?, category = ?,
-                phone = ?, education = ?, status = ?, document_status = ?,
-                agitator_department = ?, agitator_name = ?, agitator_course = ?,
-                agitator_group = ?, agitator_rank = ?, agitator_is_cadet = ?,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        ''', (
+        cursor.execute(APPLICANT_UPDATE_SQL, (
             data.get('applicant_name', ''),
             data.get('region', ''),
             data.get('city', ''),
@@ -466,95 +1704,253 @@ class Database:
             data.get('agitator_group', ''),
             data.get('agitator_rank', ''),
             1 if data.get('agitator_is_cadet') else 0,
-            applicant_id
-        ))
-        self.conn.commit()
+            applicant_dedup_key(data.get('applicant_name'), data.get('phone')),
+        ) + self._applicant_key_params(data) + (applicant_id,))
+        self._commit()
         return cursor.rowcount > 0
 
+    @writes
     def delete_applicant(self, applicant_id):
         """Удаление абитуриента"""
         cursor = self.conn.cursor()
         cursor.execute('DELETE FROM applicants WHERE id = ?', (applicant_id,))
-        self.conn.commit()
+        self._commit()
         return cursor.rowcount > 0
 
+    @staticmethod
+    def _fill_selected_ids(cursor, applicant_ids):
+        """Заполнение временной таблицы selected_ids идентификаторами выделенных записей"""
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS selected_ids (id INTEGER PRIMARY KEY)')
+        cursor.execute('DELETE FROM temp.selected_ids')
+        cursor.executemany(
+            'INSERT OR IGNORE INTO temp.selected_ids (id) VALUES (?)',
+            ((int(applicant_id),) for applicant_id in applicant_ids)
+        )
+
+    @writes
+    def delete_applicants(self, applicant_ids):
+        """Удаление группы абитуриентов одним запросом; возвращает число удаленных"""
+        with self.transaction() as cursor:
+            self._fill_selected_ids(cursor, applicant_ids)
+            cursor.execute('DELETE FROM applicants WHERE id IN (SELECT id FROM temp.selected_ids)')
+            return cursor.rowcount
+
+    @writes
+    def update_applicants(self, applicant_ids, field, value):
+        """Установка значения поля у группы абитуриентов одним запросом
+
+        field - ключ APPLICANT_BULK_UPDATES. Возвращает число измененных записей.
+        """
+        if field not in APPLICANT_BULK_UPDATES:
+            raise ValueError(f"Недопустимое поле для группового изменения: {field}")
+
+        with self.transaction() as cursor:
+            self._fill_selected_ids(cursor, applicant_ids)
+            cursor.execute(f'''
+                UPDATE applicants SET
+                    {APPLICANT_BULK_UPDATES[field]},
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id IN (SELECT id FROM temp.selected_ids)
+            ''', {'value': value, 'status_code': STATUS_CODES.get(value)})
+            return cursor.rowcount
+
+    def get_applicants_by_ids(self, applicant_ids, chunk_size=500):
+        """Строки списка абитуриентов по идентификаторам (для обновления строк таблицы)"""
+        applicant_ids = list(applicant_ids)
+        cursor = self.reader().cursor()
+        cursor.row_factory = ApplicantRecord.row_factory
+        rows = []
+        for start in range(0, len(applicant_ids), chunk_size):
+            chunk = applicant_ids[start:start + chunk_size]
+            placeholders = ','.join(['?'] * len(chunk))
+            cursor.execute(f'''
+                SELECT {APPLICANT_LIST_COLUMNS}
+                FROM applicants a
+                WHERE a.id IN ({placeholders})
+            ''', chunk)
+            rows.extend(cursor.fetchall())
+        return rows
+
+    def get_applicant(self, applicant_id):
+        """Все поля абитуриента по ID (для окна редактирования)"""
+        cursor = self.reader().cursor()
+        cursor.execute('SELECT * FROM applicants WHERE id = ?', (applicant_id,))
+        return cursor.fetchone()
+
+    def get_agitator_departments(self):
+        """Названия подразделений агитаторов, указанные у абитуриентов (без пустых)"""
+        cursor = self.reader().cursor()
+        # У привязанных абитуриентов название совпадает с названием подразделения
+        cursor.execute('''
+            SELECT d.name AS agitator_department FROM departments d
+            WHERE d.name != '' AND EXISTS (SELECT 1 FROM applicants a WHERE a.department_id = d.id)
+            UNION
+            SELECT agitator_department FROM applicants
+            WHERE department_id IS NULL AND agitator_department IS NOT NULL AND agitator_department != ''
+            ORDER BY agitator_department
+        ''')
+        return [row['agitator_department'] for row in cursor.fetchall()]
+
     # ==================== РАБОТА СО СПРАВОЧНИКАМИ ====================
 
+    @cached('regions')
     def get_regions(self):
         """Получение списка регионов"""
-        cursor = self.conn.cursor()
+        cursor = self.reader().cursor()
         cursor.execute('SELECT name FROM regions ORDER BY name')
         return [row['name'] for row in cursor.fetchall()]
 
+    @cached('regions')
+    def get_region_id(self, name):
+        """ID региона по названию (None - нет в справочнике)"""
+        cursor = self.reader().cursor()
+        cursor.execute('SELECT id FROM regions WHERE name = ?', (name,))
+        row = cursor.fetchone()
+        return row['id'] if row else None
+
+    @writes
+    @invalidates('regions')
     def add_region(self, name):
         """Добавление региона"""
         cursor = self.conn.cursor()
         try:
             cursor.execute('INSERT INTO regions (name) VALUES (?)', (name,))
-            self.conn.commit()
+            # Привязка абитуриентов, у которых регион был введен до появления в справочнике
+            cursor.execute(
+                'UPDATE applicants SET region_id = ? WHERE region_id IS NULL AND region = ?',
+                (cursor.lastrowid, name)
+            )
+            self._commit()
             return True
         except sqlite3.IntegrityError:
             return False
 
+    @writes
+    @invalidates('regions')
     def delete_region(self, name):
         """Удаление региона"""
         cursor = self.conn.cursor()
+        cursor.execute(
+            'UPDATE applicants SET region_id = NULL WHERE region_id IN (SELECT id FROM regions WHERE name = ?)',
+            (name,)
+        )
         cursor.execute('DELETE FROM regions WHERE name = ?', (name,))
-        self.conn.commit()
+        self._commit()
         return cursor.rowcount > 0
 
+    @cached('education_types')
     def get_education_types(self):
         """Получение списка типов образования"""
-        cursor = self.conn.cursor()
+        cursor = self.reader().cursor()
         cursor.execute('SELECT name FROM education_types ORDER BY sort_order')
         return [row['name'] for row in cursor.fetchall()]
 
+    @writes
+    @invalidates('education_types')
     def add_education_type(self, name):
         """Добавление типа образования"""
         cursor = self.conn.cursor()
         try:
             cursor.execute('INSERT INTO education_types (name) VALUES (?)', (name,))
-            self.conn.commit()
+            self._commit()
             return True
         except sqlite3.IntegrityError:
             return False
 
+    @writes
+    @invalidates('education_types')
     def delete_education_type(self, name):
         """Удаление типа образования"""
         cursor = self.conn.cursor()
         cursor.execute('DELETE FROM education_types WHERE name = ?', (name,))
-        self.conn.commit()
+        self._commit()
         return cursor.rowcount > 0
 
+    @cached('document_statuses')
     def get_document_statuses(self):
         """Получение списка статусов документов"""
-        cursor = self.conn.cursor()
+        cursor = self.reader().cursor()
         cursor.execute('SELECT name FROM document_statuses ORDER BY sort_order')
         return [row['name'] for row in cursor.fetchall()]
 
+    @writes
+    @invalidates('document_statuses')
     def add_document_status(self, name):
         """Добавление статуса документов"""
         cursor = self.conn.cursor()
         try:
             cursor.execute('INSERT INTO document_statuses (name) VALUES (?)', (name,))
-            self.conn.commit()
+            cursor.execute(
+                'UPDATE applicants SET document_status_id = ? WHERE document_status_id IS NULL AND document_status = ?',
+                (cursor.lastrowid, name)
+            )
+            self._commit()
             return True
         except sqlite3.IntegrityError:
             return False
 
+    @writes
+    @invalidates('document_statuses')
     def delete_document_status(self, name):
         """Удаление статуса документов"""
         cursor = self.conn.cursor()
+        cursor.execute(
+            'UPDATE applicants SET document_status_id = NULL '
+            'WHERE document_status_id IN (SELECT id FROM document_statuses WHERE name = ?)',
+            (name,)
+        )
         cursor.execute('DELETE FROM document_statuses WHERE name = ?', (name,))
-        self.conn.commit()
+        self._commit()
         return cursor.rowcount > 0
 
+    @cached('departments')
     def get_departments(self):
         """Получение списка подразделений (уникальные)"""
-        cursor = self.conn.cursor()
+        cursor = self.reader().cursor()
         cursor.execute('SELECT DISTINCT id, name, type FROM departments WHERE type != "root" ORDER BY name')
         return cursor.fetchall()
 
+    @cached('departments')
+    def get_department_names(self):
+        """Названия подразделений без корневого (без дублей)"""
+        cursor = self.reader().cursor()
+        cursor.execute('SELECT DISTINCT name FROM departments WHERE type != "root" ORDER BY name')
+        return [row['name'] for row in cursor.fetchall()]
+
+    @cached('departments')
+    def get_parent_department_names(self):
+        """Названия подразделений, которые могут быть родительскими: факультеты, затем кафедры"""
+        cursor = self.reader().cursor()
+        cursor.execute('''
+            SELECT name FROM departments
+            WHERE type IN ('faculty', 'department')
+            ORDER BY
+                CASE type
+                    WHEN 'faculty' THEN 1
+                    WHEN 'department' THEN 2
+                    ELSE 3
+                END,
+                name
+        ''')
+        return [row['name'] for row in cursor.fetchall()]
+
+    @cached('departments')
+    def get_department(self, dept_id):
+        """Подразделение по ID"""
+        cursor = self.reader().cursor()
+        cursor.execute('SELECT * FROM departments WHERE id = ?', (dept_id,))
+        return cursor.fetchone()
+
+    @cached('departments')
+    def get_department_id(self, name):
+        """ID подразделения по названию (None - не найдено)"""
+        cursor = self.reader().cursor()
+        cursor.execute('SELECT id FROM departments WHERE name = ?', (name,))
+        row = cursor.fetchone()
+        return row['id'] if row else None
+
+    @writes
+    @invalidates('departments')
     def add_department(self, name, dept_type='department', parent_id=None):
         """Добавление подразделения"""
         cursor = self.conn.cursor()
@@ -562,21 +1958,42 @@ class Database:
             'INSERT INTO departments (name, type, parent_id) VALUES (?, ?, ?)',
             (name, dept_type, parent_id)
         )
-        self.conn.commit()
-        return cursor.lastrowid
+        dept_id = cursor.lastrowid
+        cursor.execute(
+            'UPDATE applicants SET department_id = ? WHERE department_id IS NULL AND agitator_department = ?',
+            (dept_id, name)
+        )
+        self._commit()
+        return dept_id
 
+    @writes
+    @invalidates('departments', 'permissions', 'scopes')
     def delete_department(self, dept_id):
-        """Удаление подразделения"""
+        """Удаление подразделения вместе с правами пользователей на него"""
         cursor = self.conn.cursor()
+        cursor.execute('DELETE FROM user_department_permissions WHERE department_id = ?', (dept_id,))
+        cursor.execute('UPDATE applicants SET department_id = NULL WHERE department_id = ?', (dept_id,))
         cursor.execute('DELETE FROM departments WHERE id = ?', (dept_id,))
-        self.conn.commit()
+        self._commit()
         return cursor.rowcount > 0
 
     # ==================== ПЛАНЫ ====================
 
-    def get_plan(self, department_id, year):
-        """Получение плана для подразделения на год"""
-        cursor = self.conn.cursor()
+    def get_plan(self, department_id, year, rollup=False):
+        """Получение плана для подразделения на год
+
+        С rollup план суммируется по подразделению и всем его подчиненным подразделениям.
+        """
+        cursor = self.reader().cursor()
+        if rollup:
+            cursor.execute(f'''
+                WITH RECURSIVE {department_tree_cte('id = ?')}
+                SELECT {PLAN_TOTAL_COLUMNS}
+                FROM plans
+                WHERE year = ? AND department_id IN (SELECT department_id FROM department_tree)
+            ''', (department_id, year))
+            return dict(cursor.fetchone())
+
         cursor.execute('''
             SELECT plan_m, plan_f, plan_military 
             FROM plans 
@@ -587,6 +2004,7 @@ class Database:
             return dict(result)
         return {'plan_m': 0, 'plan_f': 0, 'plan_military': 0}
 
+    @writes
     def set_plan(self, department_id, year, plan_m, plan_f, plan_military):
         """Установка плана для подразделения на год"""
         cursor = self.conn.cursor()
@@ -599,14 +2017,15 @@ class Database:
                 plan_military = excluded.plan_military,
                 updated_at = CURRENT_TIMESTAMP
         ''', (department_id, year, plan_m, plan_f, plan_military))
-        self.conn.commit()
+        self._commit()
         return True
 
     # ==================== ПРАВА ДОСТУПА ====================
 
+    @cached('permissions')
     def get_user_department_permissions(self, user_id):
         """Получение прав пользователя на подразделения"""
-        cursor = self.conn.cursor()
+        cursor = self.reader().cursor()
         cursor.execute('''
             SELECT p.*, d.name as department_name
             FROM user_department_permissions p
@@ -615,6 +2034,8 @@ class Database:
         ''', (user_id,))
         return cursor.fetchall()
 
+    @writes
+    @invalidates('permissions', 'scopes')
     def add_user_department_permission(self, user_id, department_id, can_view=True, can_edit_plan=False):
         """Добавление права на подразделение"""
         cursor = self.conn.cursor()
@@ -623,119 +2044,299 @@ class Database:
                 INSERT INTO user_department_permissions (user_id, department_id, can_view, can_edit_plan)
                 VALUES (?, ?, ?, ?)
             ''', (user_id, department_id, can_view, can_edit_plan))
-            self.conn.commit()
+            self._commit()
             return True
         except sqlite3.IntegrityError:
             return False
 
+    @writes
+    @invalidates('permissions', 'scopes')
+    def clear_user_department_permissions(self, user_id):
+        """Удаление всех прав пользователя на подразделения"""
+        cursor = self.conn.cursor()
+        cursor.execute('DELETE FROM user_department_permissions WHERE user_id = ?', (user_id,))
+        self._commit()
+
     # ==================== СТАТИСТИКА ====================
 
-    # В database.py, исправьте метод get_statistics_by_department:
+    @cached('document_statuses')
+    def _stats_document_status_ids(self):
+        """id статусов документов для счетчиков статистики (ключи STATS_DOCUMENT_STATUSES)"""
+        cursor = self.reader().cursor()
+        cursor.execute('SELECT id, name FROM document_statuses')
+        ids = {row['name']: row['id'] for row in cursor.fetchall()}
+        return tuple((key, ids.get(name)) for key, name in STATS_DOCUMENT_STATUSES.items())
+
+    def _stats_crosstab(self, dimensions=(), where=None, ids=None):
+        """Счетчики статистики из аналитического куба по измерениям dimensions + STATS_DIMENSIONS"""
+        document_status_ids = dict(self._stats_document_status_ids())
+        known_ids = [value for value in document_status_ids.values() if value is not None]
+        counts, origins = self.analytics.crosstab(
+            tuple(dimensions) + STATS_DIMENSIONS, where, ids,
+            sizes={
+                'status': max(STATUS_CODES.values()) + 1,
+                'category': max(CATEGORY_CODES.values()) + 1,
+                'document_status': max(known_ids, default=0) + 1,
+            }
+        )
+        return stats_counters(counts, document_status_ids), origins
+
+    def _department_tree_pairs(self, seed, params, rollup):
+        """Пары (подразделение, подразделение его поддерева) по department_tree_cte"""
+        cursor = self.reader().cursor()
+        cursor.execute(f'''
+            WITH RECURSIVE {department_tree_cte(seed, rollup)}
+            SELECT ancestor_id, department_id FROM department_tree
+        ''', params)
+        return [(row['ancestor_id'], row['department_id']) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _rollup_counts(counts, pairs, positions):
+        """Сумма количеств по поддеревьям: строка positions[предок] += counts[подразделение]
+
+        counts - массив с подразделением (id) на первой оси, pairs - пары (предок, подразделение).
+        """
+        pairs = [(positions[ancestor], department) for ancestor, department in pairs
+                 if department < counts.shape[0]]
+        result = np.zeros((len(positions),) + counts.shape[1:], dtype=np.int64)
+        if pairs:
+            rows, departments = (np.array(column, dtype=np.intp) for column in zip(*pairs))
+            np.add.at(result, rows, counts[departments])
+        return result
 
-    def get_statistics_by_department(self, department_name=None):
-        """Получение статистики по подразделению с разделением по полу"""
-        cursor = self.conn.cursor()
+    # В database.py, исправьте метод get_statistics_by_department:
 
-        query = '''
-            SELECT 
-                -- Поступают по статусам документов
-                COUNT(CASE WHEN status = 'поступает' AND document_status = 'ВК' THEN 1 END) as applying_vk,
-                COUNT(CASE WHEN status = 'поступает' AND document_status = 'ОК' THEN 1 END) as applying_ok,
-                COUNT(CASE WHEN status = 'поступает' AND document_status = 'ВА ВКО' THEN 1 END) as applying_vavko,
-
-                -- Поступают по полу (ВНИМАНИЕ: используем правильные имена)
-                COUNT(CASE WHEN status = 'поступает' AND category = 'м' THEN 1 END) as applying_m,
-                COUNT(CASE WHEN status = 'поступает' AND category = 'ж' THEN 1 END) as applying_f,
-                COUNT(CASE WHEN status = 'поступает' AND category = 'всл' THEN 1 END) as applying_mil,
-
-                -- Отказались по полу
-                COUNT(CASE WHEN status = 'отказывается' AND category = 'м' THEN 1 END) as refused_m,
-                COUNT(CASE WHEN status = 'отказывается' AND category = 'ж' THEN 1 END) as refused_f,
-                COUNT(CASE WHEN status = 'отказывается' AND category = 'всл' THEN 1 END) as refused_mil,
-
-                -- Документы по полу (ВК)
-                COUNT(CASE WHEN document_status = 'ВК' AND category = 'м' THEN 1 END) as vk_m,
-                COUNT(CASE WHEN document_status = 'ВК' AND category = 'ж' THEN 1 END) as vk_f,
-                COUNT(CASE WHEN document_status = 'ВК' AND category = 'всл' THEN 1 END) as vk_mil,
-
-                -- Документы по полу (ОК)
-                COUNT(CASE WHEN document_status = 'ОК' AND category = 'м' THEN 1 END) as ok_m,
-                COUNT(CASE WHEN document_status = 'ОК' AND category = 'ж' THEN 1 END) as ok_f,
-                COUNT(CASE WHEN document_status = 'ОК' AND category = 'всл' THEN 1 END) as ok_mil,
-
-                -- Документы по полу (ВА ВКО)
-                COUNT(CASE WHEN document_status = 'ВА ВКО' AND category = 'м' THEN 1 END) as vavko_m,
-                COUNT(CASE WHEN document_status = 'ВА ВКО' AND category = 'ж' THEN 1 END) as vavko_f,
-                COUNT(CASE WHEN document_status = 'ВА ВКО' AND category = 'всл' THEN 1 END) as vavko_mil,
-
-                -- Общее количество
-                COUNT(*) as total
-            FROM applicants
-            WHERE 1=1
-        '''
-        params = []
+    def get_statistics_by_department(self, department_name=None, rollup=False):
+        """Получение статистики по подразделению с разделением по полу
 
+        С rollup учитываются и все подчиненные подразделения (по дереву parent_id).
+        """
+        where = None
         if department_name and department_name != 'Все подразделения':
-            query += ' AND agitator_department = ?'
-            params.append(department_name)
+            pairs = self._department_tree_pairs('name = ?', [department_name], rollup)
+            where = {'department': [department for _, department in pairs]}
+
+        counters, _ = self._stats_crosstab(where=where)
+        return {key: int(counters[key]) for key in DEPARTMENT_STATS_KEYS}
+
+    def get_statistics_for_all_departments(self, year, rollup=False):
+        """Статистика и план по всем подразделениям
+
+        С rollup статистика и план каждого подразделения включают все его подчиненные
+        подразделения: план суммируется рекурсивным запросом, статистика - по кубу.
+        """
+        cursor = self.reader().cursor()
+        cursor.execute(f'''
+            WITH RECURSIVE {department_tree_cte("type != 'root'", rollup)},
+            plan_totals AS (
+                SELECT t.ancestor_id as department_id, {PLAN_TOTAL_COLUMNS}
+                FROM department_tree t
+                JOIN plans p ON p.department_id = t.department_id AND p.year = ?
+                GROUP BY t.ancestor_id
+            )
+            SELECT
+                d.id as department_id,
+                d.name as department_name,
+                COALESCE(p.plan_m, 0) as plan_m,
+                COALESCE(p.plan_f, 0) as plan_f,
+                COALESCE(p.plan_military, 0) as plan_military
+            FROM departments d
+            LEFT JOIN plan_totals p ON p.department_id = d.id
+            WHERE d.type != 'root'
+            ORDER BY d.name
+        ''', (year,))
+        departments = [dict(row) for row in cursor.fetchall()]
+        positions = {department['department_id']: i for i, department in enumerate(departments)}
+
+        counters, _ = self._stats_crosstab(('department',))
+        pairs = self._department_tree_pairs("type != 'root'", [], rollup)
+        counters = {
+            key: self._rollup_counts(counters[key], pairs, positions) for key in DEPARTMENT_STATS_KEYS
+        }
+        for i, department in enumerate(departments):
+            department.update((key, int(counters[key][i])) for key in DEPARTMENT_STATS_KEYS)
+        return departments
+
+    def get_selection_statistics(self, applicant_ids):
+        """Статистика по набору абитуриентов (выделенные строки таблицы)
+
+        Возвращает счетчики COURSE_STATS_KEYS и courses - {курс агитатора: количество}.
+        """
+        counters, _ = self._stats_crosstab(ids=list(applicant_ids))
+        stats = {key: int(counters[key]) for key in COURSE_STATS_KEYS}
+
+        counts, _ = self.analytics.crosstab(('course',), ids=list(applicant_ids))
+        stats['courses'] = {
+            self.analytics.course_name(code): int(count)
+            for code, count in enumerate(counts)
+            if count and self.analytics.course_name(code)
+        }
+        return stats
+
+    def rebuild_applicant_stats(self):
+        """Полная перезагрузка аналитического куба статистики из таблицы абитуриентов"""
+        self.analytics.load()
+
+    def check_applicant_stats(self):
+        """Проверка согласованности аналитического куба с таблицей абитуриентов
+
+        Возвращает список расхождений: (id абитуриента, ожидаемые коды измерений, коды в кубе).
+        """
+        cube = self.analytics
+        expected = AnalyticsCube(self)
+        # Оба куба читают соединение потока: обновление и эталонная загрузка выполняются
+        # в одной транзакции чтения, то есть по одному снимку БД
+        reader = self.connections.reader()
+        with cube.lock:
+            reader.execute('BEGIN')
+            try:
+                cube.refresh()
+                expected.load()
+            finally:
+                reader.rollback()
+            ids = np.union1d(
+                cube.ids[:cube.size][cube.alive[:cube.size]],
+                expected.ids[:expected.size][expected.alive[:expected.size]]
+            )
 
-        cursor.execute(query, params)
-        result = cursor.fetchone()
+            def codes(source):
+                rows = source.row_of[np.minimum(ids, len(source.row_of) - 1)]
+                rows[ids >= len(source.row_of)] = -1
+                values = []
+                for name in CUBE_DIMENSION_NAMES:
+                    column = source.columns[name][rows].tolist()
+                    if name == 'course':
+                        column = [source.course_name(code) for code in column]
+                    values.append(column)
+                return rows, list(zip(*values)) if len(ids) else []
+
+            cube_rows, cube_codes = codes(cube)
+            expected_rows, expected_codes = codes(expected)
+            return [
+                (
+                    int(applicant_id),
+                    expected_codes[i] if expected_rows[i] >= 0 else None,
+                    cube_codes[i] if cube_rows[i] >= 0 else None,
+                )
+                for i, applicant_id in enumerate(ids)
+                if cube_rows[i] < 0 or expected_rows[i] < 0 or cube_codes[i] != expected_codes[i]
+            ]
 
-        if result:
-            return dict(result)
+    @writes
+    def prune_applicant_changes(self, keep=None):
+        """Очистка журнала изменений абитуриентов; возвращает число удаленных записей
 
-        # Возвращаем пустую статистику с правильными ключами
-        return {
-            'applying_vk': 0,
-            'applying_ok': 0,
-            'applying_vavko': 0,
-            'applying_m': 0,
-            'applying_f': 0,
-            'applying_mil': 0,
-            'refused_m': 0,
-            'refused_f': 0,
-            'refused_mil': 0,
-            'vk_m': 0,
-            'vk_f': 0,
-            'vk_mil': 0,
-            'ok_m': 0,
-            'ok_f': 0,
-            'ok_mil': 0,
-            'vavko_m': 0,
-            'vavko_f': 0,
-            'vavko_mil': 0,
-            'total': 0
-        }
+        Остаются последние keep записей (по умолчанию change_log_keep). Куб, отставший
+        больше чем на keep изменений, при следующем подсчете загрузится заново.
+        """
+        keep = int(self.config['change_log_keep'] if keep is None else keep)
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            DELETE FROM applicant_changes
+            WHERE seq <= (SELECT MAX(seq) FROM applicant_changes) - ?
+        ''', (keep,))
+        self._commit()
+        return cursor.rowcount
+
+    def get_plan_progress(self, year, department_name=None, rollup=False, today=None):
+        """Ход выполнения плана по дням и прогноз даты его выполнения
+
+        Поступающие абитуриенты считаются по дням добавления из аналитического куба,
+        темп - по рабочим дням из get_work_days. Без department_name - по всем подразделениям.
+        Возвращает список словарей: department_id, department_name, plan, actual,
+        series [(дата, нарастающий итог)], rate (записей за рабочий день), projected_date.
+        """
+        if department_name and department_name != 'Все подразделения':
+            seed, params = 'name = ?', [department_name]
+        else:
+            seed, params = "type != 'root'", []
+        tree = department_tree_cte(seed, rollup)
+        cursor = self.reader().cursor()
+
+        cursor.execute(f'''
+            WITH RECURSIVE {tree}
+            SELECT t.ancestor_id as department_id, d.name as department_name, {PLAN_TOTAL_COLUMNS}
+            FROM department_tree t
+            JOIN departments d ON d.id = t.ancestor_id
+            LEFT JOIN plans p ON p.department_id = t.department_id AND p.year = ?
+            GROUP BY t.ancestor_id
+            ORDER BY d.name
+        ''', params + [year])
+        departments = [
+            {
+                'department_id': row['department_id'],
+                'department_name': row['department_name'],
+                'plan': row['plan_m'] + row['plan_f'] + row['plan_military'],
+                'series': [],
+            }
+            for row in cursor.fetchall()
+        ]
+        positions = {department['department_id']: i for i, department in enumerate(departments)}
+
+        # Поступающие по подразделениям и дням года
+        counts, (_, origin) = self.analytics.crosstab(
+            ('department', 'day'), where={'status': STATUS_CODES['поступает']}
+        )
+        start = max((datetime.date(int(year), 1, 1) - EPOCH_DATE).days - origin, 0)
+        end = max((datetime.date(int(year) + 1, 1, 1) - EPOCH_DATE).days - origin, start)
+        pairs = self._department_tree_pairs(seed, params, rollup)
+        daily = self._rollup_counts(counts[:, start:end], pairs, positions)
+        for department, row in zip(departments, daily):
+            days = np.flatnonzero(row)
+            department['series'] = [
+                (EPOCH_DATE + datetime.timedelta(days=int(day) + start + origin), int(total))
+                for day, total in zip(days, np.cumsum(row[days]))
+            ]
+
+        # Для прошедшего года темп считается по 31 декабря
+        today = min(today or datetime.date.today(), datetime.date(int(year), 12, 31))
+        work_days = self.get_work_days()
+        for department in departments:
+            department['actual'] = department['series'][-1][1] if department['series'] else 0
+            department['rate'], department['projected_date'] = project_plan_completion(
+                department['series'], department['plan'], work_days, today
+            )
+        return departments
 
     # ==================== ПОЛЬЗОВАТЕЛИ ====================
 
     def get_user_by_credentials(self, username, password):
-        """Получение пользователя по логину и паролю"""
-        cursor = self.conn.cursor()
+        """Получение пользователя по логину и паролю (без пароля)"""
+        cursor = self.reader().cursor()
         cursor.execute(
-            'SELECT * FROM users WHERE username = ? AND password = ?',
+            f'SELECT {USER_COLUMNS} FROM users WHERE username = ? AND password = ?',
             (username, password)
         )
         return cursor.fetchone()
 
+    @cached('users')
     def get_user_by_id(self, user_id):
-        """Получение пользователя по ID"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+        """Получение пользователя по ID (без пароля)"""
+        cursor = self.reader().cursor()
+        cursor.execute(f'SELECT {USER_COLUMNS} FROM users WHERE id = ?', (user_id,))
         return cursor.fetchone()
 
+    @cached('users')
+    def get_user_names(self):
+        """ID, ФИО и роль всех пользователей по алфавиту (для выбора начальника подразделения)"""
+        cursor = self.reader().cursor()
+        cursor.execute('SELECT id, full_name, role FROM users ORDER BY full_name')
+        return cursor.fetchall()
+
     def get_all_users(self):
-        """Получение всех пользователей"""
-        cursor = self.conn.cursor()
+        """Получение всех пользователей (без паролей)"""
+        cursor = self.reader().cursor()
         cursor.execute('''
-            SELECT u.*, d.name as department_name 
+            SELECT u.id, u.username, u.full_name, u.role, u.department_id, u.position,
+                   u.rank, u.is_head, u.created_at, d.name as department_name
             FROM users u
             LEFT JOIN departments d ON d.id = u.department_id
             ORDER BY u.id DESC
         ''')
         return cursor.fetchall()
 
+    @writes
+    @invalidates('users')
     def add_user(self, username, password, full_name, role='user', department_id=None,
                  position=None, rank=None, is_head=False):
         """Добавление нового пользователя"""
@@ -746,12 +2347,14 @@ class Database:
                                  position, rank, is_head) 
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (username, password, full_name, role, department_id, position, rank, is_head))
-            self.conn.commit()
+            self._commit()
             return cursor.lastrowid
         except sqlite3.IntegrityError as e:
             print(f"Ошибка добавления пользователя: {e}")
             return None
 
+    @writes
+    @invalidates('users', 'scopes')
     def update_user(self, user_id, data):
         """Обновление данных пользователя"""
         cursor = self.conn.cursor()
@@ -766,19 +2369,21 @@ class Database:
                 data['role'], data.get('department_id'), data.get('position'),
                 data.get('rank'), data.get('is_head', False), user_id
             ))
-            self.conn.commit()
+            self._commit()
             return cursor.rowcount > 0
         except Exception as e:
             print(f"Ошибка обновления пользователя: {e}")
             return False
 
+    @writes
+    @invalidates('users', 'permissions', 'scopes')
     def delete_user(self, user_id):
         """Удаление пользователя"""
         cursor = self.conn.cursor()
         try:
             cursor.execute('DELETE FROM user_department_permissions WHERE user_id = ?', (user_id,))
             cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
-            self.conn.commit()
+            self._commit()
             return cursor.rowcount > 0
         except Exception as e:
             print(f"Ошибка удаления пользователя: {e}")
@@ -788,70 +2393,25 @@ class Database:
 
     def get_statistics(self, user_id=None, role=None, course=None, faculty=None):
         """Получение статистики для StatisticsWidget (совместимость со старым кодом)"""
-        cursor = self.conn.cursor()
+        if role == 'admin' and course and course != 'Все курсы':
+            # Статистика по конкретному курсу
+            counters, _ = self._stats_crosstab(where={'course': course})
+            return [dict({'course': course}, **{key: int(counters[key]) for key in COURSE_STATS_KEYS})]
 
         if role == 'admin':
-            if course and course != 'Все курсы':
-                # Статистика по конкретному курсу
-                cursor.execute('''
-                    SELECT 
-                        ? as course,
-                        COUNT(*) as total,
-                        COUNT(CASE WHEN status = 'поступает' THEN 1 END) as applying,
-                        COUNT(CASE WHEN status = 'отказывается' THEN 1 END) as refused,
-                        COUNT(CASE WHEN category = 'м' THEN 1 END) as male,
-                        COUNT(CASE WHEN category = 'ж' THEN 1 END) as female,
-                        COUNT(CASE WHEN category = 'всл' THEN 1 END) as military,
-                        COUNT(CASE WHEN document_status = 'ВК' THEN 1 END) as doc1,
-                        COUNT(CASE WHEN document_status = 'ОК' THEN 1 END) as doc2,
-                        COUNT(CASE WHEN document_status = 'ВА ВКО' THEN 1 END) as doc3
-                    FROM applicants 
-                    WHERE agitator_course = ?
-                ''', (course, course))
-            else:
-                # Общая статистика по всем курсам
-                cursor.execute('''
-                    SELECT 
-                        agitator_course as course,
-                        COUNT(*) as total,
-                        COUNT(CASE WHEN status = 'поступает' THEN 1 END) as applying,
-                        COUNT(CASE WHEN status = 'отказывается' THEN 1 END) as refused,
-                        COUNT(CASE WHEN category = 'м' THEN 1 END) as male,
-                        COUNT(CASE WHEN category = 'ж' THEN 1 END) as female,
-                        COUNT(CASE WHEN category = 'всл' THEN 1 END) as military,
-                        COUNT(CASE WHEN document_status = 'ВК' THEN 1 END) as doc1,
-                        COUNT(CASE WHEN document_status = 'ОК' THEN 1 END) as doc2,
-                        COUNT(CASE WHEN document_status = 'ВА ВКО' THEN 1 END) as doc3
-                    FROM applicants 
-                    WHERE agitator_course IS NOT NULL AND agitator_course != ''
-                    GROUP BY agitator_course
-                ''')
+            # Общая статистика по всем курсам (без пустого курса)
+            counters, _ = self._stats_crosstab(('course',))
         else:
-            # Для обычного пользователя
-            cursor.execute('''
-                SELECT 
-                    agitator_course as course,
-                    COUNT(*) as total,
-                    COUNT(CASE WHEN status = 'поступает' THEN 1 END) as applying,
-                    COUNT(CASE WHEN status = 'отказывается' THEN 1 END) as refused,
-                    COUNT(CASE WHEN category = 'м' THEN 1 END) as male,
-                    COUNT(CASE WHEN category = 'ж' THEN 1 END) as female,
-                    COUNT(CASE WHEN category = 'всл' THEN 1 END) as military,
-                    COUNT(CASE WHEN document_status = 'ВК' THEN 1 END) as doc1,
-                    COUNT(CASE WHEN document_status = 'ОК' THEN 1 END) as doc2,
-                    COUNT(CASE WHEN document_status = 'ВА ВКО' THEN 1 END) as doc3
-                FROM applicants 
-                WHERE created_by = ?
-                GROUP BY agitator_course
-            ''', (user_id,))
-
-        result = cursor.fetchall()
-
-        # Преобразуем в список словарей для совместимости
+            # Для обычного пользователя - только его записи
+            counters, _ = self._stats_crosstab(('course',), where={'created_by': user_id if user_id is not None else []})
+
         stats_list = []
-        for row in result:
-            stats_dict = dict(row)
-            stats_list.append(stats_dict)
+        for code in np.flatnonzero(counters['total']):
+            name = self.analytics.course_name(code)
+            if role == 'admin' and not name:
+                continue
+            stats_list.append(dict({'course': name}, **{key: int(counters[key][code]) for key in COURSE_STATS_KEYS}))
+        stats_list.sort(key=lambda stats: (stats['course'] is not None, stats['course'] or ''))
 
         if not stats_list:
             # Возвращаем пустую статистику
@@ -870,6 +2430,8 @@ class Database:
 
         return stats_list
 
+    @writes
+    @invalidates('settings')
     def init_settings(self):
         """Инициализация настроек по умолчанию"""
         cursor = self.conn.cursor()
@@ -893,22 +2455,21 @@ class Database:
             INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)
         ''', ('work_days', default_days))
 
-        self.conn.commit()
+        self._commit()
 
+    @cached('settings')
     def get_work_days(self):
         """Получение дней недели для работы"""
-        # Проверяем существование таблицы settings
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='settings'")
-        if not cursor.fetchone():
-            self.init_settings()
-
+        # Таблица settings создается в create_tables
+        cursor = self.reader().cursor()
         cursor.execute('SELECT value FROM settings WHERE key = ?', ('work_days',))
         result = cursor.fetchone()
         if result:
             return [int(d) for d in result['value'].split(',')]
         return [1, 2, 3, 4, 5]  # по умолчанию пн-пт
 
+    @writes
+    @invalidates('settings')
     def set_work_days(self, days):
         """Установка дней недели для работы"""
         cursor = self.conn.cursor()
@@ -916,18 +2477,101 @@ class Database:
         cursor.execute('''
             INSERT OR REPLACE INTO settings (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
         ''', ('work_days', days_str))
-        self.conn.commit()
+        self._commit()
+
+    # ==================== ОБСЛУЖИВАНИЕ БД ====================
+
+    def backup_to(self, target_path, pages=None, progress=None):
+        """Горячая резервная копия БД через Connection.backup; возвращает размер копии в байтах
+
+        Копирование идет шагами по pages страниц с отдельного соединения, между шагами
+        пользователи продолжают читать и писать. progress(осталось, всего) - после каждого шага.
+        """
+        pages = int(pages or self.config['backup_pages'])
+        source = self.connections.open_reader()
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(
+                target, pages=pages,
+                progress=(lambda status, remaining, total: progress(remaining, total)) if progress else None
+            )
+        finally:
+            target.close()
+            source.close()
+        return os.path.getsize(target_path)
+
+    @writes
+    def analyze(self):
+        """Обновление статистики планировщика запросов"""
+        cursor = self.conn.cursor()
+        # Ограничение числа просматриваемых строк на индекс, чтобы ANALYZE не занимал писателя надолго
+        cursor.execute('PRAGMA analysis_limit = 1000')
+        cursor.execute('ANALYZE')
+        cursor.execute('PRAGMA optimize')
+
+    def has_incremental_vacuum(self):
+        """Включен ли для файла БД режим auto_vacuum = INCREMENTAL"""
+        reader = self.reader()
+        # PRAGMA auto_vacuum возвращает значение, прочитанное из заголовка файла при последнем
+        # чтении; запрос перечитывает заголовок после полного VACUUM на другом соединении
+        reader.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        return reader.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+
+    @writes
+    def incremental_vacuum(self, pages=None):
+        """Возврат свободных страниц файлу БД; возвращает число освобожденных страниц
+
+        Работает только для файла в режиме auto_vacuum = INCREMENTAL, для остальных
+        файлов ничего не делает (см. enable_incremental_vacuum).
+        """
+        cursor = self.conn.cursor()
+        if cursor.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return 0
+        freelist_before = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+        pages = int(self.config['vacuum_pages'] if pages is None else pages)
+        # Каждый шаг результата освобождает одну страницу
+        cursor.execute(f'PRAGMA incremental_vacuum({pages})').fetchall()
+        # Перенос изменений из WAL, чтобы файл БД уменьшился
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        freelist_after = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+        return max(freelist_before - freelist_after, 0)
+
+    @writes
+    def enable_incremental_vacuum(self):
+        """Перевод файла БД в режим auto_vacuum = INCREMENTAL полным VACUUM
+
+        Полный VACUUM переписывает весь файл и на все это время блокирует запись,
+        поэтому выполняется только по команде администратора. Возвращает число
+        освобожденных страниц.
+        """
+        cursor = self.conn.cursor()
+        freelist_before = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        freelist_after = cursor.execute('PRAGMA freelist_count').fetchone()[0]
+        return max(freelist_before - freelist_after, 0)
+
+    def page_size(self):
+        """Размер страницы БД в байтах"""
+        return self.reader().execute('PRAGMA page_size').fetchone()[0]
 
     def close(self):
-        """Закрытие соединения с БД"""
-        if self.conn:
-            self.conn.close()
+        """Закрытие соединений с БД"""
+        if self.connections:
+            # Рекомендуемое при закрытии соединения обновление статистики планировщика
+            try:
+                with self.connections.write_lock:
+                    self.conn.execute('PRAGMA optimize')
+            except sqlite3.Error:
+                pass
+            self.connections.close()
 
     # Добавьте эти методы в класс Database в database.py:
 
     def get_regions_for_department(self, department_id):
         """Получение регионов для подразделения"""
-        cursor = self.conn.cursor()
+        cursor = self.reader().cursor()
         cursor.execute('''
             SELECT r.id, r.name 
             FROM department_regions dr
@@ -937,6 +2581,7 @@ class Database:
         ''', (department_id,))
         return cursor.fetchall()
 
+    @writes
     def add_region_to_department(self, department_id, region_id):
         """Назначение региона подразделению"""
         cursor = self.conn.cursor()
@@ -945,11 +2590,12 @@ class Database:
                 INSERT INTO department_regions (department_id, region_id)
                 VALUES (?, ?)
             ''', (department_id, region_id))
-            self.conn.commit()
+            self._commit()
             return True
         except sqlite3.IntegrityError:
             return False
 
+    @writes
     def remove_region_from_department(self, department_id, region_id):
         """Удаление региона из подразделения"""
         cursor = self.conn.cursor()
@@ -957,46 +2603,88 @@ class Database:
             DELETE FROM department_regions 
             WHERE department_id = ? AND region_id = ?
         ''', (department_id, region_id))
-        self.conn.commit()
+        self._commit()
         return cursor.rowcount > 0
 
     def get_stats_by_region(self, department_id=None, region_id=None):
         """Статистика по регионам для подразделения"""
-        cursor = self.conn.cursor()
-
-        query = '''
-            SELECT 
-                r.name as region_name,
-                COUNT(CASE WHEN a.category = 'м' THEN 1 END) as male_count,
-                COUNT(CASE WHEN a.category = 'ж' THEN 1 END) as female_count,
-                COUNT(CASE WHEN a.category = 'всл' THEN 1 END) as military_count,
-                COUNT(CASE WHEN a.status = 'поступает' THEN 1 END) as applying_count,
-                COUNT(CASE WHEN a.status = 'отказывается' THEN 1 END) as refused_count,
-                COUNT(*) as total_count
-            FROM applicants a
-            LEFT JOIN regions r ON a.region = r.name
-            WHERE 1=1
-        '''
-        params = []
+        cursor = self.reader().cursor()
+        cursor.execute('SELECT id, name FROM regions')
+        names = {row['id']: row['name'] for row in cursor.fetchall()}
 
+        where = {}
         if department_id:
-            query += ' AND a.agitator_department = (SELECT name FROM departments WHERE id = ?)'
-            params.append(department_id)
-
+            where['department'] = department_id
         if region_id:
-            query += ' AND r.id = ?'
-            params.append(region_id)
-
-        query += ' GROUP BY r.name ORDER BY total_count DESC'
-
-        cursor.execute(query, params)
-        return cursor.fetchall()
+            where['region'] = region_id if region_id in names else []
+        counters, _ = self._stats_crosstab(('region',), where)
 
-    def check_duplicate_applicant(self, name, phone):
-        """Проверка на дубликат абитуриента"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT id FROM applicants 
-            WHERE applicant_name = ? AND phone = ?
-        ''', (name, phone))
-        return cursor.fetchone() is not None
\ No newline at end of file
+        # Записи без региона и со ссылкой на удаленный регион объединяются (region_name = None)
+        keys = {
+            'male_count': 'male', 'female_count': 'female', 'military_count': 'military',
+            'applying_count': 'applying', 'refused_count': 'refused', 'total_count': 'total',
+        }
+        by_name = {}
+        for code in np.flatnonzero(counters['total']):
+            name = names.get(int(code))
+            stats = by_name.setdefault(name, dict({'region_name': name}, **dict.fromkeys(keys, 0)))
+            for key, counter in keys.items():
+                stats[key] += int(counters[counter][code])
+        return sorted(by_name.values(), key=lambda stats: -stats['total_count'])
+
+
+def measure_applicant_list(db, repeat=3):
+    """Память и время выборки всего списка абитуриентов в двух представлениях
+
+    Прежнее - sqlite3.Row и копия dict на строку (как при выводе в таблицу), новое - ApplicantRecord.
+    Возвращает (строк, {представление: (байт в памяти, секунд)}).
+    """
+    def rows_with_dicts():
+        cursor = db.reader().cursor()
+        cursor.execute(f'SELECT {APPLICANT_LIST_COLUMNS} FROM applicants a ORDER BY a.id DESC')
+        rows = cursor.fetchall()
+        return rows, [dict(row) for row in rows]
+
+    def records():
+        return db.get_applicants(role='admin')
+
+    results = {}
+    for name, load in (('sqlite3.Row + dict', rows_with_dicts), ('ApplicantRecord', records)):
+        elapsed = None
+        for _ in range(repeat):
+            gc.collect()
+            started = time.perf_counter()
+            data = load()
+            elapsed = min(elapsed or float('inf'), time.perf_counter() - started)
+            del data
+        gc.collect()
+        tracemalloc.start()
+        data = load()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del data
+        results[name] = (size, elapsed)
+    return db.count_applicants(role='admin'), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер памяти списка абитуриентов")
+    parser.add_argument('--db', help="файл БД (по умолчанию из настроек)")
+    args = parser.parse_args()
+
+    config = load_db_config()
+    if args.db:
+        config['path'] = args.db
+    db = Database(config)
+    try:
+        count, results = measure_applicant_list(db)
+    finally:
+        db.close()
+    print(f"Строк: {count}")
+    for name, (size, elapsed) in results.items():
+        per_row = size / count if count else 0
+        print(f"{name}: {size / 1024 / 1024:.1f} МБ ({per_row:.0f} Б на строку), {elapsed * 1000:.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+import contextlib
+import http.client
+import select
+import socket
+import sqlite3
+import threading
+from urllib.parse import urlsplit
+
+from database import Database, applicant_dedup_key, load_db_config
+from db_server import REMOTE_METHODS, SERVER_METHODS, dumps, loads
+
+
+class RemoteDatabaseError(Exception):
+    """Ошибка на стороне сервера БД или связи с ним"""
+
+
+# Исключения сервера, которые клиент получает под тем же типом
+REMOTE_ERRORS = {
+    error.__name__: error for error in (
+        sqlite3.Error, sqlite3.DatabaseError, sqlite3.OperationalError,
+        sqlite3.IntegrityError, sqlite3.ProgrammingError,
+        ValueError, TypeError, KeyError, PermissionError, AttributeError,
+    )
+}
+
+
+def make_error(info):
+    """Исключение клиента по описанию ошибки из ответа сервера"""
+    error_type = REMOTE_ERRORS.get(info.get('type'), RemoteDatabaseError)
+    return error_type(info.get('message', ''))
+
+
+def peer_closed(sock):
+    """Простаивающее соединение закрыто другой стороной: сокет готов к чтению без запроса"""
+    try:
+        return bool(select.select([sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class _ThreadState(threading.local):
+    """Соединение с сервером и состояние транзакции потока"""
+
+    def __init__(self):
+        self.http = None
+        self.transaction_depth = 0
+        self.interrupted = False
+        self.connection = None
+
+
+class RemoteConnection:
+    """Соединение потока с сервером в роли Database.reader(): только прерывание запроса
+
+    Запросы SQL клиенты не выполняют, все чтения идут через методы Database.
+    """
+
+    def __init__(self, db, state):
+        self.db = db
+        self.state = state
+
+    def interrupt(self):
+        """Прерывание выполняющегося запроса из другого потока: соединение с сервером закрывается"""
+        self.state.interrupted = True
+        http = self.state.http
+        if http is not None and http.sock is not None:
+            try:
+                http.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class RemoteDatabase:
+    """Клиент сервера БД с интерфейсом Database
+
+    Методы Database вызываются на сервере; каждый поток держит свое постоянное
+    соединение HTTP/1.1. Транзакция (with db.transaction()) охватывает все вызовы
+    потока до ее завершения, call_batch отправляет несколько вызовов одним запросом.
+    """
+    remote = True
+
+    def __init__(self, url, config=None):
+        self.config = config or load_db_config()
+        parsed = urlsplit(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 80
+        self.url = url
+        self.headers = {'Content-Type': 'application/json; charset=utf-8'}
+        if self.config.get('server_token'):
+            self.headers['X-Auth-Token'] = self.config['server_token']
+        self._state = _ThreadState()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def __getattr__(self, name):
+        if name not in REMOTE_METHODS and name not in SERVER_METHODS:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        def method(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+
+        method.__name__ = name
+        return method
+
+    # ==================== СОЕДИНЕНИЕ ====================
+
+    def _http(self):
+        state = self._state
+        if state.http is not None and state.http.sock is not None and peer_closed(state.http.sock):
+            # Сервер закрыл простаивающее соединение (или соединение с истекшей транзакцией)
+            self._drop_http()
+        if state.http is None:
+            if state.transaction_depth:
+                # Транзакция существовала только на закрытом соединении и уже отменена сервером
+                raise RemoteDatabaseError("Соединение с сервером БД закрыто, транзакция отменена")
+            state.http = http.client.HTTPConnection(
+                self.host, self.port, timeout=self.config['server_timeout']
+            )
+            with self._lock:
+                self._connections.append(state.http)
+        return state.http
+
+    def _drop_http(self):
+        state = self._state
+        if state.http is not None:
+            state.http.close()
+            with self._lock:
+                if state.http in self._connections:
+                    self._connections.remove(state.http)
+            state.http = None
+
+    def _request(self, path, payload):
+        """POST-запрос к серверу; ошибка в ответе поднимается как исключение"""
+        state = self._state
+        state.interrupted = False
+        body = dumps(payload)
+        for attempt in range(2):
+            connection = self._http()
+            try:
+                connection.request('POST', path, body, self.headers)
+            except (http.client.HTTPException, OSError) as e:
+                # Запрос не отправлен, сервер его не выполнял: один повтор на новом соединении
+                self._drop_http()
+                if state.interrupted:
+                    raise sqlite3.OperationalError("interrupted") from e
+                if attempt or state.transaction_depth:
+                    raise RemoteDatabaseError(f"Нет связи с сервером БД {self.url}: {e}") from e
+                continue
+            try:
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                # Запрос отправлен и мог быть выполнен (в том числе при истечении ожидания):
+                # повтор изменил бы данные дважды
+                self._drop_http()
+                if state.interrupted:
+                    raise sqlite3.OperationalError("interrupted") from e
+                raise RemoteDatabaseError(f"Нет ответа сервера БД {self.url}: {e}") from e
+
+        result = loads(data)
+        if response.status != 200:
+            raise make_error(result.get('error', {'message': f"HTTP {response.status}"}))
+        if 'error' in result and path != '/call':
+            raise make_error(result['error'])
+        return result
+
+    def reader(self):
+        """Соединение для чтения текущего потока"""
+        state = self._state
+        if state.connection is None:
+            state.connection = RemoteConnection(self, state)
+        return state.connection
+
+    def close_reader(self):
+        """Закрытие соединения текущего потока с сервером"""
+        self._drop_http()
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._state.http = None
+
+    # ==================== ВЫЗОВЫ ====================
+
+    def call(self, method, *args, **kwargs):
+        """Вызов метода Database на сервере"""
+        return self.call_batch([(method, args, kwargs)])[0]
+
+    def call_batch(self, calls, transaction=False):
+        """Несколько вызовов одним запросом; возвращает список результатов
+
+        calls - последовательность (метод, args, kwargs). С transaction=True пакет
+        выполняется в одной транзакции. На первой ошибке выполнение прекращается
+        и поднимается исключение.
+        """
+        response = self._request('/call', {
+            'calls': [
+                {'method': method, 'args': list(args), 'kwargs': kwargs}
+                for method, args, kwargs in calls
+            ],
+            'transaction': transaction,
+        })
+        if 'error' in response:
+            raise make_error(response['error'])
+        return response['results']
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Транзакция на сервере для всех вызовов текущего потока (вложенные - точки сохранения)
+
+        Сервер отменяет транзакцию, которая длится дольше server_transaction_timeout.
+        """
+        state = self._state
+        self._request('/transaction', {'action': 'begin'})
+        state.transaction_depth += 1
+        try:
+            yield None
+        except BaseException:
+            try:
+                self._request('/transaction', {'action': 'rollback'})
+            except (RemoteDatabaseError, sqlite3.Error):
+                pass
+            finally:
+                state.transaction_depth -= 1
+            raise
+        else:
+            try:
+                self._request('/transaction', {'action': 'commit'})
+            finally:
+                state.transaction_depth -= 1
+
+    # ==================== МАССОВЫЕ ОПЕРАЦИИ ====================
+
+    def add_applicants_bulk(self, user_id, applicants, batch_size=None, on_batch=None):
+        """Массовое добавление абитуриентов: один запрос к серверу на пакет
+
+        Повторы внутри загружаемых данных отсекаются на клиенте, так как сервер
+        видит только текущий пакет.
+        """
+        batch_size = max(int(batch_size or self.config['import_batch_size']), 1)
+        seen_keys = set()
+        batches = []
+        processed = 0
+
+        def send(batch):
+            unique = []
+            stats = {'inserted': 0, 'duplicates': 0, 'errors': 0}
+            for data in batch:
+                key = applicant_dedup_key(data.get('applicant_name'), data.get('phone'))
+                if data.get('applicant_name') and key in seen_keys:
+                    stats['duplicates'] += 1
+                    continue
+                seen_keys.add(key)
+                unique.append(data)
+            if unique:
+                for batch_stats in self.call('add_applicants_bulk', user_id, unique,
+                                             batch_size=len(unique)):
+                    for name in stats:
+                        stats[name] += batch_stats[name]
+            batches.append(stats)
+            if on_batch:
+                on_batch(processed, stats)
+
+        batch = []
+        for data in applicants:
+            batch.append(data)
+            if len(batch) >= batch_size:
+                processed += len(batch)
+                send(batch)
+                batch = []
+        if batch:
+            processed += len(batch)
+            send(batch)
+        return batches
+
+    # Постраничный обход выполняется клиентом через get_applicants_page
+    iter_applicants = Database.iter_applicants
+
+
+def open_database(config=None):
+    """Database для приложения: клиент сервера, если задан server_url, иначе локальный файл"""
+    config = config or load_db_config()
+    if config.get('server_url'):
+        return RemoteDatabase(config['server_url'], config)
+    return Database(config)
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+import argparse
+import contextlib
+import datetime
+import hmac
+import ipaddress
+import json
+import os
+import sqlite3
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from database import ApplicantRecord, Database, load_db_config
+from maintenance import DatabaseMaintenance, format_report
+
+# Методы Database, которые работают с соединениями и файлом БД и не вызываются удаленно
+LOCAL_METHODS = frozenset({
+    'connect', 'reader', 'close_reader', 'close', 'transaction', 'check_data_version',
+    'create_tables', 'migrate', 'backup_to', 'analyze', 'incremental_vacuum', 'page_size',
+    'has_incremental_vacuum', 'enable_incremental_vacuum',
+    'get_visibility_scope',
+})
+
+# Публичные методы Database, доступные клиентам сервера
+REMOTE_METHODS = frozenset(
+    name for name, value in vars(Database).items()
+    if callable(value) and not name.startswith('_') and name not in LOCAL_METHODS
+)
+
+# Методы самого сервера (обслуживание БД выполняется на стороне сервера)
+SERVER_METHODS = frozenset({'run_maintenance', 'maintenance_info'})
+
+# Проверка обслуживания БД сервером, секунд
+MAINTENANCE_CHECK_INTERVAL = 15 * 60
+
+
+class RemoteRow:
+    """Строка результата на стороне клиента: доступ по индексу и по имени, как у sqlite3.Row"""
+    __slots__ = ('_keys', '_values')
+
+    def __init__(self, keys, values):
+        self._keys = keys
+        self._values = values
+
+    def keys(self):
+        return list(self._keys)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, slice)):
+            return self._values[key]
+        try:
+            return self._values[self._keys.index(key)]
+        except ValueError:
+            raise IndexError(f"No item with that key: {key}") from None
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, RemoteRow):
+            return self._keys == other._keys and self._values == other._values
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((tuple(self._keys), tuple(self._values)))
+
+    def __repr__(self):
+        return f"RemoteRow({dict(zip(self._keys, self._values))!r})"
+
+
+def encode_value(value):
+    """Приведение аргументов и результатов методов Database к виду JSON
+
+    Строки sqlite3.Row, даты и словари с нестроковыми ключами передаются объектами
+    со служебным ключом; кортежи, множества и генераторы - списками. ApplicantRecord
+    передается только значениями полей, без имен колонок в каждой строке.
+    """
+    if isinstance(value, ApplicantRecord):
+        return {'__applicant__': [encode_value(item) for item in value]}
+    if isinstance(value, (sqlite3.Row, RemoteRow)):
+        return {'__row__': [list(value.keys()), [encode_value(item) for item in value]]}
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {key: encode_value(item) for key, item in value.items()}
+        return {'__items__': [[encode_value(key), encode_value(item)] for key, item in value.items()]}
+    if isinstance(value, (list, tuple, set, frozenset, types.GeneratorType)):
+        return [encode_value(item) for item in value]
+    if isinstance(value, datetime.datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'__date__': value.isoformat()}
+    return value
+
+
+def _hashable(value):
+    """Ключ словаря из JSON: списки (бывшие кортежи) превращаются обратно в кортежи"""
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+def decode_object(obj):
+    """object_hook для json.loads: восстановление значений, закодированных encode_value"""
+    if len(obj) == 1:
+        if '__row__' in obj:
+            keys, values = obj['__row__']
+            return RemoteRow(keys, values)
+        if '__applicant__' in obj:
+            return ApplicantRecord._make(obj['__applicant__'])
+        if '__items__' in obj:
+            return {_hashable(key): item for key, item in obj['__items__']}
+        if '__datetime__' in obj:
+            return datetime.datetime.fromisoformat(obj['__datetime__'])
+        if '__date__' in obj:
+            return datetime.date.fromisoformat(obj['__date__'])
+    return obj
+
+
+def dumps(value):
+    return json.dumps(encode_value(value), ensure_ascii=False).encode('utf-8')
+
+
+def loads(data):
+    return json.loads(data.decode('utf-8'), object_hook=decode_object)
+
+
+def error_info(error):
+    """Описание исключения для ответа клиенту"""
+    return {'type': type(error).__name__, 'message': str(error)}
+
+
+def is_loopback(host):
+    """Адрес доступен только с этого компьютера (127.0.0.1, ::1, localhost)"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class RollbackRequested(Exception):
+    """Откат транзакции по запросу клиента"""
+
+
+class DatabaseRequestHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов к серверу БД
+
+    Соединение HTTP/1.1 остается открытым между запросами и обслуживается одним
+    потоком, поэтому транзакция клиента (begin ... commit) выполняется на соединении
+    записи этого потока, а чтения - на его соединении для чтения. Открытая транзакция
+    держит блокировку записи, поэтому ее длительность ограничена transaction_timeout:
+    по истечении срока транзакция откатывается.
+
+    POST /call         {"calls": [{"method", "args", "kwargs"}, ...], "transaction": bool}
+    POST /transaction  {"action": "begin" | "commit" | "rollback"}
+    """
+    protocol_version = 'HTTP/1.1'
+    server_version = 'AgitationDB/1.0'
+
+    def setup(self):
+        # Простаивающее соединение закрывается; открытые транзакции при этом откатываются
+        self.timeout = self.server.idle_timeout
+        super().setup()
+        self.transactions = []
+        self.transaction_deadline = None
+
+    def finish(self):
+        try:
+            self.rollback_all("Соединение закрыто")
+            self.server.db.close_reader()
+        finally:
+            super().finish()
+
+    def rollback_all(self, reason):
+        while self.transactions:
+            self.transactions.pop().__exit__(RollbackRequested, RollbackRequested(reason), None)
+        self.transaction_deadline = None
+
+    def update_timeout(self):
+        """Ожидание следующего запроса: при открытой транзакции - не дольше ее срока"""
+        timeout = self.server.idle_timeout
+        if self.transactions:
+            timeout = max(self.transaction_deadline - time.monotonic(), 0.001)
+        self.connection.settimeout(timeout)
+
+    def do_POST(self):
+        handlers = {
+            '/call': self.handle_calls,
+            '/transaction': self.handle_transaction,
+        }
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+
+        handler = handlers.get(self.path)
+        if handler is None:
+            self.send_json(404, {'error': {'type': 'NotFound', 'message': self.path}})
+            return
+        if self.server.token and not hmac.compare_digest(
+                self.headers.get('X-Auth-Token', ''), self.server.token):
+            self.send_json(403, {'error': {'type': 'PermissionError', 'message': "Неверный токен"}})
+            return
+
+        try:
+            if self.transactions and time.monotonic() > self.transaction_deadline:
+                self.rollback_all("Истек срок транзакции")
+                raise sqlite3.OperationalError(
+                    f"Транзакция отменена: дольше {self.server.transaction_timeout} с"
+                )
+            response = handler(loads(body) if body else {})
+        except Exception as e:
+            response = {'error': error_info(e)}
+        self.send_json(200, response)
+        self.update_timeout()
+
+    def send_json(self, status, response):
+        data = dumps(response)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def handle_calls(self, body):
+        """Пакет вызовов методов Database; выполнение прекращается на первой ошибке
+
+        С transaction=true весь пакет выполняется в одной транзакции и при ошибке
+        откатывается целиком.
+        """
+        transaction = bool(body.get('transaction'))
+        results = []
+        try:
+            with self.server.db.transaction() if transaction else contextlib.nullcontext():
+                for call in body.get('calls', []):
+                    results.append(self.server.call(
+                        call['method'], call.get('args', []), call.get('kwargs', {})
+                    ))
+        except Exception as e:
+            return {'results': [] if transaction else results, 'error': error_info(e)}
+        return {'results': results}
+
+    def handle_transaction(self, body):
+        """Явная транзакция клиента, охватывающая несколько запросов этого соединения
+
+        Срок transaction_timeout отсчитывается от начала внешней транзакции; если следующий
+        запрос не пришел до его истечения, соединение закрывается и транзакция откатывается.
+        """
+        action = body.get('action')
+        if action == 'begin':
+            transaction = self.server.db.transaction()
+            transaction.__enter__()
+            if not self.transactions:
+                self.transaction_deadline = time.monotonic() + self.server.transaction_timeout
+            self.transactions.append(transaction)
+        elif action in ('commit', 'rollback'):
+            if not self.transactions:
+                raise sqlite3.OperationalError("Нет активной транзакции")
+            transaction = self.transactions.pop()
+            if not self.transactions:
+                self.transaction_deadline = None
+            if action == 'commit':
+                transaction.__exit__(None, None, None)
+            else:
+                transaction.__exit__(RollbackRequested, RollbackRequested(), None)
+        else:
+            raise ValueError(f"Неизвестное действие: {action}")
+        return {'depth': len(self.transactions)}
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class DatabaseServer(ThreadingHTTPServer):
+    """HTTP/JSON-сервер, владеющий единственным экземпляром Database
+
+    Без токена сервер принимает соединения только на локальном адресе: методы
+    Database (в том числе управление пользователями) доступны любому клиенту сервера.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, db, token='', idle_timeout=300, transaction_timeout=30, verbose=False):
+        if not token and not is_loopback(address[0]):
+            raise ValueError(
+                f"Сервер на адресе {address[0] or '0.0.0.0'} запускается только с токеном (server_token)"
+            )
+        super().__init__(address, DatabaseRequestHandler)
+        self.db = db
+        self.token = token
+        self.idle_timeout = idle_timeout
+        self.transaction_timeout = transaction_timeout
+        self.verbose = verbose
+        self.maintenance = DatabaseMaintenance(db)
+        self.maintenance_lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def call(self, method, args, kwargs):
+        """Вызов разрешенного метода Database или сервера"""
+        if method in SERVER_METHODS:
+            return encode_value(getattr(self, method)(*args, **kwargs))
+        if method not in REMOTE_METHODS:
+            raise AttributeError(f"Метод недоступен: {method}")
+        return encode_value(getattr(self.db, method)(*args, **kwargs))
+
+    def run_maintenance(self, backup=True, analyze=True, vacuum=True, full_vacuum=False):
+        """Обслуживание БД по запросу клиента; возвращает текст отчета"""
+        with self.maintenance_lock:
+            report = self.maintenance.run(
+                backup=backup, analyze=analyze, vacuum=vacuum, full_vacuum=full_vacuum
+            )
+        return format_report(report)
+
+    def maintenance_info(self):
+        return self.maintenance.info()
+
+    def maintenance_loop(self):
+        """Плановое обслуживание БД в фоне, когда подошел срок"""
+        while not self.stopped.wait(MAINTENANCE_CHECK_INTERVAL):
+            try:
+                if self.maintenance.is_due():
+                    print(self.run_maintenance())
+            except Exception as e:
+                print(f"Ошибка обслуживания БД: {e}")
+            finally:
+                self.db.close_reader()
+
+    def start_maintenance(self):
+        thread = threading.Thread(target=self.maintenance_loop, name='maintenance', daemon=True)
+        thread.start()
+        return thread
+
+    def server_close(self):
+        self.stopped.set()
+        super().server_close()
+
+
+def main():
+    config = load_db_config()
+    parser = argparse.ArgumentParser(description="Сервер БД агитации")
+    parser.add_argument('--host', default=config['server_host'])
+    parser.add_argument('--port', type=int, default=config['server_port'])
+    parser.add_argument('--db', default=config['path'], help="путь к файлу БД")
+    parser.add_argument('--verbose', action='store_true', help="журнал запросов")
+    args = parser.parse_args()
+
+    if not config['server_token'] and not is_loopback(args.host):
+        parser.error(f"для адреса {args.host or '0.0.0.0'} задайте server_token в настройках БД")
+
+    config['path'] = args.db
+    db = Database(config)
+    server = DatabaseServer(
+        (args.host, args.port), db, token=config['server_token'],
+        idle_timeout=config['server_idle_timeout'],
+        transaction_timeout=config['server_transaction_timeout'], verbose=args.verbose
+    )
+    server.start_maintenance()
+    print(f"Сервер БД {os.path.abspath(args.db)} запущен на {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+import io
+import threading
+import zipfile
+from itertools import islice
+
+import openpyxl
+import xlrd
+from openpyxl.utils.exceptions import InvalidFileException
+
+# Текстовые значения, которые pd.read_excel считает пустыми (так импорт читал листы раньше)
+MISSING_TEXT = frozenset({
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+})
+
+
+def convert_value(value):
+    """Значение ячейки как у pd.read_excel: пустое - None, целое число с плавающей точкой - int"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return None if value in MISSING_TEXT else value
+    if isinstance(value, float):
+        if value != value:
+            return None
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+def header_names(values):
+    """Имена колонок по строке заголовка, как у pandas
+
+    Пустые заголовки получают имя 'Unnamed: N', повторы - суффиксы '.1', '.2'.
+    Пустые ячейки в конце строки отбрасываются.
+    """
+    values = list(values)
+    while values and values[-1] is None:
+        values.pop()
+    names = []
+    counts = {}
+    for index, value in enumerate(values):
+        name = f'Unnamed: {index}' if value is None else str(value)
+        count = counts.get(name, 0)
+        while count:
+            counts[name] = count + 1
+            name = f'{name}.{count}'
+            count = counts.get(name, 0)
+        counts[name] = 1
+        names.append(name)
+    return names
+
+
+def is_empty_row(values):
+    return all(value is None for value in values)
+
+
+class ExcelReader:
+    """Потоковое чтение книги Excel: строки листа по одной, без загрузки листа целиком
+
+    .xlsx читается через openpyxl в режиме read_only, .xls - через xlrd (лист
+    загружается по требованию и выгружается после чтения). source - путь,
+    содержимое файла (bytes) или двоичный файловый объект.
+    """
+
+    def __init__(self, source):
+        self.workbook = None  # openpyxl
+        self.book = None  # xlrd
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        try:
+            self.workbook = openpyxl.load_workbook(source, read_only=True, data_only=True, keep_links=False)
+        except (InvalidFileException, zipfile.BadZipFile):
+            if hasattr(source, 'read'):
+                source.seek(0)
+                self.book = xlrd.open_workbook(file_contents=source.read(), on_demand=True)
+            else:
+                self.book = xlrd.open_workbook(source, on_demand=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.workbook is not None:
+            self.workbook.close()
+        if self.book is not None:
+            self.book.release_resources()
+
+    @property
+    def sheet_names(self):
+        if self.workbook is not None:
+            return list(self.workbook.sheetnames)
+        return self.book.sheet_names()
+
+    def row_count(self, sheet_name):
+        """Число строк листа без заголовка по размерам листа (без чтения строк)
+
+        Если размеры в файле не записаны (их пишет Excel, но не все генераторы
+        файлов), строки листа просматриваются один раз.
+        """
+        if self.workbook is not None:
+            sheet = self.workbook[sheet_name]
+            if sheet.max_row is None:
+                sheet.calculate_dimension(force=True)
+            rows = sheet.max_row or 0
+        else:
+            rows = self.book.sheet_by_name(sheet_name).nrows
+        return max(rows - 1, 0)
+
+    def iter_rows(self, sheet_name):
+        """Все строки листа кортежами значений (convert_value)"""
+        if self.workbook is not None:
+            for values in self.workbook[sheet_name].iter_rows(values_only=True):
+                yield tuple(map(convert_value, values))
+            return
+
+        sheet = self.book.sheet_by_name(sheet_name)
+        try:
+            for index in range(sheet.nrows):
+                yield tuple(
+                    self._xls_value(cell_type, value)
+                    for cell_type, value in zip(sheet.row_types(index), sheet.row_values(index))
+                )
+        finally:
+            self.book.unload_sheet(sheet_name)
+
+    def _xls_value(self, cell_type, value):
+        if cell_type in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+            return None
+        if cell_type == xlrd.XL_CELL_DATE:
+            moment = xlrd.xldate_as_datetime(value, self.book.datemode)
+            return moment.time() if value < 1 else moment
+        if cell_type == xlrd.XL_CELL_BOOLEAN:
+            return bool(value)
+        return convert_value(value)
+
+    def read_table(self, sheet_name):
+        """Заголовок и строки данных листа: (колонки, итератор кортежей значений)
+
+        Заголовок - первая непустая строка листа (header_names), полностью пустые
+        строки пропускаются. Строки читаются по мере обхода итератора.
+        """
+        rows = self.iter_rows(sheet_name)
+        for values in rows:
+            if not is_empty_row(values):
+                return header_names(values), (values for values in rows if not is_empty_row(values))
+        # Пустой лист: тоже генератор, чтобы у результата всегда был close()
+        return [], (values for values in ())
+
+    def iter_records(self, sheet_name):
+        """Строки данных листа словарями {колонка: значение} (см. read_table)
+
+        Отсутствующие в строке колонки в словарь не попадают.
+        """
+        columns, rows = self.read_table(sheet_name)
+        for values in rows:
+            yield dict(zip(columns, values))
+
+
+class WorkbookPasswordError(Exception):
+    """Книгу не удалось расшифровать: неверный пароль или файл не зашифрован"""
+
+
+def decrypt_workbook(file_path, password):
+    """Содержимое книги, защищенной паролем, расшифрованное в памяти (bytes)"""
+    import msoffcrypto
+    from msoffcrypto.exceptions import DecryptionError, FileFormatError, ParseError
+
+    output = io.BytesIO()
+    with open(file_path, 'rb') as f:
+        try:
+            office_file = msoffcrypto.OfficeFile(f)
+            office_file.load_key(password=password)
+            office_file.decrypt(output)
+        except (DecryptionError, FileFormatError, ParseError) as e:
+            raise WorkbookPasswordError(str(e)) from e
+    return output.getvalue()
+
+
+class ImportSession:
+    """Книга Excel, выбранная для импорта: расшифровывается и открывается один раз
+
+    Книга с паролем расшифровывается в память, расшифрованная копия на диск не
+    пишется. Имена листов, заголовки и первые строки листов кэшируются, так что
+    повторный просмотр листа не читает файл. Поток импорта получает ту же книгу
+    через source (путь или расшифрованное содержимое) и open(). Чтение листов
+    (columns, preview) можно выполнять в фоновом потоке: оно выполняется под блокировкой.
+    """
+    PREVIEW_ROWS = 5
+
+    def __init__(self, file_path, password=''):
+        self.file_path = file_path
+        self.password = password
+        self.content = decrypt_workbook(file_path, password) if password else None
+        self.reader = ExcelReader(self.source)
+        self.sheet_names = self.reader.sheet_names
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    @property
+    def source(self):
+        """Книга для ExcelReader: расшифрованное содержимое или путь к файлу"""
+        return self.content if self.content is not None else self.file_path
+
+    def open(self):
+        """Отдельный ExcelReader книги (например, для потока импорта)"""
+        return ExcelReader(self.source)
+
+    def matches(self, file_path, password):
+        return self.file_path == file_path and self.password == password
+
+    def close(self):
+        with self._lock:
+            self.reader.close()
+
+    def is_loaded(self, sheet_name):
+        """Прочитано ли уже начало листа (columns и preview не обращаются к файлу)"""
+        return sheet_name in self._tables
+
+    def _table(self, sheet_name):
+        with self._lock:
+            if sheet_name not in self._tables:
+                # Читаются только заголовок и PREVIEW_ROWS строк, остальная часть листа - нет
+                columns, rows = self.reader.read_table(sheet_name)
+                width = len(columns)
+                try:
+                    # У пустого листа нет заголовка, строки предпросмотра не читаются
+                    preview = [
+                        tuple(values[:width]) + (None,) * (width - len(values))
+                        for values in islice(rows, self.PREVIEW_ROWS)
+                    ] if columns else []
+                finally:
+                    rows.close()
+                self._tables[sheet_name] = columns, preview
+            return self._tables[sheet_name]
+
+    def columns(self, sheet_name):
+        """Названия колонок листа (см. ExcelReader.read_table)"""
+        return self._table(sheet_name)[0]
+
+    def preview(self, sheet_name):
+        """Первые PREVIEW_ROWS строк данных листа кортежами по колонкам заголовка"""
+        return self._table(sheet_name)[1]
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+import argparse
+import os
+import time
+from itertools import islice, zip_longest
+
+from database import normalize_phone
+from excel_reader import ExcelReader
+
+# Поля абитуриента, заполняемые при импорте, и значения по умолчанию
+IMPORT_FIELDS = (
+    'applicant_name', 'region', 'city', 'category', 'phone', 'education',
+    'status', 'document_status', 'agitator_department', 'agitator_name',
+    'agitator_course', 'agitator_group', 'agitator_rank', 'agitator_is_cadet', 'notes',
+)
+IMPORT_DEFAULTS = {field: '' for field in IMPORT_FIELDS}
+IMPORT_DEFAULTS.update(status='поступает', agitator_is_cadet=False)
+
+# Написания категорий в файлах импорта (в нижнем регистре)
+CATEGORY_SYNONYMS = {
+    **dict.fromkeys(['м', 'м.', 'муж', 'мужчина', 'male'], 'м'),
+    **dict.fromkeys(['ж', 'ж.', 'жен', 'женщина', 'female'], 'ж'),
+    **dict.fromkeys(['всл', 'военнослужащий', 'военнослужащие', 'воен'], 'всл'),
+}
+
+
+def import_category(value):
+    """Категория по значению из файла; неизвестное значение - первые две буквы"""
+    value = value.lower()
+    return CATEGORY_SYNONYMS.get(value, value[:2])
+
+
+def import_status(value):
+    value = value.lower()
+    return 'поступает' if 'поступает' in value or 'поступают' in value else 'отказывается'
+
+
+# Приведение очищенного значения ячейки к значению поля
+FIELD_CONVERTERS = {
+    'category': import_category,
+    'status': import_status,
+    'phone': normalize_phone,
+}
+
+
+def course_from_sheet_name(sheet_name):
+    """Курс агитатора по названию листа ('2 курс') или пустая строка"""
+    for course_num in ['1', '2', '3', '4', '5']:
+        if f'{course_num} курс' in sheet_name.lower():
+            return f'{course_num} курс'
+    return ''
+
+
+def clean_value(value):
+    """Значение ячейки строкой без пробелов по краям; пустая ячейка - None"""
+    if value is None:
+        return None
+    return (value if type(value) is str else str(value)).strip()
+
+
+def map_column(values, function):
+    """function для каждого значения колонки: вычисляется один раз на различное значение
+
+    Колонки листа обычно содержат немного различных значений (регионы, категории,
+    подразделения), поэтому колонка целиком преобразуется поиском по словарю.
+    """
+    distinct = set(values)
+    # True и False равны 1 и 0 и совпали бы с ними в словаре
+    if True in distinct or False in distinct:
+        return [function(value) for value in values]
+    lookup = {value: function(value) for value in distinct}
+    return list(map(lookup.__getitem__, values))
+
+
+def transform_rows(columns, rows, mapping, course_from_sheet=''):
+    """Данные абитуриентов для add_applicants_bulk из строк листа (ExcelReader.read_table)
+
+    columns - названия колонок листа, rows - кортежи значений строк. Преобразование
+    выполняется по колонкам: строки транспонируются, и каждая колонка маппинга
+    чистится и приводится к значениям поля целиком. Пустые ячейки дают значение
+    поля по умолчанию (IMPORT_DEFAULTS). Возвращает список словарей.
+    """
+    rows = list(rows)
+    positions = {name: index for index, name in enumerate(columns)}
+    table = list(zip_longest(*rows))
+    fields = {}
+    for field, column in mapping.items():
+        if field not in IMPORT_DEFAULTS or column not in positions or positions[column] >= len(table):
+            continue
+        convert = FIELD_CONVERTERS.get(field)
+        default = IMPORT_DEFAULTS[field]
+
+        def convert_cell(value, convert=convert, default=default):
+            value = clean_value(value)
+            if value is None:
+                return default
+            return convert(value) if convert else value
+
+        fields[field] = map_column(table[positions[column]], convert_cell)
+
+    def field_values(field):
+        return fields.get(field) or [IMPORT_DEFAULTS[field]] * len(rows)
+
+    # Если курс не указан, берем из названия листа
+    courses = field_values('agitator_course')
+    if course_from_sheet:
+        courses = [course or course_from_sheet for course in courses]
+    fields['agitator_course'] = courses
+
+    # Агитатор - курсант, если указана группа или курс без звания
+    fields['agitator_is_cadet'] = [
+        bool(group or (course and not rank))
+        for group, course, rank in zip(field_values('agitator_group'), courses, field_values('agitator_rank'))
+    ]
+
+    return [dict(zip(IMPORT_FIELDS, values)) for values in zip(*map(field_values, IMPORT_FIELDS))]
+
+
+def iter_transformed(columns, rows, mapping, course_from_sheet='', chunk_size=1000):
+    """transform_rows по частям из chunk_size строк: лист не загружается в память целиком"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield from transform_rows(columns, chunk, mapping, course_from_sheet)
+
+
+def parse_sheet(source, sheet_name, mapping, chunk_size=1000):
+    """Чтение и преобразование листа целиком (задача пула процессов импорта)
+
+    Возвращает список данных абитуриентов листа (см. transform_rows).
+    """
+    with ExcelReader(source) as reader:
+        columns, rows = reader.read_table(sheet_name)
+        return list(iter_transformed(columns, rows, mapping, course_from_sheet_name(sheet_name), chunk_size))
+
+
+def import_process_count(config, sheet_count):
+    """Число процессов для разбора sheet_count листов по настройке import_processes"""
+    processes = int(config.get('import_processes') or 0) or os.cpu_count() or 1
+    return max(min(processes, sheet_count), 1)
+
+
+def extract_data(row, mapping, course_from_sheet):
+    """Построчное извлечение данных по маппингу (прежний путь импорта, для сравнения в benchmark)"""
+    data = dict(IMPORT_DEFAULTS)
+    for field, column in mapping.items():
+        if column and row.get(column) is not None:
+            value = str(row[column]).strip()
+
+            if field == 'category':
+                if value.lower() in ['м', 'м.', 'муж', 'мужчина', 'male']:
+                    data['category'] = 'м'
+                elif value.lower() in ['ж', 'ж.', 'жен', 'женщина', 'female']:
+                    data['category'] = 'ж'
+                elif value.lower() in ['всл', 'военнослужащий', 'военнослужащие', 'воен']:
+                    data['category'] = 'всл'
+                else:
+                    data['category'] = value[:2].lower()
+            elif field == 'phone':
+                data['phone'] = normalize_phone(value)
+            elif field == 'status':
+                if 'поступает' in value.lower() or 'поступают' in value.lower():
+                    data['status'] = 'поступает'
+                else:
+                    data['status'] = 'отказывается'
+            elif field in data:
+                data[field] = value
+    if not data['agitator_course'] and course_from_sheet:
+        data['agitator_course'] = course_from_sheet
+    if data['agitator_group'] or (data['agitator_course'] and not data['agitator_rank']):
+        data['agitator_is_cadet'] = True
+    return data
+
+
+def benchmark(columns, rows, mapping, course_from_sheet='', repeat=3):
+    """Время (мс) построчного и поколоночного преобразования строк; результаты сверяются
+
+    Построчный путь включает построение словарей строк (ExcelReader.iter_records).
+    """
+    timings = {}
+    results = {}
+    for name, function in (
+        ('per_row', lambda: [
+            extract_data(dict(zip(columns, values)), mapping, course_from_sheet) for values in rows
+        ]),
+        ('columns', lambda: list(iter_transformed(columns, rows, mapping, course_from_sheet))),
+    ):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[name] = function()
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    if results['per_row'] != results['columns']:
+        raise AssertionError("Результаты построчного и поколоночного преобразования различаются")
+    return timings
+
+
+# Названия колонок шаблона импорта по полям (маппинг для замера в main)
+IMPORT_COLUMN_LABELS = {
+    'applicant_name': 'ФИО абитуриента', 'region': 'Субъект РФ', 'city': 'Населенный пункт',
+    'category': 'Категория', 'phone': 'Телефон', 'education': 'Образование', 'status': 'Статус',
+    'document_status': 'Документы', 'agitator_department': 'Подразделение агитатора',
+    'agitator_name': 'ФИО агитатора', 'agitator_course': 'Курс агитатора',
+    'agitator_group': 'Группа агитатора', 'agitator_rank': 'Звание агитатора', 'notes': 'Примечания',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер скорости преобразования строк импорта")
+    parser.add_argument('file', help="файл Excel")
+    parser.add_argument('--sheet', help="лист (по умолчанию первый)")
+    parser.add_argument('--repeat', type=int, default=3, help="повторов замера")
+    args = parser.parse_args()
+
+    with ExcelReader(args.file) as reader:
+        sheet_name = args.sheet or reader.sheet_names[0]
+        columns, rows = reader.read_table(sheet_name)
+        rows = list(rows)
+    mapping = {field: label for field, label in IMPORT_COLUMN_LABELS.items() if label in columns}
+
+    timings = benchmark(columns, rows, mapping, course_from_sheet_name(sheet_name), args.repeat)
+    print(f"Лист: {sheet_name}, строк: {len(rows)}, полей в маппинге: {len(mapping)}")
+    for name, elapsed in timings.items():
+        print(f"{name}: {elapsed:.1f} мс ({elapsed * 1000 / max(len(rows), 1):.2f} мкс/строка)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,9 @@
 # -*- coding: utf-8 -*-
+import contextlib
+import multiprocessing
+import sqlite3
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QGridLayout, QLabel,
                              QLineEdit, QPushButton, QTableWidget, QTableWidgetItem,
@@ -8,11 +12,15 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QFormLayout,
                              QFileDialog, QToolBar, QStatusBar,
                              QScrollArea, QAction, QCheckBox, QProgressDialog,
-                             QSizePolicy, QInputDialog, QListWidget)
-from PyQt5.QtCore import Qt, pyqtSignal, QThread
+                             QSizePolicy, QInputDialog, QListWidget, QMenu)
+from PyQt5.QtCore import Qt, pyqtSignal, QEventLoop, QThread, QTimer
 from PyQt5.QtGui import QFont, QIcon, QPalette, QColor
 from datetime import datetime
-from database import Database
+from db_client import open_database
+from excel_reader import ImportSession, WorkbookPasswordError
+from import_transform import course_from_sheet_name, import_process_count, iter_transformed, parse_sheet
+from maintenance import DatabaseMaintenance, format_report
+from query_executor import QueryExecutor
 from resource_helper import get_icon_path, resource_path
 from statistics_widget import StatisticsWidget
 import pandas as pd
@@ -22,6 +30,12 @@ os.environ['QT_MAC_WANTS_LAYER'] = '1'
 
 ICONS = get_icon_path("icon.ico") or "icons/icon.ico"
 
+# Количество абитуриентов, загружаемых в таблицу за один запрос
+APPLICANTS_PAGE_SIZE = 500
+
+# Как часто проверять, не пора ли выполнить обслуживание БД (мс)
+MAINTENANCE_CHECK_INTERVAL = 15 * 60 * 1000
+
 
 class LoginWindow(QWidget):
     """Окно авторизации"""
@@ -95,8 +109,9 @@ class LoginWindow(QWidget):
             QMessageBox.warning(self, 'Ошибка', 'Заполните все поля!')
             return
 
-        db = Database()
+        db = open_database()
         user = db.get_user_by_credentials(username, password)
+        db.close()
 
         if user:
             user_dict = dict(user)
@@ -463,9 +478,7 @@ class ApplicantDialog(QDialog):
     def load_departments(self):
         """Загрузка подразделений из БД (без дублей)"""
         if self.db:
-            cursor = self.db.conn.cursor()
-            cursor.execute('SELECT DISTINCT name FROM departments WHERE type != "root" ORDER BY name')
-            departments = [row['name'] for row in cursor.fetchall()]
+            departments = self.db.get_department_names()
 
             self.agitator_department.clear()
             self.agitator_department.addItem("")
@@ -1007,10 +1020,7 @@ class AdvancedSearchDialog(QDialog):
     def load_departments(self):
         """Загрузка подразделений (уникальные из БД)"""
         if self.db:
-            cursor = self.db.conn.cursor()
-            cursor.execute(
-                'SELECT DISTINCT agitator_department FROM applicants WHERE agitator_department IS NOT NULL AND agitator_department != "" ORDER BY agitator_department')
-            departments = [row['agitator_department'] for row in cursor.fetchall()]
+            departments = self.db.get_agitator_departments()
             self.agitator_department.clear()
             self.agitator_department.addItem("")
             self.agitator_department.addItems(departments)
@@ -1110,9 +1120,10 @@ class AdvancedSearchDialog(QDialog):
 class SelectionStatsDialog(QDialog):
     """Диалог со статистикой по выделенным строкам"""
 
-    def __init__(self, selected_data, parent=None):
+    def __init__(self, selection_stats, parent=None):
         super().__init__(parent)
-        self.selected_data = selected_data
+        # Счетчики Database.get_selection_statistics
+        self.selection_stats = selection_stats
         self.setModal(False)  # Не модальный, чтобы можно было продолжать работу
         self.setWindowTitle('Статистика по выделенным записям')
         self.setFixedSize(500, 600)
@@ -1132,7 +1143,7 @@ class SelectionStatsDialog(QDialog):
         layout.addWidget(title_label)
 
         # Информация о количестве
-        count_label = QLabel(f"Выделено записей: {len(self.selected_data)}")
+        count_label = QLabel(f"Выделено записей: {self.selection_stats['total']}")
         count_label.setStyleSheet("font-weight: bold; font-size: 13px; margin-bottom: 10px;")
         layout.addWidget(count_label)
 
@@ -1237,55 +1248,15 @@ class SelectionStatsDialog(QDialog):
         self.setLayout(layout)
 
     def calculate_stats(self):
-        """Вычисление статистики по выделенным данным (обновленный для новой структуры)"""
-        stats = {
-            'total': len(self.selected_data),
-            'applying': 0,
-            'refused': 0,
-            'male': 0,
-            'female': 0,
-            'military': 0,
-            'doc1': 0,  # ВК
-            'doc2': 0,  # ОК
-            'doc3': 0,  # ВА ВКО
-            'courses': {},
+        """Статистика по выделенным записям с процентами от общего числа"""
+        stats = dict(self.selection_stats)
+        stats.update({
             'applying_percent': 0,
             'refused_percent': 0,
             'male_percent': 0,
             'female_percent': 0,
             'military_percent': 0
-        }
-
-        for row_data in self.selected_data:
-            # Статус поступления
-            status = row_data.get('status', '')
-            if status == 'поступает':
-                stats['applying'] += 1
-            elif status == 'отказывается':
-                stats['refused'] += 1
-
-            # Категория
-            category = row_data.get('category', '')
-            if category == 'м':
-                stats['male'] += 1
-            elif category == 'ж':
-                stats['female'] += 1
-            elif category == 'всл':
-                stats['military'] += 1
-
-            # Статус документов
-            doc_status = row_data.get('document_status', '')
-            if doc_status == 'ВК':
-                stats['doc1'] += 1
-            elif doc_status == 'ОК':
-                stats['doc2'] += 1
-            elif doc_status == 'ВА ВКО':
-                stats['doc3'] += 1
-
-            # Курс агитатора
-            course = row_data.get('agitator_course', '')
-            if course:
-                stats['courses'][course] = stats['courses'].get(course, 0) + 1
+        })
 
         # Вычисляем проценты
         total = stats['total']
@@ -1682,9 +1653,7 @@ class UserDialog(QDialog):
         # Получаем уникальные подразделения из БД
         departments = []
         if self.db:
-            cursor = self.db.conn.cursor()
-            cursor.execute('SELECT DISTINCT name FROM departments WHERE type != "root" ORDER BY name')
-            departments = [row['name'] for row in cursor.fetchall()]
+            departments = self.db.get_department_names()
 
         if not departments:
             info_label = QLabel("Нет доступных подразделений. Создайте их в настройках.")
@@ -1778,9 +1747,7 @@ class UserDialog(QDialog):
 
         department_name = self.user_data.get('department_name', '')
         if not department_name and self.user_data.get('department_id'):
-            cursor = self.db.conn.cursor()
-            cursor.execute('SELECT name FROM departments WHERE id = ?', (self.user_data['department_id'],))
-            dept = cursor.fetchone()
+            dept = self.db.get_department(self.user_data['department_id'])
             if dept:
                 department_name = dept['name']
 
@@ -1816,11 +1783,7 @@ class UserDialog(QDialog):
         department_name = self.department.currentText()
         department_id = None
         if self.db and department_name:
-            cursor = self.db.conn.cursor()
-            cursor.execute('SELECT id FROM departments WHERE name = ?', (department_name,))
-            result = cursor.fetchone()
-            if result:
-                department_id = result['id']
+            department_id = self.db.get_department_id(department_name)
 
         data = {
             'username': self.username.text().strip(),
@@ -1918,118 +1881,113 @@ class PermissionDialog(QDialog):
         return data
 
 
+class DuplicatesDialog(QDialog):
+    """Список пар вероятных дубликатов абитуриентов"""
+
+    def __init__(self, duplicates, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f"Похожие записи ({len(duplicates)})")
+        self.setMinimumSize(800, 500)
+
+        layout = QVBoxLayout(self)
+        hint = QLabel("Пары абитуриентов с похожими ФИО; совпадение телефона выделено.")
+        hint.setWordWrap(True)
+        layout.addWidget(hint)
+
+        table = QTableWidget(len(duplicates), 6)
+        table.setHorizontalHeaderLabels([
+            "ФИО 1", "Телефон 1", "ФИО 2", "Телефон 2", "Сходство", "ID"
+        ])
+        table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        table.setAlternatingRowColors(True)
+        for row, pair in enumerate(duplicates):
+            values = [
+                pair['name1'], pair['phone1'] or '', pair['name2'], pair['phone2'] or '',
+                f"{pair['similarity']:.0%}", f"{pair['id1']}, {pair['id2']}",
+            ]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if pair['same_phone'] and column in (1, 3):
+                    item.setBackground(QColor('#fdebd0'))
+                table.setItem(row, column, item)
+        table.resizeColumnsToContents()
+        table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(table)
+
+        close_btn = QPushButton("Закрыть")
+        close_btn.clicked.connect(self.accept)
+        layout.addWidget(close_btn, alignment=Qt.AlignmentFlag.AlignRight)
+
+
+class MaintenanceWorker(QThread):
+    """Поток обслуживания БД (при работе через сервер БД обслуживание выполняет сервер)"""
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(bool, str)
+
+    def __init__(self, db, backup=True, analyze=True, vacuum=True, full_vacuum=False):
+        super().__init__()
+        self.db = db
+        self.options = {'backup': backup, 'analyze': analyze, 'vacuum': vacuum, 'full_vacuum': full_vacuum}
+
+    def run(self):
+        try:
+            if getattr(self.db, 'remote', False):
+                self.progress.emit("Обслуживание БД на сервере...")
+                message = self.db.run_maintenance(**self.options)
+            else:
+                report = DatabaseMaintenance(self.db).run(progress=self.progress.emit, **self.options)
+                message = format_report(report)
+            self.finished.emit(True, message)
+        except Exception as e:
+            self.finished.emit(False, f"Ошибка обслуживания БД: {e}")
+        finally:
+            self.db.close_reader()
+
+
 class ImportWorker(QThread):
     """Поток для импорта данных"""
     progress = pyqtSignal(int, str)
     finished = pyqtSignal(bool, str)
 
-    def __init__(self, file_path, password, selected_sheets, mapping, user_id, db):
+    def __init__(self, session, selected_sheets, mapping, user_id, db):
         super().__init__()
-        self.file_path = file_path
-        self.password = password
+        self.session = session  # ImportSession диалога: книга уже расшифрована и открыта
         self.selected_sheets = selected_sheets
         self.mapping = mapping
         self.user_id = user_id
         self.db = db
+        # Листов, разобранных пулом процессов (None - листы читаются в потоке импорта)
+        self.parsed_sheets = None
+        self.sheet_count = 0
 
     def run(self):
         try:
-            temp_file_path = None
-
-            # Расшифровка если есть пароль
-            if self.password:
-                try:
-                    import msoffcrypto
-                    import tempfile
-
-                    with open(self.file_path, "rb") as f:
-                        office_file = msoffcrypto.OfficeFile(f)
-                        office_file.load_key(password=self.password)
-
-                        temp_file = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
-                        temp_file_path = temp_file.name
-                        office_file.decrypt(temp_file)
-                        temp_file.close()
-
-                        self.file_path = temp_file_path
-                except Exception as e:
-                    self.finished.emit(False, f"Ошибка расшифровки: {str(e)}")
-                    return
-
-            # Читаем Excel файл
-            try:
-                xls = pd.ExcelFile(self.file_path, engine='openpyxl')
-            except:
-                try:
-                    xls = pd.ExcelFile(self.file_path, engine='xlrd')
-                except:
-                    xls = pd.ExcelFile(self.file_path)
-
             imported_count = 0
             duplicate_count = 0
             error_count = 0
-            total_rows = 0
 
-            # Подсчитываем общее количество строк для прогресса
-            for sheet_name in self.selected_sheets:
-                if sheet_name in xls.sheet_names:
-                    df = pd.read_excel(xls, sheet_name=sheet_name, header=0)
-                    total_rows += len(df)
+            # Общее количество строк для прогресса - по размерам листов, без их чтения
+            with self.session.open() as reader:
+                sheet_names = [name for name in self.selected_sheets if name in reader.sheet_names]
+                sheet_rows = {name: reader.row_count(name) for name in sheet_names}
+            total_rows = max(sum(sheet_rows.values()), 1)
 
             current_row = 0
 
-            for sheet_name in self.selected_sheets:
-                if sheet_name not in xls.sheet_names:
-                    continue
-
-                self.progress.emit(int((current_row / total_rows) * 100), f"Обработка листа: {sheet_name}")
-
-                df = pd.read_excel(xls, sheet_name=sheet_name, header=0)
-
-                # Определяем курс из названия листа
-                course_from_sheet = ''
-                for course_num in ['1', '2', '3', '4', '5']:
-                    if f'{course_num} курс' in sheet_name.lower():
-                        course_from_sheet = f'{course_num} курс'
-                        break
-
-                for index, row in df.iterrows():
-                    current_row += 1
+            # Листы разбираются параллельно, а вставляет их только этот поток в порядке листов
+            with contextlib.closing(self.iter_sheets(sheet_names)) as sheets:
+                for sheet_name, applicants in sheets:
+                    self.progress.emit(
+                        min(int((current_row / total_rows) * 100), 100), f"Обработка листа: {sheet_name}"
+                    )
+                    batches = self.import_sheet(applicants, current_row, total_rows)
+                    for batch_stats in batches:
+                        imported_count += batch_stats['inserted']
+                        duplicate_count += batch_stats['duplicates']
+                        error_count += batch_stats['errors']
 
-                    if current_row % 10 == 0:
-                        self.progress.emit(int((current_row / total_rows) * 100),
-                                           f"Импорт: {current_row}/{total_rows}")
-
-                    # Пропускаем пустые строки
-                    if row.isnull().all():
-                        continue
-
-                    # Извлекаем данные по маппингу
-                    applicant_data = self.extract_data(row, self.mapping, course_from_sheet)
-
-                    if not applicant_data.get('applicant_name'):
-                        error_count += 1
-                        continue
-
-                    # Проверка на дубликат
-                    if self.check_duplicate(applicant_data):
-                        duplicate_count += 1
-                        continue
-
-                    # Добавляем в БД
-                    try:
-                        self.db.add_applicant(self.user_id, applicant_data)
-                        imported_count += 1
-                    except Exception as e:
-                        error_count += 1
-                        print(f"Ошибка добавления: {e}")
-
-            # Очистка
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
+                    current_row += sheet_rows[sheet_name]
 
             result_message = f"""
             Импорт завершен!
@@ -2045,104 +2003,99 @@ class ImportWorker(QThread):
 
         except Exception as e:
             self.finished.emit(False, f"Ошибка импорта: {str(e)}")
+        finally:
+            self.db.close_reader()
+
+    def iter_sheets(self, sheet_names):
+        """Данные абитуриентов листов в порядке sheet_names: пары (лист, данные)
+
+        Если листов несколько, они читаются и преобразуются параллельно в пуле
+        процессов (настройка import_processes). Данные выдаются в порядке листов
+        независимо от того, какой процесс закончил первым, поэтому результат
+        импорта не зависит от числа процессов. Один лист читается потоково
+        в этом же потоке.
+        """
+        chunk_size = int(self.db.config['import_batch_size'])
+        processes = import_process_count(self.db.config, len(sheet_names))
+        if processes == 1:
+            with self.session.open() as reader:
+                for sheet_name in sheet_names:
+                    columns, rows = reader.read_table(sheet_name)
+                    yield sheet_name, iter_transformed(
+                        columns, rows, self.mapping, course_from_sheet_name(sheet_name), chunk_size
+                    )
+            return
 
-    def extract_data(self, row, mapping, course_from_sheet):
-        """Извлечение данных по маппингу"""
-        data = {
-            'applicant_name': '',
-            'region': '',
-            'city': '',
-            'category': '',
-            'phone': '',
-            'education': '',
-            'status': 'поступает',
-            'document_status': '',
-            'agitator_department': '',
-            'agitator_name': '',
-            'agitator_course': '',
-            'agitator_group': '',
-            'agitator_rank': '',
-            'agitator_is_cadet': False,
-            'notes': ''
-        }
+        # Прогресс разбора листов в пуле (см. sheet_parsed, import_sheet)
+        self.parsed_sheets = 0
+        self.sheet_count = len(sheet_names)
 
-        # Маппинг полей - ВАЖНО: правильно сопоставляем!
-        for field, column in mapping.items():
-            if column and column in row and pd.notna(row[column]):
-                value = str(row[column]).strip()
-
-                if field == 'applicant_name':
-                    data['applicant_name'] = value
-                elif field == 'region':
-                    data['region'] = value
-                elif field == 'city':
-                    data['city'] = value
-                elif field == 'category':
-                    if value.lower() in ['м', 'м.', 'муж', 'мужчина', 'male']:
-                        data['category'] = 'м'
-                    elif value.lower() in ['ж', 'ж.', 'жен', 'женщина', 'female']:
-                        data['category'] = 'ж'
-                    elif value.lower() in ['всл', 'военнослужащий', 'военнослужащие', 'воен']:
-                        data['category'] = 'всл'
-                    else:
-                        data['category'] = value[:2].lower()
-                elif field == 'phone':
-                    data['phone'] = self.normalize_phone(value)
-                elif field == 'education':
-                    data['education'] = value
-                elif field == 'status':
-                    if 'поступает' in value.lower() or 'поступают' in value.lower():
-                        data['status'] = 'поступает'
-                    else:
-                        data['status'] = 'отказывается'
-                elif field == 'document_status':
-                    data['document_status'] = value
-                elif field == 'agitator_department':
-                    data['agitator_department'] = value
-                elif field == 'agitator_name':
-                    data['agitator_name'] = value
-                elif field == 'agitator_course':
-                    data['agitator_course'] = value
-                elif field == 'agitator_group':
-                    data['agitator_group'] = value
-                elif field == 'agitator_rank':
-                    data['agitator_rank'] = value
-                elif field == 'notes':
-                    data['notes'] = value
-        # Если курс не указан, берем из названия листа
-        if not data['agitator_course'] and course_from_sheet:
-            data['agitator_course'] = course_from_sheet
-
-        # Определяем тип агитатора
-        if data['agitator_group'] or (data['agitator_course'] and not data['agitator_rank']):
-            data['agitator_is_cadet'] = True
-        return data
+        # spawn, а не fork: дочерний процесс не наследует потоки Qt и соединения SQLite
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as pool:
+            futures = [
+                pool.submit(parse_sheet, self.session.source, sheet_name, self.mapping, chunk_size)
+                for sheet_name in sheet_names
+            ]
+            for future in futures:
+                future.add_done_callback(self.sheet_parsed)
+            try:
+                for sheet_name, future in zip(sheet_names, futures):
+                    yield sheet_name, future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
 
-    @staticmethod
-    def normalize_phone(phone):
-        """Нормализация номера телефона"""
-        if not phone:
-            return ""
-        digits = ''.join(filter(str.isdigit, phone))
-        if len(digits) < 10:
-            return phone
-        if digits.startswith('8') and len(digits) == 11:
-            return '7' + digits[1:]
-        elif len(digits) == 10:
-            return '7' + digits
-        elif digits.startswith('7') and len(digits) == 11:
-            return digits
-        return digits
+    def sheet_parsed(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.parsed_sheets += 1
 
-    def check_duplicate(self, applicant_data):
-        """Проверка на дубликат"""
-        cursor = self.db.conn.cursor()
-        cursor.execute('''
-            SELECT COUNT(*) FROM applicants 
-            WHERE applicant_name = ? AND phone = ?
-        ''', (applicant_data['applicant_name'], applicant_data['phone']))
-        count = cursor.fetchone()[0]
-        return count > 0
+    def import_sheet(self, applicants, sheet_start, total_rows):
+        """Вставка данных одного листа; возвращает статистику пакетов add_applicants_bulk"""
+        def report_batch(processed, batch_stats):
+            done = sheet_start + processed
+            message = f"Импорт: {done}/{total_rows}"
+            if self.parsed_sheets is not None:
+                message += f", разобрано листов: {self.parsed_sheets}/{self.sheet_count}"
+            self.progress.emit(min(int((done / total_rows) * 100), 100), message)
+
+        # Записи без ФИО абитуриента считаются ошибками
+        return self.db.add_applicants_bulk(self.user_id, applicants, on_batch=report_batch)
+
+
+class WorkbookPeekWorker(QThread):
+    """Фоновое чтение начала книги для диалога импорта
+
+    Без session книга открывается заново (с расшифровкой по паролю). Читаются
+    только заголовок и первые строки листа sheet_name (по умолчанию первого):
+    они кэшируются в ImportSession, остальная часть листа не читается.
+    """
+    loaded = pyqtSignal(object, object)  # ImportSession, лист (None - в книге нет листов)
+    failed = pyqtSignal(object)  # исключение
+
+    def __init__(self, file_path, password, session=None, sheet_name=None):
+        super().__init__()
+        self.file_path = file_path
+        self.password = password
+        self.session = session
+        self.sheet_name = sheet_name
+
+    def run(self):
+        session = self.session
+        try:
+            if session is None:
+                session = ImportSession(self.file_path, self.password)
+            sheet_name = self.sheet_name
+            if sheet_name is None and session.sheet_names:
+                sheet_name = session.sheet_names[0]
+            if sheet_name is not None:
+                session.preview(sheet_name)
+        except Exception as e:
+            if session is not None and session is not self.session:
+                session.close()
+            self.failed.emit(e)
+        else:
+            self.loaded.emit(session, sheet_name)
 
 
 class ImportDialog(QDialog):
@@ -2153,6 +2106,10 @@ class ImportDialog(QDialog):
         self.db = db
         self.user_id = user_id
         self.file_path = None
+        self.session = None  # ImportSession загруженного файла
+        self.test_mapping_btn = None
+        self.peek_worker = None  # текущее фоновое чтение книги (WorkbookPeekWorker)
+        self.peek_workers = set()  # все незавершенные чтения
         self.available_columns = []
         self.mapping = {}
         self.setModal(True)
@@ -2373,41 +2330,90 @@ class ImportDialog(QDialog):
         self.ok_button.setEnabled(False)
         self.available_columns = []
         self.mapping = {}
-
-    def load_sheets(self):
-        """Загрузка списка листов"""
-        if not self.file_path:
+        self.peek_worker = None
+        self.set_peek_running(False)
+        self.close_session()
+
+    def done(self, result):
+        """Закрытие диалога: книга импорта больше не нужна"""
+        self.peek_worker = None
+        for worker in list(self.peek_workers):
+            worker.wait()
+        self.close_session()
+        super().done(result)
+
+    def close_session(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def current_session(self):
+        """ImportSession, если с загрузки листов не менялись файл и пароль, иначе None"""
+        if self.session is None or not self.session.matches(self.file_path, self.password_input.text().strip()):
+            QMessageBox.warning(self, "Ошибка", "Файл или пароль изменились - загрузите листы заново!")
+            return None
+        return self.session
+
+    def start_peek(self, on_loaded, session=None, sheet_name=None):
+        """Чтение начала книги в фоне (WorkbookPeekWorker)
+
+        on_loaded(сессия, лист) вызывается в потоке GUI, если за время чтения не было
+        запущено новое чтение и не выбран другой файл.
+        """
+        worker = WorkbookPeekWorker(self.file_path, self.password_input.text().strip(), session, sheet_name)
+        self.peek_worker = worker
+        self.peek_workers.add(worker)
+        worker.loaded.connect(
+            lambda session, sheet_name: self.peek_loaded(worker, on_loaded, session, sheet_name)
+        )
+        worker.failed.connect(lambda error: self.peek_failed(worker, error))
+        worker.finished.connect(lambda: self.peek_workers.discard(worker))
+        self.set_peek_running(True)
+        worker.start()
+
+    def peek_loaded(self, worker, on_loaded, session, sheet_name):
+        if worker is not self.peek_worker:
+            # Результат устаревшего чтения: книга, открытая для него, не нужна
+            if session is not self.session:
+                session.close()
             return
+        self.peek_worker = None
+        self.set_peek_running(False)
+        on_loaded(session, sheet_name)
 
-        try:
-            # Определяем движок
-            engine = 'openpyxl' if self.file_path.endswith('.xlsx') else 'xlrd'
-
-            # Пробуем прочитать с паролем
-            temp_file_path = None
-            file_path = self.file_path
-
-            if self.password_input.text().strip():
-                try:
-                    import msoffcrypto
-                    import tempfile
+    def peek_failed(self, worker, error):
+        if worker is not self.peek_worker:
+            return
+        self.peek_worker = None
+        self.set_peek_running(False)
+        if isinstance(error, WorkbookPasswordError):
+            QMessageBox.warning(self, "Ошибка", f"Неверный пароль: {str(error)}")
+        else:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось прочитать файл: {str(error)}")
 
-                    with open(self.file_path, "rb") as f:
-                        office_file = msoffcrypto.OfficeFile(f)
-                        office_file.load_key(password=self.password_input.text().strip())
+    def set_peek_running(self, running):
+        """Кнопки чтения книги недоступны, пока идет фоновое чтение"""
+        self.load_sheets_btn.setEnabled(not running and bool(self.file_path))
+        self.load_sheets_btn.setText("Чтение файла..." if running else "Загрузить листы")
+        if self.test_mapping_btn is not None:
+            self.test_mapping_btn.setEnabled(not running)
 
-                        temp_file = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
-                        temp_file_path = temp_file.name
-                        office_file.decrypt(temp_file)
-                        temp_file.close()
+    def load_sheets(self):
+        """Загрузка списка листов
 
-                        file_path = temp_file_path
-                except Exception as e:
-                    QMessageBox.warning(self, "Ошибка", f"Неверный пароль: {str(e)}")
-                    return
+        Книга открывается (и расшифровывается) заново в фоне: список листов мог
+        измениться. Колонки для маппинга берутся из заголовка первого листа.
+        """
+        if not self.file_path:
+            return
 
-            xls = pd.ExcelFile(file_path, engine=engine)
+        self.close_session()
+        self.start_peek(self.show_sheets)
 
+    def show_sheets(self, session, first_sheet):
+        """Листы и маппинг колонок открытой книги"""
+        self.session = session
+        try:
             # Очищаем старые чекбоксы
             while self.sheets_layout.count():
                 item = self.sheets_layout.takeAt(0)
@@ -2421,7 +2427,7 @@ class ImportDialog(QDialog):
 
             row = 0
             col = 0
-            for sheet in xls.sheet_names:
+            for sheet in session.sheet_names:
                 checkbox = QCheckBox(sheet)
                 if 'курс' in sheet.lower():
                     checkbox.setChecked(True)
@@ -2450,21 +2456,12 @@ class ImportDialog(QDialog):
             self.sheets_layout.addWidget(buttons_widget)
             self.sheets_widget.setVisible(True)
 
-            # Сохраняем колонки для маппинга
-            first_sheet = xls.sheet_names[0]
-            df = pd.read_excel(file_path, sheet_name=first_sheet, header=0)
-            self.available_columns = list(df.columns)
+            # Сохраняем колонки для маппинга (заголовок первого листа уже прочитан в фоне)
+            self.available_columns = session.columns(first_sheet) if first_sheet is not None else []
 
             # Создаем маппинг
             self.create_mapping_ui()
 
-            # Очищаем временный файл
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
-
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить листы: {str(e)}")
 
@@ -2547,9 +2544,9 @@ class ImportDialog(QDialog):
         self.mapping_layout.addRow(info_label)
 
         # Добавляем кнопку для проверки маппинга
-        test_btn = QPushButton("Проверить маппинг")
-        test_btn.clicked.connect(self.test_mapping)
-        self.mapping_layout.addRow(test_btn)
+        self.test_mapping_btn = QPushButton("Проверить маппинг")
+        self.test_mapping_btn.clicked.connect(self.test_mapping)
+        self.mapping_layout.addRow(self.test_mapping_btn)
 
         self.mapping_widget.setVisible(True)
         self.ok_button.setEnabled(True)
@@ -2567,31 +2564,20 @@ class ImportDialog(QDialog):
             return
 
         sheet_name = selected[0].text()
+        session = self.current_session()
+        if session is None:
+            return
 
-        try:
-            # Читаем файл
-            file_path = self.file_path
-            temp_file_path = None
-
-            if self.password_input.text().strip():
-                try:
-                    import msoffcrypto
-                    import tempfile
-
-                    with open(self.file_path, "rb") as f:
-                        office_file = msoffcrypto.OfficeFile(f)
-                        office_file.load_key(password=self.password_input.text().strip())
-
-                        temp_file = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
-                        temp_file_path = temp_file.name
-                        office_file.decrypt(temp_file)
-                        temp_file.close()
-
-                        file_path = temp_file_path
-                except:
-                    pass
+        # Первые строки листа кэшируются сессией: повторная проверка не читает файл
+        if session.is_loaded(sheet_name):
+            self.show_preview(session, sheet_name)
+        else:
+            self.start_peek(self.show_preview, session, sheet_name)
 
-            df = pd.read_excel(file_path, sheet_name=sheet_name, header=0)
+    def show_preview(self, session, sheet_name):
+        """Первые строки листа и текущий маппинг"""
+        try:
+            df = pd.DataFrame(session.preview(sheet_name), columns=session.columns(sheet_name))
 
             # Показываем первые 5 строк
             preview_text = f"Первые 5 строк из листа '{sheet_name}':\n\n"
@@ -2608,13 +2594,6 @@ class ImportDialog(QDialog):
 
             QMessageBox.information(self, "Проверка данных", preview_text)
 
-            # Очищаем временный файл
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
-
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось прочитать файл: {str(e)}")
 
@@ -2688,10 +2667,13 @@ class ImportDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Необходимо сопоставить колонку 'ФИО агитатора'!")
             return
 
+        session = self.current_session()
+        if session is None:
+            return
+
         # Запускаем импорт в отдельном потоке
         self.worker = ImportWorker(
-            self.file_path,
-            self.password_input.text().strip(),
+            session,
             selected_sheets,
             mapping,
             self.user_id,
@@ -2775,9 +2757,7 @@ class DepartmentDialog(QDialog):
         self.parent_dept.addItem("Нет (корневое)")
         self.load_parent_departments()
         if self.dept_data and self.dept_data.get('parent_id'):
-            cursor = self.db.conn.cursor()
-            cursor.execute('SELECT name FROM departments WHERE id = ?', (self.dept_data['parent_id'],))
-            parent = cursor.fetchone()
+            parent = self.db.get_department(self.dept_data['parent_id'])
             if parent:
                 index = self.parent_dept.findText(parent['name'])
                 if index >= 0:
@@ -2789,9 +2769,7 @@ class DepartmentDialog(QDialog):
         self.head_user.addItem("Не назначен")
         self.load_users()
         if self.dept_data and self.dept_data.get('head_user_id'):
-            cursor = self.db.conn.cursor()
-            cursor.execute('SELECT full_name FROM users WHERE id = ?', (self.dept_data['head_user_id'],))
-            head = cursor.fetchone()
+            head = self.db.get_user_by_id(self.dept_data['head_user_id'])
             if head:
                 index = self.head_user.findText(head['full_name'])
                 if index >= 0:
@@ -2825,32 +2803,13 @@ class DepartmentDialog(QDialog):
     def load_parent_departments(self):
         """Загрузка родительских подразделений (только факультеты и кафедры)"""
         if self.db:
-            cursor = self.db.conn.cursor()
-            cursor.execute('''
-                SELECT name FROM departments 
-                WHERE type IN ('faculty', 'department') AND type != 'root'
-                ORDER BY 
-                    CASE type
-                        WHEN 'faculty' THEN 1
-                        WHEN 'department' THEN 2
-                        ELSE 3
-                    END,
-                    name
-            ''')
-            for row in cursor.fetchall():
-                self.parent_dept.addItem(row['name'])
+            for name in self.db.get_parent_department_names():
+                self.parent_dept.addItem(name)
 
     def load_users(self):
         """Загрузка пользователей для назначения начальником"""
         if self.db:
-            cursor = self.db.conn.cursor()
-            cursor.execute('''
-                SELECT id, full_name, role 
-                FROM users 
-                WHERE role != 'admin' OR role = 'admin'
-                ORDER BY full_name
-            ''')
-            for row in cursor.fetchall():
+            for row in self.db.get_user_names():
                 role_mark = " (Админ)" if row['role'] == 'admin' else ""
                 self.head_user.addItem(f"{row['full_name']}{role_mark}", row['id'])
 
@@ -2871,11 +2830,9 @@ class DepartmentDialog(QDialog):
         # Родительское подразделение
         parent_name = self.parent_dept.currentText()
         if parent_name and parent_name != "Нет (корневое)" and self.db:
-            cursor = self.db.conn.cursor()
-            cursor.execute('SELECT id FROM departments WHERE name = ?', (parent_name,))
-            parent = cursor.fetchone()
-            if parent:
-                data['parent_id'] = parent['id']
+            parent_id = self.db.get_department_id(parent_name)
+            if parent_id:
+                data['parent_id'] = parent_id
 
         # Начальник
         head_data = self.head_user.currentData()
@@ -2898,9 +2855,17 @@ class MainWindow(QMainWindow):
         if icon_path and os.path.exists(icon_path):
             self.setWindowIcon(QIcon(icon_path))
         self.user_data = user_data
-        self.db = Database()
+        self.db = open_database()
+        self.executor = QueryExecutor(self.db, parent=self)
+        self.maintenance_worker = None
+        self.db_closed = False
         self.init_ui()
 
+        # Плановое обслуживание БД в фоне, когда подошел срок
+        self.maintenance_timer = QTimer(self)
+        self.maintenance_timer.timeout.connect(self.run_maintenance_if_due)
+        self.maintenance_timer.start(MAINTENANCE_CHECK_INTERVAL)
+
     def init_ui(self):
         self.setWindowTitle(f'Агитация - {self.user_data["full_name"]}')
         self.setGeometry(100, 100, 1200, 700)
@@ -2964,7 +2929,8 @@ class MainWindow(QMainWindow):
         self.stats_tab = StatisticsWidget(
             self.user_data['id'],
             self.user_data['role'],
-            self.db
+            self.db,
+            self.executor
         )
         self.tab_widget.addTab(self.stats_tab, QIcon(resource_path("icons/stata.png")), 'Статистика')
 
@@ -3063,7 +3029,7 @@ class MainWindow(QMainWindow):
         )
 
         if reply == QMessageBox.StandardButton.Yes:
-            self.db.close()
+            self.close_database()
             self.logout_requested.emit()  # Отправляем сигнал
             self.close()
 
@@ -3128,10 +3094,31 @@ class MainWindow(QMainWindow):
             """)
         self.reset_filters_btn.clicked.connect(self.reset_all_filters)
 
+        # Кнопка поиска вероятных дубликатов
+        self.find_duplicates_btn = QPushButton("Похожие записи")
+        self.find_duplicates_btn.setStyleSheet("""
+                QPushButton {
+                    background-color: #16a085;
+                    color: white;
+                    border: none;
+                    border-radius: 5px;
+                    padding: 8px 16px;
+                    font-weight: bold;
+                }
+                QPushButton:hover {
+                    background-color: #138d75;
+                }
+                QPushButton:disabled {
+                    background-color: #bdc3c7;
+                }
+            """)
+        self.find_duplicates_btn.clicked.connect(self.find_probable_duplicates)
+
         filter_layout.addWidget(search_label)
         filter_layout.addWidget(self.search_input)
         filter_layout.addWidget(self.advanced_search_btn)
         filter_layout.addWidget(self.reset_filters_btn)
+        filter_layout.addWidget(self.find_duplicates_btn)
 
         filter_widget.setLayout(filter_layout)
         layout.addWidget(filter_widget)
@@ -3214,6 +3201,53 @@ class MainWindow(QMainWindow):
         self.show_stats_btn.clicked.connect(self.show_selection_stats)
         self.show_stats_btn.setEnabled(False)
 
+        # Групповые действия над выделенными записями
+        self.bulk_edit_btn = QPushButton("Изменить выделенные")
+        self.bulk_edit_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #27ae60;
+                color: white;
+                border: none;
+                border-radius: 5px;
+                padding: 6px 12px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #229954;
+            }
+            QPushButton:disabled {
+                background-color: #bdc3c7;
+            }
+        """)
+        bulk_edit_menu = QMenu(self.bulk_edit_btn)
+        bulk_edit_menu.addAction("Статус документов...",
+                                 lambda: self.bulk_update_applicants('document_status'))
+        bulk_edit_menu.addAction("Статус...", lambda: self.bulk_update_applicants('status'))
+        bulk_edit_menu.addAction("Подразделение агитатора...",
+                                 lambda: self.bulk_update_applicants('agitator_department'))
+        self.bulk_edit_btn.setMenu(bulk_edit_menu)
+        self.bulk_edit_btn.setEnabled(False)
+
+        self.bulk_delete_btn = QPushButton("Удалить выделенные")
+        self.bulk_delete_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #e74c3c;
+                color: white;
+                border: none;
+                border-radius: 5px;
+                padding: 6px 12px;
+                font-weight: bold;
+            }
+            QPushButton:hover {
+                background-color: #c0392b;
+            }
+            QPushButton:disabled {
+                background-color: #bdc3c7;
+            }
+        """)
+        self.bulk_delete_btn.clicked.connect(self.delete_applicant)
+        self.bulk_delete_btn.setEnabled(False)
+
         self.clear_selection_btn = QPushButton("Снять выделение")
         self.clear_selection_btn.setStyleSheet("""
             QPushButton {
@@ -3233,12 +3267,38 @@ class MainWindow(QMainWindow):
         selection_layout.addWidget(self.selection_info_label)
         selection_layout.addStretch()
         selection_layout.addWidget(self.show_stats_btn)
+        selection_layout.addWidget(self.bulk_edit_btn)
+        selection_layout.addWidget(self.bulk_delete_btn)
         selection_layout.addWidget(self.clear_selection_btn)
 
         layout.addWidget(self.selection_status_widget)
 
         self.data_tab.setLayout(layout)
 
+    def find_probable_duplicates(self):
+        """Поиск вероятных дубликатов среди видимых пользователю абитуриентов в фоне"""
+        self.find_duplicates_btn.setEnabled(False)
+        self.statusBar().showMessage("Поиск похожих записей...")
+
+        def on_error(error):
+            self.find_duplicates_btn.setEnabled(True)
+            QMessageBox.critical(self, "Ошибка", f"Ошибка поиска похожих записей: {error}")
+
+        self.executor.submit(
+            'duplicates', self.db.find_probable_duplicates,
+            self.user_data['id'], self.user_data['role'],
+            on_result=self.show_probable_duplicates, on_error=on_error
+        )
+
+    def show_probable_duplicates(self, duplicates):
+        """Вывод найденных пар похожих записей"""
+        self.find_duplicates_btn.setEnabled(True)
+        self.statusBar().showMessage(f"Найдено пар похожих записей: {len(duplicates)}", 10000)
+        if not duplicates:
+            QMessageBox.information(self, "Похожие записи", "Похожих записей не найдено.")
+            return
+        DuplicatesDialog(duplicates, self).exec()
+
     def on_selection_changed(self):
         """Обработка изменения выделения в таблице"""
         selected_rows = set()
@@ -3248,6 +3308,8 @@ class MainWindow(QMainWindow):
         count = len(selected_rows)
         self.selection_info_label.setText(f"Выделено: {count} записей")
         self.show_stats_btn.setEnabled(count > 0)
+        self.bulk_edit_btn.setEnabled(count > 0)
+        self.bulk_delete_btn.setEnabled(count > 0)
 
         # Обновляем статусную строку
         if count > 0:
@@ -3261,6 +3323,84 @@ class MainWindow(QMainWindow):
         self.table.clearSelection()
         self.on_selection_changed()
 
+    def selected_applicant_ids(self):
+        """ID абитуриентов в выделенных строках таблицы"""
+        applicant_ids = []
+        for index in self.table.selectionModel().selectedRows():
+            id_item = self.table.item(index.row(), 0)
+            if id_item and id_item.text().strip():
+                applicant_ids.append(int(id_item.text()))
+        return applicant_ids
+
+    def bulk_update_applicants(self, field):
+        """Установка одного значения поля у всех выделенных абитуриентов"""
+        applicant_ids = self.selected_applicant_ids()
+        if not applicant_ids:
+            QMessageBox.warning(self, "Внимание", "Нет выделенных записей!")
+            return
+
+        if field == 'status':
+            title = "Статус"
+            choices = {'Поступает': 'поступает', 'Отказывается': 'отказывается'}
+        elif field == 'document_status':
+            title = "Статус документов"
+            choices = {name: name for name in [''] + self.db.get_document_statuses()}
+        else:
+            title = "Подразделение агитатора"
+            choices = {name: name for name in self.db.get_department_names()}
+
+        choice, ok = QInputDialog.getItem(
+            self, title, f"{title} для выделенных записей ({len(applicant_ids)}):",
+            list(choices), 0, False
+        )
+        if not ok:
+            return
+
+        self.db.update_applicants(applicant_ids, field, choices[choice])
+        self.reload_applicant_rows(applicant_ids)
+        self.stats_tab.update_statistics()
+
+    def applicant_rows_by_id(self):
+        """Номера строк таблицы по ID абитуриента"""
+        rows = {}
+        for row in range(self.table.rowCount()):
+            id_item = self.table.item(row, 0)
+            if id_item and id_item.text().strip():
+                rows[int(id_item.text())] = row
+        return rows
+
+    def reload_applicant_rows(self, applicant_ids):
+        """Перечитывание измененных записей и обновление их строк без перезагрузки таблицы"""
+        if self.executor.is_running('applicants'):
+            # Таблица еще загружается - проще загрузить ее заново
+            self.refresh_data()
+            return
+        self.executor.submit(
+            'applicant_rows', self.db.get_applicants_by_ids, applicant_ids,
+            on_result=self.update_applicant_rows
+        )
+
+    def update_applicant_rows(self, applicants):
+        """Вывод перечитанных записей в их строки таблицы"""
+        rows_by_id = self.applicant_rows_by_id()
+        self.table.blockSignals(True)
+        for applicant in applicants:
+            row = rows_by_id.get(applicant['id'])
+            if row is not None:
+                self.set_applicant_row(row, applicant)
+        self.table.blockSignals(False)
+
+    def remove_applicant_rows(self, applicant_ids):
+        """Удаление строк записей из таблицы без ее перезагрузки"""
+        applicant_ids = set(applicant_ids)
+        self.table.blockSignals(True)
+        for row in range(self.table.rowCount() - 1, -1, -1):
+            id_item = self.table.item(row, 0)
+            if id_item and id_item.text().strip() and int(id_item.text()) in applicant_ids:
+                self.table.removeRow(row)
+        self.table.blockSignals(False)
+        self.on_selection_changed()
+
     def show_selection_stats(self):
         """Показать статистику по выделенным строкам"""
         selected_rows = set()
@@ -3271,59 +3411,30 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Внимание", "Нет выделенных записей!")
             return
 
-        # Собираем данные выделенных строк
-        selected_data = []
+        # Собираем ID выделенных записей (первая колонка)
+        selected_ids = []
         for row in selected_rows:
-            # Получаем ID записи (первая колонка)
             id_item = self.table.item(row, 0)
             if not id_item or not id_item.text().strip():
                 continue
 
             try:
-                applicant_id = int(id_item.text())
+                selected_ids.append(int(id_item.text()))
             except ValueError:
                 continue
 
-            # Получаем полные данные из БД по ID
-            cursor = self.db.conn.cursor()
-            cursor.execute('''
-                SELECT 
-                    applicant_name,
-                    region,
-                    city,
-                    category,
-                    phone,
-                    education,
-                    status,
-                    document_status,
-                    agitator_department,
-                    agitator_name,
-                    agitator_course,
-                    agitator_group,
-                    agitator_rank,
-                    agitator_is_cadet,
-                    created_at,
-                    updated_at
-                FROM applicants 
-                WHERE id = ?
-            ''', (applicant_id,))
-
-            result = cursor.fetchone()
-            if result:
-                row_data = dict(result)
-                row_data['id'] = applicant_id
-                selected_data.append(row_data)
-
-        if not selected_data:
+        # Счетчики считаются аналитическим кубом по ID
+        selection_stats = self.db.get_selection_statistics(selected_ids)
+        if not selection_stats['total']:
             QMessageBox.warning(self, "Внимание", "Не удалось получить данные для выделенных записей!")
             return
 
         # Показываем диалог со статистикой
-        stats_dialog = SelectionStatsDialog(selected_data, self)
+        stats_dialog = SelectionStatsDialog(selection_stats, self)
         stats_dialog.show()
 
     def refresh_data(self):
-        """Обновление данных в таблице"""
+        """Обновление данных в таблице (выборка страницами в фоновом потоке)"""
         # Сохраняем выделенные ID
         selected_ids = set()
         for item in self.table.selectedItems():
@@ -3332,139 +3443,136 @@ class MainWindow(QMainWindow):
             if id_item:
                 selected_ids.add(int(id_item.text()))
 
-        # Получение данных из БД с учетом расширенных фильтров
-        if self.user_data['role'] == 'admin':
-            course = self.course_filter.currentText() if hasattr(self, 'course_filter') else None
-            applicants = self.db.get_applicants(
-                self.user_data['id'],
-                'admin',
-                course if course != 'Все курсы' else None,
-                self.advanced_filters if self.advanced_filters else None
-            )
-        else:
-            applicants = self.db.get_applicants(
-                self.user_data['id'],
-                self.user_data['role'],
-                None,
-                self.advanced_filters if self.advanced_filters else None
-            )
+        # Обычный поиск работает в БД поверх расширенных фильтров
+        search_text = self.search_input.text().strip()
 
-        # Обычный поиск (дополнительно к расширенному)
-        search_text = self.search_input.text().lower().strip()
-        if search_text and not self.advanced_filters:
-            # Если нет расширенных фильтров, применяем обычный поиск
-            filtered_applicants = []
-            for applicant in applicants:
-                applicant_dict = dict(applicant)
-                text_fields = [
-                    str(applicant_dict.get('applicant_name', '')),
-                    str(applicant_dict.get('region', '')),
-                    str(applicant_dict.get('city', '')),
-                    str(applicant_dict.get('phone', '')),
-                    str(applicant_dict.get('agitator_name', '')),
-                    str(applicant_dict.get('agitator_department', '')),
-                ]
-                if any(search_text in field.lower() for field in text_fields):
-                    filtered_applicants.append(applicant)
-            applicants = filtered_applicants
-        elif search_text and self.advanced_filters:
-            # Если есть расширенные фильтры, обычный поиск работает поверх них
-            filtered_applicants = []
-            for applicant in applicants:
-                applicant_dict = dict(applicant)
-                text_fields = [
-                    str(applicant_dict.get('applicant_name', '')),
-                    str(applicant_dict.get('region', '')),
-                    str(applicant_dict.get('city', '')),
-                    str(applicant_dict.get('phone', '')),
-                    str(applicant_dict.get('agitator_name', '')),
-                ]
-                if any(search_text in field.lower() for field in text_fields):
-                    filtered_applicants.append(applicant)
-            applicants = filtered_applicants
+        # Получение данных из БД с учетом расширенных фильтров (постранично)
+        query_args = (
+            self.user_data['id'],
+            self.user_data['role'],
+            self.advanced_filters if self.advanced_filters else None,
+            search_text
+        )
+        self.table_load = {
+            'query_args': query_args,
+            'selected_ids': selected_ids,
+            'id_to_row': {},
+            'rows': 0,
+        }
+        self.executor.submit(
+            'applicants', self.load_applicants_page, query_args, None, True,
+            on_result=self.append_applicants_page
+        )
+
+    def load_applicants_page(self, query_args, after, with_count):
+        """Загрузка страницы абитуриентов (выполняется в потоке пула запросов)"""
+        total = self.db.count_applicants(*query_args) if with_count else None
+        rows, next_after = self.db.get_applicants_page(*query_args, page_size=APPLICANTS_PAGE_SIZE, after=after)
+        return total, rows, next_after
+
+    def append_applicants_page(self, page):
+        """Вывод очередной страницы абитуриентов в таблицу"""
+        total, applicants, next_after = page
+        load = self.table_load
 
         self.table.blockSignals(True)
-        self.table.setRowCount(len(applicants))
+        if total is not None:
+            self.table.setRowCount(total)
+
+        for applicant in applicants:
+            row = load['rows']
+            if row >= self.table.rowCount():
+                self.table.insertRow(row)
+            load['id_to_row'][applicant['id']] = row
+            self.set_applicant_row(row, applicant)
+            load['rows'] += 1
+
+        if next_after is not None:
+            self.table.blockSignals(False)
+            self.executor.submit(
+                'applicants', self.load_applicants_page, load['query_args'], next_after, False,
+                on_result=self.append_applicants_page
+            )
+            return
 
-        id_to_row = {}
+        # Количество могло измениться между подсчетом и выборкой
+        self.table.setRowCount(load['rows'])
 
-        # Категории для отображения
-        category_map = {'м': 'м', 'ж': 'ж', 'всл': 'в/сл'}
+        # Восстанавливаем выделение
+        for applicant_id in load['selected_ids']:
+            if applicant_id in load['id_to_row']:
+                self.table.selectRow(load['id_to_row'][applicant_id])
 
-        for row, applicant in enumerate(applicants):
-            applicant_dict = dict(applicant)
-            applicant_id = applicant_dict.get('id')
-            id_to_row[applicant_id] = row
+        self.table.resizeColumnsToContents()
+        self.table.blockSignals(False)
+        self.on_selection_changed()
 
-            phone = applicant_dict.get('phone', '')
-            formatted_phone = self.format_phone_number(phone)
+    def set_applicant_row(self, row, applicant):
+        """Заполнение строки таблицы данными абитуриента"""
+        # Категории для отображения
+        category_map = {'м': 'м', 'ж': 'ж', 'всл': 'в/сл'}
 
-            # Отображение категории
-            category = applicant_dict.get('category', '')
-            category_display = category_map.get(category, category)
+        # applicant - ApplicantRecord (поля доступны атрибутами, без копии в dict)
+        applicant_id = applicant.id
+        formatted_phone = self.format_phone_number(applicant.phone)
 
-            # Статус
-            status = applicant_dict.get('status', '')
-            status_display = 'Поступает' if status == 'поступает' else 'Отказывается'
+        # Отображение категории
+        category = applicant.category
+        category_display = category_map.get(category, category)
 
-            # Дата добавления
-            created_at = applicant_dict.get('created_at', '')
-            if created_at:
-                try:
-                    # Парсим дату из SQLite
-                    dt = datetime.fromisoformat(created_at.replace(' ', 'T'))
-                    date_display = dt.strftime("%d.%m.%Y %H:%M")
-                except:
-                    date_display = str(created_at)[:16]
-            else:
-                date_display = ""
+        # Статус
+        status = applicant.status
+        status_display = 'Поступает' if status == 'поступает' else 'Отказывается'
 
-            items = [
-                QTableWidgetItem(str(applicant_id)),
-                QTableWidgetItem(applicant_dict.get('applicant_name', '')),
-                QTableWidgetItem(applicant_dict.get('region', '')),
-                QTableWidgetItem(applicant_dict.get('city', '')),
-                QTableWidgetItem(category_display),
-                QTableWidgetItem(formatted_phone),
-                QTableWidgetItem(applicant_dict.get('education', '')),
-                QTableWidgetItem(status_display),
-                QTableWidgetItem(applicant_dict.get('document_status', '')),
-                QTableWidgetItem(applicant_dict.get('agitator_department', '')),
-                QTableWidgetItem(applicant_dict.get('agitator_name', '')),
-                QTableWidgetItem(date_display),
-            ]
+        # Дата добавления
+        created_at = applicant.created_at
+        if created_at:
+            try:
+                # Парсим дату из SQLite
+                dt = datetime.fromisoformat(created_at.replace(' ', 'T'))
+                date_display = dt.strftime("%d.%m.%Y %H:%M")
+            except:
+                date_display = str(created_at)[:16]
+        else:
+            date_display = ""
+
+        items = [
+            QTableWidgetItem(str(applicant_id)),
+            QTableWidgetItem(applicant.applicant_name),
+            QTableWidgetItem(applicant.region),
+            QTableWidgetItem(applicant.city),
+            QTableWidgetItem(category_display),
+            QTableWidgetItem(formatted_phone),
+            QTableWidgetItem(applicant.education),
+            QTableWidgetItem(status_display),
+            QTableWidgetItem(applicant.document_status),
+            QTableWidgetItem(applicant.agitator_department),
+            QTableWidgetItem(applicant.agitator_name),
+            QTableWidgetItem(date_display),
+        ]
 
-            # Цветовая индикация
-            if status == 'поступает':
-                items[7].setBackground(QColor(230, 255, 230))
-                items[7].setForeground(QColor(0, 100, 0))
-            else:
-                items[7].setBackground(QColor(255, 230, 230))
-                items[7].setForeground(QColor(150, 0, 0))
-
-            # Цвет для категории
-            if category == 'м':
-                items[4].setBackground(QColor(230, 240, 255))
-            elif category == 'ж':
-                items[4].setBackground(QColor(255, 230, 240))
-            elif category == 'всл':
-                items[4].setBackground(QColor(230, 255, 230))
-
-            # Подсветка пустых полей
-            for col, item in enumerate(items):
-                if not item.text().strip() and col not in [0, 4]:  # ID и категория могут быть пустыми
-                    item.setBackground(QColor(255, 255, 200))
-                item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
-                self.table.setItem(row, col, item)
+        # Цветовая индикация
+        if status == 'поступает':
+            items[7].setBackground(QColor(230, 255, 230))
+            items[7].setForeground(QColor(0, 100, 0))
+        else:
+            items[7].setBackground(QColor(255, 230, 230))
+            items[7].setForeground(QColor(150, 0, 0))
 
-        # Восстанавливаем выделение
-        for applicant_id in selected_ids:
-            if applicant_id in id_to_row:
-                self.table.selectRow(id_to_row[applicant_id])
+        # Цвет для категории
+        if category == 'м':
+            items[4].setBackground(QColor(230, 240, 255))
+        elif category == 'ж':
+            items[4].setBackground(QColor(255, 230, 240))
+        elif category == 'всл':
+            items[4].setBackground(QColor(230, 255, 230))
 
-        self.table.resizeColumnsToContents()
-        self.table.blockSignals(False)
-        self.on_selection_changed()
+        # Подсветка пустых полей
+        for col, item in enumerate(items):
+            if not item.text().strip() and col not in [0, 4]:  # ID и категория могут быть пустыми
+                item.setBackground(QColor(255, 255, 200))
+            item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsEditable)
+            self.table.setItem(row, col, item)
 
     def init_settings_tab(self):
         """Инициализация вкладки настроек (только для админа)"""
@@ -3538,6 +3646,11 @@ class MainWindow(QMainWindow):
         self.init_permissions_tab()
         self.admin_tabs.addTab(self.permissions_tab, "Права доступа")
 
+        # Вкладка обслуживания БД
+        self.maintenance_tab = QWidget()
+        self.init_maintenance_tab()
+        self.admin_tabs.addTab(self.maintenance_tab, "Обслуживание БД")
+
         layout.addWidget(self.admin_tabs)
         self.settings_tab.setLayout(layout)
 
@@ -3581,13 +3694,10 @@ class MainWindow(QMainWindow):
         if not department_name:
             return
 
-        cursor = self.db.conn.cursor()
-        cursor.execute('SELECT id FROM departments WHERE name = ?', (department_name,))
-        department = cursor.fetchone()
-        if not department:
+        department_id = self.db.get_department_id(department_name)
+        if not department_id:
             return
 
-        department_id = department['id']
         regions = self.db.get_regions_for_department(department_id)
         self.department_regions_list.clear()
         for region in regions:
@@ -3600,23 +3710,18 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Внимание", "Выберите подразделение!")
             return
 
-        cursor = self.db.conn.cursor()
-        cursor.execute('SELECT id FROM departments WHERE name = ?', (department_name,))
-        department = cursor.fetchone()
-        if not department:
+        department_id = self.db.get_department_id(department_name)
+        if not department_id:
             return
 
-        department_id = department['id']
         regions = self.db.get_regions()
         region_name, ok = QInputDialog.getItem(self, "Добавить регион", "Выберите регион:", regions, 0, False)
 
         if ok and region_name:
-            cursor.execute('SELECT id FROM regions WHERE name = ?', (region_name,))
-            region = cursor.fetchone()
-            if not region:
+            region_id = self.db.get_region_id(region_name)
+            if not region_id:
                 return
 
-            region_id = region['id']
             self.db.add_region_to_department(department_id, region_id)
             self.refresh_department_regions()
 
@@ -3631,20 +3736,15 @@ class MainWindow(QMainWindow):
         if not department_name:
             return
 
-        cursor = self.db.conn.cursor()
-        cursor.execute('SELECT id FROM departments WHERE name = ?', (department_name,))
-        department = cursor.fetchone()
-        if not department:
+        department_id = self.db.get_department_id(department_name)
+        if not department_id:
             return
 
-        department_id = department['id']
         region_name = current_item.text()
-        cursor.execute('SELECT id FROM regions WHERE name = ?', (region_name,))
-        region = cursor.fetchone()
-        if not region:
+        region_id = self.db.get_region_id(region_name)
+        if not region_id:
             return
 
-        region_id = region['id']
         self.db.remove_region_from_department(department_id, region_id)
         self.refresh_department_regions()
 
@@ -3794,6 +3894,157 @@ class MainWindow(QMainWindow):
         self.db.set_work_days(selected_days)
         QMessageBox.information(self, "Успех", "Настройки сохранены!")
 
+    def init_maintenance_tab(self):
+        """Инициализация вкладки обслуживания БД"""
+        layout = QVBoxLayout()
+
+        maintenance_group = QGroupBox("Резервные копии и оптимизация БД")
+        maintenance_group.setStyleSheet("""
+            QGroupBox {
+                font-weight: bold;
+                border: 2px solid #3498db;
+                border-radius: 8px;
+                margin-top: 10px;
+                padding-top: 10px;
+            }
+        """)
+        group_layout = QVBoxLayout()
+
+        self.maintenance_info_label = QLabel()
+        self.maintenance_info_label.setWordWrap(True)
+        group_layout.addWidget(self.maintenance_info_label)
+
+        buttons_layout = QHBoxLayout()
+        self.run_maintenance_btn = QPushButton("Выполнить обслуживание")
+        self.run_maintenance_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #2ecc71;
+                color: white;
+                padding: 10px;
+                font-weight: bold;
+            }
+            QPushButton:disabled {
+                background-color: #bdc3c7;
+            }
+        """)
+        self.run_maintenance_btn.clicked.connect(lambda: self.start_maintenance())
+        self.backup_only_btn = QPushButton("Только резервная копия")
+        self.backup_only_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #3498db;
+                color: white;
+                padding: 10px;
+                font-weight: bold;
+            }
+            QPushButton:disabled {
+                background-color: #bdc3c7;
+            }
+        """)
+        self.backup_only_btn.clicked.connect(lambda: self.start_maintenance(analyze=False, vacuum=False))
+        self.full_vacuum_btn = QPushButton("Полный VACUUM")
+        self.full_vacuum_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #e67e22;
+                color: white;
+                padding: 10px;
+                font-weight: bold;
+            }
+            QPushButton:disabled {
+                background-color: #bdc3c7;
+            }
+        """)
+        self.full_vacuum_btn.clicked.connect(self.start_full_vacuum)
+        buttons_layout.addWidget(self.run_maintenance_btn)
+        buttons_layout.addWidget(self.backup_only_btn)
+        buttons_layout.addWidget(self.full_vacuum_btn)
+        buttons_layout.addStretch()
+        group_layout.addLayout(buttons_layout)
+
+        self.maintenance_report_label = QLabel("")
+        self.maintenance_report_label.setWordWrap(True)
+        self.maintenance_report_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        self.maintenance_report_label.setStyleSheet("color: #2c3e50; font-weight: normal;")
+        group_layout.addWidget(self.maintenance_report_label)
+
+        maintenance_group.setLayout(group_layout)
+        layout.addWidget(maintenance_group)
+        layout.addStretch()
+        self.maintenance_tab.setLayout(layout)
+        self.refresh_maintenance_info()
+
+    def refresh_maintenance_info(self):
+        """Обновление сведений о резервных копиях"""
+        if not hasattr(self, 'maintenance_info_label'):
+            return
+        try:
+            if getattr(self.db, 'remote', False):
+                info = self.db.maintenance_info()
+            else:
+                info = DatabaseMaintenance(self.db).info()
+        except Exception as e:
+            self.maintenance_info_label.setText(f"Нет сведений о резервных копиях: {e}")
+            return
+        last_backup = info['last_backup']
+        last_text = last_backup.strftime("%d.%m.%Y %H:%M") if last_backup else "нет"
+        vacuum_text = "включен" if info['incremental_vacuum'] else "не включен (включается полным VACUUM)"
+        self.maintenance_info_label.setText(
+            f"Каталог копий: {info['backup_dir']}\n"
+            f"Резервных копий: {info['backups']} "
+            f"(хранится последних: {info['backup_keep']})\n"
+            f"Последняя копия: {last_text}\n"
+            f"Инкрементальный VACUUM: {vacuum_text}"
+        )
+
+    def start_full_vacuum(self):
+        """Полный VACUUM по команде администратора (после него работает инкрементальный VACUUM)"""
+        reply = QMessageBox.question(
+            self, "Полный VACUUM",
+            "Полный VACUUM переписывает весь файл БД. До его окончания изменения данных "
+            "недоступны всем пользователям, на большой БД это может занять несколько минут.\n\n"
+            "Выполнить полный VACUUM сейчас?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.start_maintenance(full_vacuum=True)
+
+    def start_maintenance(self, backup=True, analyze=True, vacuum=True, manual=True, full_vacuum=False):
+        """Запуск обслуживания БД в фоновом потоке"""
+        if self.maintenance_worker is not None and self.maintenance_worker.isRunning():
+            if manual:
+                QMessageBox.information(self, "Обслуживание БД", "Обслуживание уже выполняется.")
+            return
+
+        self.maintenance_worker = MaintenanceWorker(self.db, backup, analyze, vacuum, full_vacuum)
+        self.maintenance_worker.progress.connect(self.statusBar().showMessage)
+        self.maintenance_worker.finished.connect(
+            lambda success, message: self.on_maintenance_finished(success, message, manual)
+        )
+        if hasattr(self, 'run_maintenance_btn'):
+            self.run_maintenance_btn.setEnabled(False)
+            self.backup_only_btn.setEnabled(False)
+            self.full_vacuum_btn.setEnabled(False)
+        self.maintenance_worker.start()
+
+    def on_maintenance_finished(self, success, message, manual):
+        """Вывод отчета об обслуживании БД"""
+        if hasattr(self, 'run_maintenance_btn'):
+            self.run_maintenance_btn.setEnabled(True)
+            self.backup_only_btn.setEnabled(True)
+            self.full_vacuum_btn.setEnabled(True)
+            self.maintenance_report_label.setText(message)
+            self.refresh_maintenance_info()
+        self.statusBar().showMessage(message.splitlines()[-1] if success else message, 10000)
+        if manual and not success:
+            QMessageBox.critical(self, "Ошибка", message)
+
+    def run_maintenance_if_due(self):
+        """Плановое обслуживание БД, если с последней резервной копии прошел интервал"""
+        # Сервер БД обслуживает файл БД сам
+        if getattr(self.db, 'remote', False):
+            return
+        if DatabaseMaintenance(self.db).is_due():
+            self.start_maintenance(manual=False)
+
     def init_education_tab(self):
         """Инициализация вкладки управления образованием"""
         layout = QVBoxLayout()
@@ -4119,18 +4370,19 @@ class MainWindow(QMainWindow):
         if dialog.exec():
             data = dialog.get_data()
 
-            # Добавляем подразделение
-            dept_id = self.db.add_department(
-                data['name'],
-                data['type'],
-                data.get('parent_id')
-            )
+            # Подразделение и его начальник сохраняются одной транзакцией
+            with self.db.transaction():
+                dept_id = self.db.add_department(
+                    data['name'],
+                    data['type'],
+                    data.get('parent_id')
+                )
 
-            if dept_id:
                 # Если выбран начальник, назначаем его
-                if data.get('head_user_id'):
+                if dept_id and data.get('head_user_id'):
                     self.db.set_department_head(dept_id, data['head_user_id'])
 
+            if dept_id:
                 QMessageBox.information(self, "Успех", "Подразделение добавлено!")
                 self.refresh_departments()
                 self.load_departments_for_combo()  # Обновляем комбобоксы в других местах
@@ -4148,21 +4400,21 @@ class MainWindow(QMainWindow):
         dept_id = int(self.departments_table.item(row, 0).text())
 
         # Получаем данные подразделения
-        cursor = self.db.conn.cursor()
-        cursor.execute('SELECT * FROM departments WHERE id = ?', (dept_id,))
-        dept_data = dict(cursor.fetchone())
+        dept_data = dict(self.db.get_department(dept_id))
 
         dialog = DepartmentDialog(dept_data, self.db, self)
         if dialog.exec():
             data = dialog.get_data()
 
-            # Обновляем подразделение
-            success = self.db.update_department(dept_id, data)
+            with self.db.transaction():
+                # Обновляем подразделение
+                success = self.db.update_department(dept_id, data)
 
-            if success:
-                # Обновляем начальника
-                self.db.set_department_head(dept_id, data.get('head_user_id'))
+                if success:
+                    # Обновляем начальника
+                    self.db.set_department_head(dept_id, data.get('head_user_id'))
 
+            if success:
                 QMessageBox.information(self, "Успех", "Подразделение обновлено!")
                 self.refresh_departments()
                 self.load_departments_for_combo()
@@ -4181,9 +4433,7 @@ class MainWindow(QMainWindow):
         dept_id = int(self.departments_table.item(row, 0).text())
 
         # Проверяем, есть ли связанные данные
-        cursor = self.db.conn.cursor()
-        cursor.execute('SELECT COUNT(*) as count FROM applicants WHERE agitator_department = ?', (dept_name,))
-        applicants_count = cursor.fetchone()['count']
+        applicants_count = self.db.count_applicants(role='admin', filters={'agitator_department': dept_name})
 
         message = f"Вы уверены, что хотите удалить подразделение '{dept_name}'?"
         if applicants_count > 0:
@@ -4196,9 +4446,7 @@ class MainWindow(QMainWindow):
         )
 
         if reply == QMessageBox.StandardButton.Yes:
-            # Сначала удаляем права доступа
-            cursor.execute('DELETE FROM user_department_permissions WHERE department_id = ?', (dept_id,))
-            # Затем удаляем подразделение
+            # Права пользователей на подразделение удаляются вместе с ним
             success = self.db.delete_department(dept_id)
 
             if success:
@@ -4350,8 +4598,11 @@ class MainWindow(QMainWindow):
                 self.user_combo.addItem(f"{user_dict['username']} ({user_dict['full_name']})", user_dict['id'])
 
     def refresh_users(self):
-        """Обновление списка пользователей"""
-        users = self.db.get_all_users()
+        """Обновление списка пользователей (запрос выполняется в фоновом потоке)"""
+        self.executor.submit('users', self.db.get_all_users, on_result=self.show_users)
+
+    def show_users(self, users):
+        """Вывод списка пользователей в таблицу"""
         search_text = self.search_user_input.text().lower().strip()
 
         if search_text:
@@ -4428,27 +4679,27 @@ class MainWindow(QMainWindow):
 
             # Добавляем пользователя с обработкой ошибок
             try:
-                user_id = self.db.add_user(
-                    data['username'],
-                    data['password'],
-                    data['full_name'],
-                    data['role'],
-                    data.get('department_id'),
-                    data.get('position', ''),
-                    data.get('rank', ''),
-                    data.get('is_head', False)
-                )
+                # Пользователь и его права сохраняются одной транзакцией
+                with self.db.transaction():
+                    user_id = self.db.add_user(
+                        data['username'],
+                        data['password'],
+                        data['full_name'],
+                        data['role'],
+                        data.get('department_id'),
+                        data.get('position', ''),
+                        data.get('rank', ''),
+                        data.get('is_head', False)
+                    )
 
-                if user_id:
                     # Добавляем права доступа (только для обычных пользователей, не начальников)
-                    if data['role'] != 'admin' and not data.get('is_head', False):
+                    if user_id and data['role'] != 'admin' and not data.get('is_head', False):
                         for dept_name in data.get('permissions', []):
-                            cursor = self.db.conn.cursor()
-                            cursor.execute('SELECT id FROM departments WHERE name = ?', (dept_name,))
-                            result = cursor.fetchone()
-                            if result:
-                                self.db.add_user_department_permission(user_id, result['id'], True, False)
+                            dept_id = self.db.get_department_id(dept_name)
+                            if dept_id:
+                                self.db.add_user_department_permission(user_id, dept_id, True, False)
 
+                if user_id:
                     QMessageBox.information(self, 'Успех', 'Пользователь успешно добавлен!')
                     self.refresh_users()
                     self.load_users_for_combo()
@@ -4472,14 +4723,11 @@ class MainWindow(QMainWindow):
         user_id = int(user_id_item.text())
 
         # Получение данных пользователя из БД
-        cursor = self.db.conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
-        user_data = dict(cursor.fetchone())
+        user_data = dict(self.db.get_user_by_id(user_id))
 
         # Добавляем название подразделения
         if user_data.get('department_id'):
-            cursor.execute('SELECT name FROM departments WHERE id = ?', (user_data['department_id'],))
-            dept = cursor.fetchone()
+            dept = self.db.get_department(user_data['department_id'])
             if dept:
                 user_data['department_name'] = dept['name']
 
@@ -4489,21 +4737,22 @@ class MainWindow(QMainWindow):
             if new_data is None:
                 return
 
-            # Обновляем пользователя
-            success = self.db.update_user(user_data['id'], new_data)
+            with self.db.transaction():
+                # Обновляем пользователя
+                success = self.db.update_user(user_data['id'], new_data)
 
-            if success:
-                # Обновляем права доступа
-                # Сначала удаляем старые
-                cursor.execute('DELETE FROM user_department_permissions WHERE user_id = ?', (user_data['id'],))
+                if success:
+                    # Обновляем права доступа
+                    # Сначала удаляем старые
+                    self.db.clear_user_department_permissions(user_data['id'])
 
-                # Добавляем новые
-                for dept_name in new_data['permissions']:
-                    cursor.execute('SELECT id FROM departments WHERE name = ?', (dept_name,))
-                    result = cursor.fetchone()
-                    if result:
-                        self.db.add_user_department_permission(user_data['id'], result['id'], True, False)
+                    # Добавляем новые
+                    for dept_name in new_data['permissions']:
+                        dept_id = self.db.get_department_id(dept_name)
+                        if dept_id:
+                            self.db.add_user_department_permission(user_data['id'], dept_id, True, False)
 
+            if success:
                 QMessageBox.information(self, 'Успех', 'Данные пользователя обновлены!')
                 self.refresh_users()
                 self.load_users_for_combo()
@@ -4602,19 +4851,17 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, 'Ошибка', 'ФИО агитатора обязательно!')
                 return
 
-            # Проверка на дубликат
-            if self.db.check_duplicate_applicant(data['applicant_name'], data['phone']):
-                reply = QMessageBox.question(
-                    self, 'Дубликат',
-                    'Абитуриент с таким ФИО и телефоном уже существует!\n'
-                    'Вы всё равно хотите добавить?',
-                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-                )
-                if reply == QMessageBox.StandardButton.No:
-                    return
+            # Проверка на дубликат (ФИО и телефон без учета регистра, ё и формата номера)
+            if self.check_duplicate(data):
+                QMessageBox.warning(self, 'Дубликат', 'Абитуриент с таким ФИО и телефоном уже существует!')
+                return
 
             # Добавляем в БД
-            self.db.add_applicant(self.user_data['id'], data)
+            try:
+                self.db.add_applicant(self.user_data['id'], data)
+            except sqlite3.IntegrityError:
+                QMessageBox.warning(self, 'Дубликат', 'Абитуриент с таким ФИО и телефоном уже существует!')
+                return
 
             # Обновляем таблицу и статистику
             self.refresh_data()
@@ -4633,9 +4880,7 @@ class MainWindow(QMainWindow):
         applicant_id = int(self.table.item(row, 0).text())
 
         # Получение данных абитуриента из БД
-        cursor = self.db.conn.cursor()
-        cursor.execute('SELECT * FROM applicants WHERE id = ?', (applicant_id,))
-        applicant_data = dict(cursor.fetchone())
+        applicant_data = dict(self.db.get_applicant(applicant_id))
 
         dialog = ApplicantDialog(
             applicant_data=applicant_data,
@@ -4645,31 +4890,41 @@ class MainWindow(QMainWindow):
         )
         if dialog.exec():
             data = dialog.get_data()
-            self.db.update_applicant(applicant_id, data)
+            if self.check_duplicate(data, exclude_id=applicant_id):
+                QMessageBox.warning(self, 'Дубликат', 'Абитуриент с таким ФИО и телефоном уже существует!')
+                return
+            try:
+                self.db.update_applicant(applicant_id, data)
+            except sqlite3.IntegrityError:
+                QMessageBox.warning(self, 'Дубликат', 'Абитуриент с таким ФИО и телефоном уже существует!')
+                return
             self.refresh_data()
             self.stats_tab.update_statistics()
             QMessageBox.information(self, 'Успех', 'Данные абитуриента обновлены!')
 
     def delete_applicant(self):
-        """Удаление выбранного абитуриента"""
-        selected_rows = self.table.selectionModel().selectedRows()
-        if not selected_rows:
+        """Удаление выбранных абитуриентов"""
+        applicant_ids = self.selected_applicant_ids()
+        if not applicant_ids:
             QMessageBox.warning(self, 'Внимание', 'Выберите запись для удаления!')
             return
 
+        if len(applicant_ids) == 1:
+            question = 'Вы уверены, что хотите удалить выбранную запись?'
+        else:
+            question = f'Вы уверены, что хотите удалить выбранные записи ({len(applicant_ids)})?'
         reply = QMessageBox.question(
-            self, 'Подтверждение',
-            'Вы уверены, что хотите удалить выбранную запись?',
+            self, 'Подтверждение', question,
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
 
         if reply == QMessageBox.StandardButton.Yes:
-            for index in selected_rows:
-                row = index.row()
-                applicant_id = int(self.table.item(row, 0).text())
-                self.db.delete_applicant(applicant_id)
-
-            self.refresh_data()
+            # Все выбранные записи удаляются одним запросом
+            self.db.delete_applicants(applicant_ids)
+            if self.executor.is_running('applicants'):
+                self.refresh_data()
+            else:
+                self.remove_applicant_rows(applicant_ids)
             self.stats_tab.update_statistics()
 
     def import_from_excel(self):
@@ -4775,6 +5030,7 @@ class MainWindow(QMainWindow):
                                 break
 
                         # Импортируем данные
+                        applicants = []
                         for index, row in df.iterrows():
                             # Пропускаем пустые строки
                             if row.isnull().all():
@@ -4784,21 +5040,16 @@ class MainWindow(QMainWindow):
                             applicant_data = self.extract_applicant_data(row, df, course_from_sheet)
 
                             if applicant_data:
-                                # Проверяем дубликат
-                                if self.check_duplicate(applicant_data):
-                                    duplicate_count += 1
-                                    continue
-
-                                # Добавляем в базу
-                                try:
-                                    self.db.add_applicant(self.user_data['id'], applicant_data)
-                                    imported_count += 1
-                                except Exception as e:
-                                    skipped_count += 1
-                                    print(f"Ошибка добавления абитуриента: {e}")
+                                applicants.append(applicant_data)
                             else:
                                 skipped_count += 1
 
+                        # Пакетная вставка с пропуском дубликатов
+                        for batch_stats in self.db.add_applicants_bulk(self.user_data['id'], applicants):
+                            imported_count += batch_stats['inserted']
+                            duplicate_count += batch_stats['duplicates']
+                            skipped_count += batch_stats['errors']
+
                     except Exception as e:
                         error_msg = f"Ошибка импорта листа {sheet_name}: {e}"
                         print(error_msg)
@@ -4957,19 +5208,11 @@ class MainWindow(QMainWindow):
 
         return phone
 
-    def check_duplicate(self, applicant_data):
+    def check_duplicate(self, applicant_data, exclude_id=None):
         """Проверка на дубликат (все пользователи)"""
-        cursor = self.db.conn.cursor()
-        cursor.execute('''
-            SELECT COUNT(*) FROM applicants 
-            WHERE applicant_name = ?
-            AND phone = ?
-            AND course = ?
-        ''', (applicant_data['applicant_name'],
-              applicant_data['phone'],
-              applicant_data['course']))
-        count = cursor.fetchone()[0]
-        return count > 0
+        return self.db.check_duplicate_applicant(
+            applicant_data['applicant_name'], applicant_data.get('phone', ''), exclude_id
+        )
 
     def export_data(self):
         """Экспорт данных в Excel"""
@@ -5215,9 +5458,62 @@ class MainWindow(QMainWindow):
         ''', ('work_days', days_str))
         self.conn.commit()
 
+    def close_database(self):
+        """Остановка фоновых задач, плановое обслуживание и закрытие БД"""
+        if self.db_closed:
+            return
+        self.db_closed = True
+        self.maintenance_timer.stop()
+        self.executor.shutdown()
+        if self.maintenance_worker is not None and self.maintenance_worker.isRunning():
+            self.wait_for_maintenance(self.maintenance_worker)
+
+        # Обслуживание при закрытии, если его не было в течение интервала
+        if not getattr(self.db, 'remote', False):
+            try:
+                due = DatabaseMaintenance(self.db).is_due()
+            except Exception as e:
+                print(f"Ошибка обслуживания БД: {e}")
+                due = False
+            if due:
+                def report_error(success, message):
+                    if not success:
+                        print(message)
+
+                self.maintenance_worker = MaintenanceWorker(self.db)
+                self.maintenance_worker.finished.connect(report_error)
+                self.maintenance_worker.start()
+                self.wait_for_maintenance(self.maintenance_worker)
+        self.db.close()
+
+    def wait_for_maintenance(self, worker):
+        """Ожидание потока обслуживания БД с окном хода выполнения
+
+        Окно перерисовывается и показывает текущий шаг, пока поток копирует и сжимает БД.
+        """
+        dialog = QProgressDialog("Обслуживание БД...", None, 0, 0, self)
+        dialog.setWindowTitle("Обслуживание БД")
+        dialog.setWindowModality(Qt.WindowModality.ApplicationModal)
+        dialog.setMinimumDuration(0)
+        worker.progress.connect(dialog.setLabelText)
+        dialog.show()
+
+        loop = QEventLoop()
+        timer = QTimer()
+        timer.timeout.connect(lambda: worker.isRunning() or loop.quit())
+        timer.start(50)
+        if worker.isRunning():
+            loop.exec_()
+        timer.stop()
+        # Выход из приложения завершает и этот цикл событий: поток дожидается окончания
+        worker.wait()
+        # Доставка сигнала finished, отправленного потоком перед завершением
+        QApplication.processEvents()
+        dialog.close()
+
     def closeEvent(self, event):
         """Обработка закрытия окна"""
-        self.db.close()
+        self.close_database()
         event.accept()
 
 
@@ -5337,5 +5633,7 @@ class Application:
 
 
 if __name__ == '__main__':
+    # Пул процессов импорта в собранном приложении (PyInstaller)
+    multiprocessing.freeze_support()
     application = Application()
     sys.exit(application.run())
\ No newline at end of file
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import glob
+import os
+import time
+from datetime import datetime
+
+
+class DatabaseMaintenance:
+    """Обслуживание файла БД: резервные копии с ротацией, ANALYZE и инкрементальный VACUUM"""
+
+    def __init__(self, db):
+        self.db = db
+        self.db_path = os.path.abspath(db.config['path'])
+        backup_dir = db.config['backup_dir']
+        if not os.path.isabs(backup_dir):
+            backup_dir = os.path.join(os.path.dirname(self.db_path), backup_dir)
+        self.backup_dir = backup_dir
+        self.backup_prefix = os.path.splitext(os.path.basename(self.db_path))[0] + '_'
+
+    def backups(self):
+        """Файлы резервных копий от старых к новым"""
+        pattern = os.path.join(self.backup_dir, glob.escape(self.backup_prefix) + '*.db')
+        return sorted(glob.glob(pattern))
+
+    def last_backup_time(self):
+        """Время последней резервной копии или None"""
+        backups = self.backups()
+        if not backups:
+            return None
+        return datetime.fromtimestamp(os.path.getmtime(backups[-1]))
+
+    def is_due(self):
+        """Прошло ли с последней резервной копии больше интервала обслуживания"""
+        last_backup = self.last_backup_time()
+        if last_backup is None:
+            return True
+        interval = float(self.db.config['maintenance_interval_hours']) * 3600
+        return (datetime.now() - last_backup).total_seconds() >= interval
+
+    def info(self):
+        """Сведения о резервных копиях для отображения"""
+        return {
+            'backup_dir': self.backup_dir,
+            'backups': len(self.backups()),
+            'backup_keep': self.db.config['backup_keep'],
+            'last_backup': self.last_backup_time(),
+            'incremental_vacuum': self.db.has_incremental_vacuum(),
+        }
+
+    def backup(self, progress=None):
+        """Резервная копия в каталог копий; возвращает (путь, размер в байтах)"""
+        os.makedirs(self.backup_dir, exist_ok=True)
+        name = f"{self.backup_prefix}{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+        path = os.path.join(self.backup_dir, name)
+        # Недописанная копия не должна попасть в список копий
+        part_path = path + '.part'
+        try:
+            size = self.db.backup_to(part_path, progress=progress)
+            os.replace(part_path, path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        return path, size
+
+    def rotate(self):
+        """Удаление старых резервных копий сверх backup_keep; возвращает удаленные файлы"""
+        keep = max(int(self.db.config['backup_keep']), 1)
+        removed = self.backups()[:-keep]
+        for path in removed:
+            os.remove(path)
+        return removed
+
+    def run(self, backup=True, analyze=True, vacuum=True, full_vacuum=False, progress=None):
+        """Полное обслуживание БД; возвращает отчет со временем и объемом каждого шага
+
+        full_vacuum - полный VACUUM вместо инкрементального: переводит файл в режим
+        auto_vacuum = INCREMENTAL и блокирует запись на все время (команда администратора).
+        progress(текст) вызывается перед каждым шагом и во время копирования.
+        """
+        def report_progress(text):
+            if progress:
+                progress(text)
+
+        report = {
+            'started_at': datetime.now(),
+            'db_size_before': os.path.getsize(self.db_path),
+            'steps': [],  # (название, секунды, байты)
+            'backup_path': None,
+            'removed_backups': [],
+        }
+        started = time.perf_counter()
+
+        if backup:
+            report_progress("Резервное копирование...")
+
+            def backup_progress(remaining, total):
+                if total:
+                    report_progress(f"Резервное копирование: {100 * (total - remaining) // total}%")
+
+            step_started = time.perf_counter()
+            report['backup_path'], size = self.backup(backup_progress)
+            report['removed_backups'] = self.rotate()
+            report['steps'].append(('Резервная копия', time.perf_counter() - step_started, size))
+
+        if analyze:
+            report_progress("Обновление статистики планировщика...")
+            step_started = time.perf_counter()
+            self.db.analyze()
+            report['steps'].append(('ANALYZE', time.perf_counter() - step_started, None))
+
+        if vacuum or full_vacuum:
+            report_progress("Полный VACUUM файла БД..." if full_vacuum else "Освобождение места в файле БД...")
+            step_started = time.perf_counter()
+            # Старые записи журнала изменений абитуриентов уже учтены аналитическим кубом
+            self.db.prune_applicant_changes()
+            if full_vacuum:
+                freed_pages = self.db.enable_incremental_vacuum()
+            else:
+                freed_pages = self.db.incremental_vacuum()
+            report['steps'].append((
+                'Полный VACUUM' if full_vacuum else 'VACUUM',
+                time.perf_counter() - step_started, freed_pages * self.db.page_size()
+            ))
+
+        report['elapsed'] = time.perf_counter() - started
+        report['db_size_after'] = os.path.getsize(self.db_path)
+        return report
+
+
+def format_size(size):
+    """Размер в байтах для отображения"""
+    for unit in ('Б', 'КБ', 'МБ'):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == 'Б' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def format_report(report):
+    """Текстовый отчет об обслуживании БД"""
+    lines = [f"Обслуживание БД {report['started_at'].strftime('%d.%m.%Y %H:%M:%S')}"]
+    for name, elapsed, size in report['steps']:
+        line = f"• {name}: {elapsed:.2f} с"
+        if size is not None:
+            line += f", {format_size(size)}"
+        lines.append(line)
+    if report['backup_path']:
+        lines.append(f"Копия: {report['backup_path']}")
+    if report['removed_backups']:
+        lines.append(f"Удалено старых копий: {len(report['removed_backups'])}")
+    lines.append(
+        f"Размер БД: {format_size(report['db_size_before'])} → {format_size(report['db_size_after'])}"
+    )
+    lines.append(f"Всего: {report['elapsed']:.2f} с")
+    return '\n'.join(lines)
+
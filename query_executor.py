@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class QueryTask(QRunnable):
+    """Запрос к БД, выполняемый в потоке пула на соединении для чтения этого потока"""
+
+    def __init__(self, db, channel, generation, func, args, kwargs, on_result=None, on_error=None):
+        super().__init__()
+        # Задача удаляется сборщиком мусора Python, а не пулом Qt: ссылку на нее держит
+        # QueryExecutor.pending до обработки сигнала завершения
+        self.setAutoDelete(False)
+        self.db = db
+        self.channel = channel
+        self.generation = generation
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.on_result = on_result
+        self.on_error = on_error
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.connection = None  # соединение, на котором сейчас выполняется запрос
+        self.lock = threading.Lock()
+        self.done_signal = None
+
+    def run(self):
+        try:
+            with self.lock:
+                if self.cancelled:
+                    return
+                self.connection = self.db.reader()
+            try:
+                self.result = self.func(*self.args, **self.kwargs)
+            except Exception as e:
+                # sqlite3.OperationalError: interrupted - ожидаемый результат отмены
+                if not (self.cancelled and isinstance(e, sqlite3.OperationalError)):
+                    self.error = e
+            finally:
+                with self.lock:
+                    self.connection = None
+        finally:
+            # Сигнал отправляется и для отмененной задачи: по нему исполнитель отпускает ссылку
+            self.done_signal.emit(self)
+
+    def cancel(self):
+        """Отмена задачи; выполняющийся запрос прерывается через interrupt()"""
+        with self.lock:
+            self.cancelled = True
+            if self.connection is not None:
+                self.connection.interrupt()
+
+
+class QueryExecutor(QObject):
+    """Асинхронное выполнение чтений из Database в пуле потоков
+
+    Задачи группируются по каналам (например, 'applicants' или 'statistics'): новая задача
+    канала отменяет предыдущую, а результаты устаревших поколений отбрасываются.
+    Результаты и ошибки доставляются в поток GUI через сигналы и обратные вызовы.
+    """
+
+    # канал, поколение, результат
+    finished = pyqtSignal(str, int, object)
+    # канал, поколение, исключение
+    failed = pyqtSignal(str, int, object)
+
+    _task_done = pyqtSignal(object)
+
+    def __init__(self, db, max_threads=2, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        # Потоки пула не завершаются, чтобы не открывать соединения для чтения заново
+        self.pool.setExpiryTimeout(-1)
+        self.generation = 0
+        self.tasks = {}  # канал -> текущая задача
+        self.pending = set()  # задачи, переданные пулу, до обработки их сигнала завершения
+        self._task_done.connect(self._on_task_done)
+
+    def submit(self, channel, func, *args, on_result=None, on_error=None, **kwargs):
+        """Запуск func(*args, **kwargs) в пуле; возвращает поколение задачи
+
+        func выполняется в потоке пула и должна вернуть готовые данные (списки, словари),
+        а не курсоры или генераторы. on_result(результат) и on_error(исключение)
+        вызываются в потоке GUI только для актуальной задачи канала.
+        """
+        self.cancel(channel)
+        self.generation += 1
+        task = QueryTask(self.db, channel, self.generation, func, args, kwargs, on_result, on_error)
+        task.done_signal = self._task_done
+        self.tasks[channel] = task
+        self.pending.add(task)
+        self.pool.start(task)
+        return task.generation
+
+    def is_current(self, channel, generation):
+        """Является ли поколение последним запущенным для канала"""
+        task = self.tasks.get(channel)
+        return task is not None and task.generation == generation
+
+    def is_running(self, channel):
+        """Есть ли у канала незавершенная задача"""
+        return channel in self.tasks
+
+    def cancel(self, channel):
+        """Отмена текущей задачи канала"""
+        task = self.tasks.pop(channel, None)
+        if task is not None:
+            task.cancel()
+            if self.pool.tryTake(task):
+                # Задача снята с очереди и не будет выполнена
+                self.pending.discard(task)
+
+    def cancel_all(self):
+        """Отмена задач всех каналов"""
+        for channel in list(self.tasks):
+            self.cancel(channel)
+
+    def shutdown(self):
+        """Отмена задач и ожидание завершения потоков (перед закрытием БД)"""
+        self.cancel_all()
+        self.pool.waitForDone()
+
+    def _on_task_done(self, task):
+        """Доставка результата задачи в потоке GUI"""
+        self.pending.discard(task)
+        if task.cancelled or self.tasks.get(task.channel) is not task:
+            # Результат устаревшего или отмененного запроса
+            return
+        del self.tasks[task.channel]
+
+        if task.error is not None:
+            self.failed.emit(task.channel, task.generation, task.error)
+            if task.on_error:
+                task.on_error(task.error)
+            else:
+                print(f"Ошибка запроса к БД ({task.channel}): {task.error}")
+        else:
+            self.finished.emit(task.channel, task.generation, task.result)
+            if task.on_result:
+                task.on_result(task.result)
@@ -1,10 +1,11 @@
 # -*- coding: utf-8 -*-
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QComboBox, QPushButton, QScrollArea, QFrame,
-                             QGridLayout, QSizePolicy)
+                             QGridLayout, QSizePolicy, QCheckBox, QProgressBar)
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QFont, QColor
 from PyQt5.QtWidgets import QDialog, QDialogButtonBox, QFormLayout, QMessageBox
+from query_executor import QueryExecutor
 
 
 class CourseSection(QFrame):
@@ -587,11 +588,12 @@ class PlanDialog(QDialog):
 class StatisticsWidget(QWidget):
     """Главный виджет статистики"""
 
-    def __init__(self, user_id, role, db):
+    def __init__(self, user_id, role, db, executor=None):
         super().__init__()
         self.user_id = user_id
         self.role = role
         self.db = db
+        self.executor = executor or QueryExecutor(db, parent=self)
         self.current_year = 2026
         self.edit_plan_btn = None  # Добавляем инициализацию
         self.init_ui()
@@ -657,6 +659,11 @@ class StatisticsWidget(QWidget):
             }
         """)
 
+        # Статистика и план с учетом подчиненных подразделений
+        self.rollup_check = QCheckBox("С подчиненными подразделениями")
+        self.rollup_check.setChecked(True)
+        self.rollup_check.toggled.connect(self.update_statistics)
+
         # Кнопка редактирования плана (создаем ДО load_departments)
         self.edit_plan_btn = QPushButton("Редактировать план")
         self.edit_plan_btn.setStyleSheet("""
@@ -693,6 +700,7 @@ class StatisticsWidget(QWidget):
 
         controls_layout.addWidget(dept_label)
         controls_layout.addWidget(self.department_combo)
+        controls_layout.addWidget(self.rollup_check)
         controls_layout.addStretch()
         controls_layout.addWidget(self.edit_plan_btn)
         controls_layout.addWidget(self.refresh_btn)
@@ -775,9 +783,7 @@ class StatisticsWidget(QWidget):
 
             if user_dict.get('is_head') and user_dict.get('department_id'):
                 # Начальник может редактировать план и видеть свое подразделение
-                cursor = self.db.conn.cursor()
-                cursor.execute('SELECT name FROM departments WHERE id = ?', (user_dict['department_id'],))
-                dept = cursor.fetchone()
+                dept = self.db.get_department(user_dict['department_id'])
                 if dept:
                     self.department_combo.addItem(dept['name'])
                     self.edit_plan_btn.setVisible(True)
@@ -807,16 +813,11 @@ class StatisticsWidget(QWidget):
             return
 
         # Получаем ID подразделения
-        cursor = self.db.conn.cursor()
-        cursor.execute('SELECT id FROM departments WHERE name = ?', (department_name,))
-        result = cursor.fetchone()
-
-        if not result:
+        department_id = self.db.get_department_id(department_name)
+        if not department_id:
             QMessageBox.warning(self, "Ошибка", "Подразделение не найдено!")
             return
 
-        department_id = result['id']
-
         # Получаем текущий план
         current_plan = self.db.get_plan(department_id, self.current_year)
 
@@ -826,48 +827,63 @@ class StatisticsWidget(QWidget):
             self.update_statistics()
 
     def update_statistics(self):
-        """Обновление статистики"""
-        # Очистка предыдущих данных
-        while self.scroll_layout.count():
-            item = self.scroll_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
+        """Обновление статистики (запрос выполняется в фоновом потоке)"""
+        self.executor.submit(
+            'statistics', self.load_statistics,
+            self.department_combo.currentText(), self.current_year, self.rollup_check.isChecked(),
+            on_result=self.show_statistics
+        )
 
-        department_name = self.department_combo.currentText()
+    def load_statistics(self, department_name, year, rollup=False):
+        """Статистика и план подразделений: список (название, статистика, план, ход плана)
+
+        С rollup в статистику и план входят подчиненные подразделения.
+        Выполняется в потоке пула запросов.
+        """
+        progress = {
+            dept['department_name']: dept
+            for dept in self.db.get_plan_progress(year, department_name, rollup)
+        }
 
         if department_name == "Все подразделения":
-            self.display_all_departments_stats()
-        else:
-            self.display_department_stats(department_name)
+            # Статистика и планы всех подразделений одним запросом
+            departments = self.db.get_statistics_for_all_departments(year, rollup)
+            return [
+                (dept['department_name'], dept, dept, progress.get(dept['department_name']))
+                for dept in departments
+            ]
 
-        # Добавляем растягивающийся элемент
-        self.scroll_layout.addStretch()
+        # Статистика по одному подразделению
+        stats = self.db.get_statistics_by_department(department_name, rollup)
+
+        # Получаем план
+        department_id = self.db.get_department_id(department_name)
+        plan = {'plan_m': 0, 'plan_f': 0, 'plan_military': 0}
+        if department_id:
+            plan = self.db.get_plan(department_id, year, rollup)
+
+        return [(department_name, stats, plan, progress.get(department_name))]
 
-    def display_all_departments_stats(self):
-        """Отображение статистики по всем подразделениям"""
-        departments = self.db.get_departments()
+    def show_statistics(self, departments):
+        """Отображение статистики подразделений"""
+        # Очистка предыдущих данных
+        while self.scroll_layout.count():
+            item = self.scroll_layout.takeAt(0)
+            if item.widget():
+                item.widget().deleteLater()
 
-        for dept in departments:
-            self.display_department_stats(dept['name'])
+        for department_name, stats, plan, progress in departments:
+            self.add_department_stats_widget(department_name, stats, plan, progress)
 
         if not departments:
             empty_widget = self.create_empty_widget("Нет данных по подразделениям")
             self.scroll_layout.addWidget(empty_widget)
 
-    def display_department_stats(self, department_name):
-        """Отображение статистики по одному подразделению"""
-        # Получаем статистику из БД
-        stats = self.db.get_statistics_by_department(department_name)
-
-        # Получаем план
-        cursor = self.db.conn.cursor()
-        cursor.execute('SELECT id FROM departments WHERE name = ?', (department_name,))
-        result = cursor.fetchone()
-
-        plan = {'plan_m': 0, 'plan_f': 0, 'plan_military': 0}
-        if result:
-            plan = self.db.get_plan(result['id'], self.current_year)
+        # Добавляем растягивающийся элемент
+        self.scroll_layout.addStretch()
 
+    def add_department_stats_widget(self, department_name, stats, plan, progress=None):
+        """Добавление карточек статистики, плана и хода его выполнения подразделения"""
         # Создаем карточки
         cards_widget = QWidget()
         cards_layout = QGridLayout(cards_widget)
@@ -936,9 +952,55 @@ class StatisticsWidget(QWidget):
         container_layout.setSpacing(10)
         container_layout.addWidget(dept_header)
         container_layout.addWidget(cards_widget)
+        if progress and progress['plan']:
+            container_layout.addWidget(self.create_progress_widget(progress))
 
         self.scroll_layout.addWidget(container)
 
+    def create_progress_widget(self, progress):
+        """Ход выполнения плана: нарастающий итог по дням и прогноз даты выполнения"""
+        widget = QFrame()
+        widget.setStyleSheet("""
+            QFrame {
+                background-color: #f8f9fa;
+                border-radius: 8px;
+                border: 1px solid #e9ecef;
+            }
+        """)
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(12, 8, 12, 8)
+        layout.setSpacing(6)
+
+        plan, actual = progress['plan'], progress['actual']
+        progress_bar = QProgressBar()
+        progress_bar.setRange(0, plan)
+        progress_bar.setValue(min(actual, plan))
+        progress_bar.setFormat(f"Выполнение плана: {actual} из {plan} (%p%)")
+        layout.addWidget(progress_bar)
+
+        if progress['projected_date']:
+            projected = progress['projected_date'].strftime("%d.%m.%Y")
+            if actual >= plan:
+                forecast = f"План выполнен {projected}"
+            else:
+                forecast = f"Прогноз выполнения плана: {projected}"
+        else:
+            forecast = "Прогноз выполнения плана: недостаточно данных"
+        info_label = QLabel(f"{forecast} | Темп: {progress['rate']:.1f} в рабочий день")
+        info_label.setStyleSheet("color: #495057; font-weight: bold; border: none;")
+        layout.addWidget(info_label)
+
+        # Нарастающий итог за последние дни набора
+        series = progress['series'][-10:]
+        if series:
+            series_text = '  '.join(f"{day.strftime('%d.%m')}: {total}" for day, total in series)
+            series_label = QLabel(f"Нарастающий итог: {series_text}")
+            series_label.setStyleSheet("color: #6c757d; font-size: 11px; border: none;")
+            series_label.setWordWrap(True)
+            layout.addWidget(series_label)
+
+        return widget
+
     def create_empty_widget(self, message):
         """Создание виджета для пустого состояния"""
         from PyQt5.QtWidgets import QFrame, QVBoxLayout, QLabel
@@ -978,18 +1040,13 @@ class StatisticsWidget(QWidget):
             return
 
         # Получаем ID подразделения
-        cursor = self.db.conn.cursor()
-        cursor.execute('SELECT id FROM departments WHERE name = ?', (department_name,))
-        result = cursor.fetchone()
-
-        if not result:
+        department_id = self.db.get_department_id(department_name)
+        if not department_id:
             QMessageBox.warning(self, "Ошибка", "Подразделение не найдено!")
             return
 
-        department_id = result['id']
-
         # Импортируем и открываем диалог
-        dialog = RegionStatsDialog(department_name, department_id, self.db, self)
+        dialog = RegionStatsDialog(department_name, department_id, self.db, self, self.executor)
         dialog.exec()
 
 
@@ -1004,11 +1061,12 @@ from PyQt5.QtGui import QFont, QColor
 class RegionStatsDialog(QDialog):
     """Диалог статистики по регионам для подразделения"""
 
-    def __init__(self, department_name, department_id, db, parent=None):
+    def __init__(self, department_name, department_id, db, parent=None, executor=None):
         super().__init__(parent)
         self.department_name = department_name
         self.department_id = department_id
         self.db = db
+        self.executor = executor or QueryExecutor(db, parent=self)
         self.setModal(True)
         self.setWindowTitle(f'Статистика по регионам - {department_name}')
         self.setMinimumSize(800, 600)
@@ -1103,19 +1161,23 @@ class RegionStatsDialog(QDialog):
             self.region_combo.addItem(region['name'])
 
     def load_stats(self):
-        """Загрузка статистики"""
-        region_name = self.region_combo.currentText()
+        """Загрузка статистики (запрос выполняется в фоновом потоке)"""
+        self.executor.submit(
+            'region_stats', self.fetch_stats, self.region_combo.currentText(),
+            on_result=self.show_stats
+        )
+
+    def fetch_stats(self, region_name):
+        """Запрос статистики по регионам (выполняется в потоке пула запросов)"""
         region_id = None
 
         if region_name != "Все регионы":
-            cursor = self.db.conn.cursor()
-            cursor.execute('SELECT id FROM regions WHERE name = ?', (region_name,))
-            result = cursor.fetchone()
-            if result:
-                region_id = result['id']
+            region_id = self.db.get_region_id(region_name)
 
-        stats = self.db.get_stats_by_region(self.department_id, region_id)
+        return self.db.get_stats_by_region(self.department_id, region_id)
 
+    def show_stats(self, stats):
+        """Вывод статистики по регионам в таблицу"""
         self.table.setRowCount(len(stats))
 
         total_male = 0
@@ -1172,6 +1234,11 @@ class RegionStatsDialog(QDialog):
 
         self.table.resizeColumnsToContents()
 
+    def done(self, result):
+        """Закрытие диалога с отменой незавершенного запроса"""
+        self.executor.cancel('region_stats')
+        super().done(result)
+
     def export_to_csv(self):
         """Экспорт в CSV"""
         from PyQt5.QtWidgets import QFileDialog